@@ -0,0 +1,117 @@
+"""
+    Benchmark: model scoring under concurrent questions, with and without micro-batching (utils/batch_scheduler.py).
+
+    A number of client threads (questions being answered at once) each rank small sets of paths (5-40) in a loop.
+        Reports paths scored per second and the latency of a rank call, for direct calls to the ModelInterpreter and for
+        the scheduler with different batch sizes and waits.
+
+    The model is built on the fly, with the same structure as the one trained in network.py
+        (embedding + BiLSTM encoder + dot product), and random weights: only the speed matters here.
+
+    Usage (from the root of the repo):
+        python benchmarks/batch_scheduler.py [clients] [seconds per setting]
+"""
+import os
+import sys
+import time
+import threading
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keras.models import Model
+from keras.layers import Input, Embedding, Bidirectional, LSTM, Lambda, dot, concatenate
+import keras.backend as K
+
+from utils import batch_scheduler
+from utils import model_interpreter
+
+# Some MACROS
+MAX_LENGTH = 25
+VOCAB_SIZE = 20000
+EMBEDDING_DIMS = 300
+HIDDEN_UNITS = 128
+CLIENTS = 8
+DURATION = 5.0                  # seconds per setting
+PATHS_PER_CALL = (5, 40)
+SETTINGS = [(64, 0.001), (64, 0.005), (256, 0.002), (256, 0.005), (256, 0.02), (1024, 0.005), (1024, 0.02)]
+
+
+def synthetic_model(_max_length=MAX_LENGTH, _vocab_size=VOCAB_SIZE, _embedding_dims=EMBEDDING_DIMS,
+                    _hidden_units=HIDDEN_UNITS):
+    x_ques = Input(shape=(_max_length,), dtype='int32', name='x_ques')
+    x_pos_path = Input(shape=(_max_length,), dtype='int32', name='x_pos_path')
+    x_neg_path = Input(shape=(_max_length,), dtype='int32', name='x_neg_path')
+
+    embed = Embedding(_vocab_size, _embedding_dims, input_length=_max_length, trainable=False)
+    encode = Bidirectional(LSTM(_hidden_units, return_sequences=False))
+
+    def get_score(ques, path):
+        return dot([encode(embed(ques)), encode(embed(path))], axes=-1)
+
+    pos_score = get_score(x_ques, x_pos_path)
+    neg_score = get_score(x_ques, x_neg_path)
+    loss = Lambda(lambda x: K.maximum(0., 1.0 - x[0] + x[1]))([pos_score, neg_score])
+    return Model(inputs=[x_ques, x_pos_path, x_neg_path], outputs=[concatenate([pos_score, neg_score, loss], axis=-1)])
+
+
+def run(_ranker, _clients, _duration, _seed=42):
+    """
+    :return: paths scored per second, list of latencies (s) of the rank calls
+    """
+    latencies, paths = [], [0]
+    lock = threading.Lock()
+    deadline = time.time() + _duration
+
+    def client(_seed):
+        random = np.random.RandomState(_seed)
+        question = random.randint(1, VOCAB_SIZE, size=10)
+        while time.time() < deadline:
+            n = random.randint(PATHS_PER_CALL[0], PATHS_PER_CALL[1] + 1)
+            candidates = [random.randint(1, VOCAB_SIZE, size=random.randint(3, MAX_LENGTH)) for _ in range(n)]
+            start = time.time()
+            _ranker.rank(question, candidates, _k=5)
+            with lock:
+                latencies.append(time.time() - start)
+                paths[0] += n
+
+    start = time.time()
+    threads = [threading.Thread(target=client, args=(_seed + i,)) for i in range(_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return paths[0] / (time.time() - start), latencies
+
+
+def report(_name, _throughput, _latencies):
+    print("%-28s %9.1f paths/s   latency p50 %7.2f ms, p99 %7.2f ms" %
+          (_name, _throughput, np.percentile(_latencies, 50) * 1e3, np.percentile(_latencies, 99) * 1e3))
+
+
+if __name__ == "__main__":
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else CLIENTS
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else DURATION
+
+    model = model_interpreter.ModelInterpreter(_gpu='0', _model=synthetic_model())
+    model.rank(np.arange(1, 10), [np.arange(1, 10)])                   # Warm up
+    print("%d clients, %d-%d paths per rank call, %.0f s per setting" %
+          (clients, PATHS_PER_CALL[0], PATHS_PER_CALL[1], duration))
+
+    # Batched or not, the scores should be the same
+    random = np.random.RandomState(0)
+    question = random.randint(1, VOCAB_SIZE, size=10)
+    paths = [random.randint(1, VOCAB_SIZE, size=random.randint(3, MAX_LENGTH)) for _ in range(30)]
+    scores = batch_scheduler.RankScheduler(model).score(*model.pad_inputs(question, paths))
+    assert np.allclose(scores, model.score(*model.pad_inputs(question, paths)), atol=1e-5), "Batched scores differ"
+
+    throughput, latencies = run(model, clients, duration)
+    report("direct", throughput, latencies)
+
+    for max_batch_size, max_wait in SETTINGS:
+        scheduler = batch_scheduler.RankScheduler(model, _max_batch_size=max_batch_size, _max_wait=max_wait)
+        throughput, latencies = run(scheduler, clients, duration)
+        report("batch %4d, wait %4.1f ms" % (max_batch_size, max_wait * 1e3), throughput, latencies)
+        print("%28s %9.1f rows per forward pass, %.2f ms waited per request" %
+              ('', scheduler.stats['rows'] / float(scheduler.stats['batches']),
+               scheduler.stats['waited'] / scheduler.stats['requests'] * 1e3))
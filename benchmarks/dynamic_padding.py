@@ -0,0 +1,88 @@
+"""
+    Benchmark: fixed length padding (MAX_LENGTH) vs bucketed dynamic padding (see network.bucketed_batches),
+        for scoring (ModelInterpreter) and for training (TrainingDataGenerator), in tokens per second.
+
+    Synthetic data with LC-QuAD like lengths (questions of 6-20 tokens, paths of 3-8), synthetic vectors,
+        and the model of network.build_model: fixed length and unmasked, or variable length and masked.
+        Also checks that the bucketed scores of the masked model are the same as when it's fed MAX_LENGTH.
+
+    Usage (from the root of the repo):
+        python benchmarks/dynamic_padding.py
+"""
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import network
+from utils import model_interpreter
+
+# Some MACROS
+VOCAB_SIZE = 5000
+EMBEDDING_DIMS = 100
+HIDDEN_UNITS = 64
+QUESTION_LENGTHS = (6, 20)
+PATH_LENGTHS = (3, 8)
+SCORING_ROWS = 4000
+TRAINING_QUESTIONS = 200
+NEG_PATHS_PER_EPOCH = 10
+BATCH_SIZE = 200
+
+
+def sequences(_n, _lengths, _random, _shape=None):
+    """
+    :return: np array of _n random sequences with lengths in _lengths, post padded to network.MAX_LENGTH
+    """
+    x = np.zeros((_n, network.MAX_LENGTH), dtype=np.int32)
+    for row, length in enumerate(_random.randint(_lengths[0], _lengths[1] + 1, size=_n)):
+        x[row, :length] = _random.randint(1, VOCAB_SIZE, size=length)
+    return x.reshape(_shape + (network.MAX_LENGTH,)) if _shape else x
+
+
+def bench_scoring(_vectors, _random):
+    ques = sequences(SCORING_ROWS, QUESTION_LENGTHS, _random)
+    paths = sequences(SCORING_ROWS, PATH_LENGTHS, _random)
+
+    scores = {}
+    for name, dynamic in [('fixed', False), ('bucketed', True)]:
+        model = network.build_model(_vectors, None if dynamic else network.MAX_LENGTH, nr_hidden=HIDDEN_UNITS,
+                                    mask_zero=dynamic)
+        interpreter = model_interpreter.ModelInterpreter(_gpu='0', _model=model)
+        interpreter.score(ques[:10], paths[:10])                                     # Warm up
+        interpreter.stats.update({'rows': 0, 'tokens': 0, 'fed': 0, 'seconds': 0.0})
+
+        scores[name] = interpreter.score(ques, paths)
+        tokens_per_second, padding = interpreter.tokens_per_second()
+        print("Scoring %-9s %9.0f tokens/s (%.1f%% of the fed tokens were padding)" %
+              (name, tokens_per_second, padding * 100))
+
+        if dynamic:
+            unbucketed = interpreter._predict(ques, paths)
+            print("Masked model, bucketed vs padded to %d: max difference %.2g" %
+                  (network.MAX_LENGTH, np.abs(scores[name] - unbucketed).max()))
+            assert np.allclose(scores[name], unbucketed, atol=1e-5), "Bucketing changed the scores"
+
+
+def bench_training(_vectors, _random):
+    questions = sequences(TRAINING_QUESTIONS, QUESTION_LENGTHS, _random)
+    pos_paths = sequences(TRAINING_QUESTIONS, PATH_LENGTHS, _random)
+    neg_paths = sequences(TRAINING_QUESTIONS * network.NEGATIVE_SAMPLES, PATH_LENGTHS, _random,
+                          _shape=(TRAINING_QUESTIONS, network.NEGATIVE_SAMPLES))
+
+    for name, dynamic in [('fixed', False), ('bucketed', True)]:
+        model = network.build_model(_vectors, None if dynamic else network.MAX_LENGTH, nr_hidden=HIDDEN_UNITS,
+                                    mask_zero=dynamic)
+        model.compile(optimizer='adam', loss=network.custom_loss)
+        generator = network.TrainingDataGenerator(questions, pos_paths, neg_paths, network.MAX_LENGTH,
+                                                  NEG_PATHS_PER_EPOCH, BATCH_SIZE, bucketed=dynamic)
+        tokens_per_second = network.TokensPerSecond(generator)
+        print("Training %s:" % name)
+        model.fit_generator(generator, epochs=2, verbose=0, callbacks=[tokens_per_second])
+
+
+if __name__ == "__main__":
+    random = np.random.RandomState(42)
+    vectors = random.rand(VOCAB_SIZE, EMBEDDING_DIMS).astype(np.float32)
+    bench_scoring(vectors, random)
+    bench_training(vectors, random)
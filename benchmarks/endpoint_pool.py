@@ -0,0 +1,203 @@
+"""
+    Harness for utils/endpoint_pool.py: stub SPARQL endpoints (local HTTP servers with a given latency, error rate
+        and capacity), and scenarios checking that the pool routes the way it should:
+        - round-robin and random spread requests evenly;
+        - 'health' routing avoids a slow replica, and a failing one (without the client seeing any failure);
+        - hedging cuts the tail latency;
+        - the per-endpoint concurrency cap holds;
+        - throughput scales with the number of replicas.
+
+    Usage (from the root of the repo):
+        python benchmarks/endpoint_pool.py          # exits with 1 if any check fails
+"""
+import os
+import sys
+import json
+import time
+import random
+import urllib
+import urllib2
+import threading
+import BaseHTTPServer
+import SocketServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import endpoint_pool
+
+# Some MACROS
+TIMEOUT = 2.0                   # seconds, per request
+QUERY = '''SELECT DISTINCT ?label WHERE { <http://dbpedia.org/resource/Stub> <http://www.w3.org/2000/01/rdf-schema#label> ?label }'''
+RESPONSE = json.dumps({u'head': {u'vars': [u'label']},
+                       u'results': {u'bindings': [{u'label': {u'type': u'literal', u'value': u'Stub'}}]}})
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        with server.capacity:
+            server.served += 1
+            time.sleep(server.latency() if callable(server.latency) else server.latency)
+            fail = random.random() < server.error_rate
+        if fail:
+            self.send_error(500, "Stub failure")
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/sparql-results+json')
+        self.send_header('Content-Length', str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubEndpoint(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+        A SPARQL endpoint which answers QUERY after some latency (seconds, or a function returning seconds),
+            fails error_rate of the time, and serves at most capacity requests at once.
+    """
+    daemon_threads = True
+
+    def __init__(self, _latency=0.005, _error_rate=0.0, _capacity=64):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.latency = _latency
+        self.error_rate = _error_rate
+        self.capacity = threading.BoundedSemaphore(_capacity)
+        self.served = 0
+        self.url = 'http://127.0.0.1:%d/sparql' % self.server_address[1]
+
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+
+def shoot(_url):
+    url = _url + '?' + urllib.urlencode({'query': QUERY, 'format': 'json'})
+    return json.loads(urllib2.urlopen(url, timeout=TIMEOUT).read())
+
+
+def run(_pool, _requests, _threads=1):
+    """
+    :return: list of latencies (s), number of failures, wall time (s)
+    """
+    latencies, failures = [], [0]
+    lock = threading.Lock()
+    remaining = [_requests]
+
+    def client():
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            start = time.time()
+            try:
+                _pool.execute(shoot)
+                with lock:
+                    latencies.append(time.time() - start)
+            except endpoint_pool.EndpointError:
+                with lock:
+                    failures[0] += 1
+
+    start = time.time()
+    threads = [threading.Thread(target=client) for _ in range(_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, failures[0], time.time() - start
+
+
+def percentile(_values, _q):
+    values = sorted(_values)
+    return values[min(int(_q * len(values)), len(values) - 1)] if values else float('nan')
+
+
+CHECKS = []
+
+
+def check(_name, _passed, _detail):
+    CHECKS.append(_passed)
+    print("[%s] %-45s %s" % ('PASS' if _passed else 'FAIL', _name, _detail))
+
+
+def even_spread(_method):
+    servers = [StubEndpoint() for _ in range(3)]
+    pool = endpoint_pool.EndpointPool([x.url for x in servers], _method=_method, _hedge=False)
+    run(pool, 300)
+    served = [x.served for x in servers]
+    expected = (100, 100) if _method == 'round-robin' else (60, 140)
+    check("%s spreads evenly" % _method, all(expected[0] <= x <= expected[1] for x in served), served)
+
+
+def avoids_slow_replica():
+    servers = [StubEndpoint(0.005), StubEndpoint(0.005), StubEndpoint(0.06)]
+    pool = endpoint_pool.EndpointPool([x.url for x in servers], _hedge=False)
+    run(pool, 300)
+    served = [x.served for x in servers]
+    check("health routing avoids the slow replica", served[2] < 0.15 * sum(served), served)
+
+
+def avoids_failing_replica():
+    servers = [StubEndpoint(), StubEndpoint(), StubEndpoint(_error_rate=1.0)]
+    pool = endpoint_pool.EndpointPool([x.url for x in servers], _hedge=False)
+    _, failures, _ = run(pool, 300)
+    served = [x.served for x in servers]
+    check("failing replica: no client failures", failures == 0, "failures: %d, served: %s" % (failures, served))
+    check("failing replica: circuit opened", pool.endpoints[2].breaker.stats['opened'] >= 1 and served[2] < 30,
+          pool.endpoints[2].breaker)
+
+
+def hedging_cuts_tail():
+
+    def spiky():
+        return 0.2 if random.random() < 0.05 else 0.005
+
+    p99 = {}
+    for hedge in [False, True]:
+        servers = [StubEndpoint(spiky) for _ in range(2)]
+        pool = endpoint_pool.EndpointPool([x.url for x in servers], _hedge=hedge)
+        latencies, _, _ = run(pool, 400)
+        p99[hedge] = percentile(latencies, 0.99)
+        print("\thedging %-3s p50: %6.1f ms, p99: %6.1f ms, hedges: %d" %
+              ('on' if hedge else 'off', percentile(latencies, 0.5) * 1e3, p99[hedge] * 1e3, pool.stats['hedges']))
+    check("hedging cuts the p99 latency", p99[True] < p99[False] / 2,
+          "%.1f ms -> %.1f ms" % (p99[False] * 1e3, p99[True] * 1e3))
+
+
+def concurrency_cap():
+    servers = [StubEndpoint(0.01) for _ in range(3)]
+    pool = endpoint_pool.EndpointPool([x.url for x in servers], _max_concurrency=2, _hedge=False)
+    _, failures, _ = run(pool, 300, _threads=20)
+    in_flight = [x.stats['max_in_flight'] for x in pool.endpoints]
+    check("concurrency cap holds", max(in_flight) <= 2 and failures == 0,
+          "max in flight: %s, failures: %d" % (in_flight, failures))
+
+
+def throughput_scales():
+    qps, failed = {}, 0
+    for replicas in [1, 3]:
+        # Every replica serves one request at a time (think: one Virtuoso worker), 10 ms each.
+        servers = [StubEndpoint(0.01, _capacity=1) for _ in range(replicas)]
+        pool = endpoint_pool.EndpointPool([x.url for x in servers], _max_concurrency=4, _hedge=False)
+        latencies, failures, wall = run(pool, 300, _threads=16)
+        qps[replicas] = len(latencies) / wall
+        failed += failures
+        print("\t%d replica(s): %6.1f queries/s, failures: %d" % (replicas, qps[replicas], failures))
+    check("throughput scales with replicas", qps[3] > 2 * qps[1] and failed == 0,
+          "%.1f -> %.1f queries/s" % (qps[1], qps[3]))
+
+
+if __name__ == "__main__":
+    random.seed(42)
+    even_spread('round-robin')
+    even_spread('random')
+    avoids_slow_replica()
+    avoids_failing_replica()
+    hedging_cuts_tail()
+    concurrency_cap()
+    throughput_scales()
+    print("%d/%d checks passed" % (sum(CHECKS), len(CHECKS)))
+    sys.exit(0 if all(CHECKS) else 1)
@@ -0,0 +1,98 @@
+"""
+    Benchmark of utils/evaluation.py on a synthetic model (of network.build_model, random weights) and synthetic
+        questions/paths/templates:
+        - parity: hits@1 of evaluate, on the same negatives, matches the old (repeat and predict) rank_precision,
+            and the encoder path scores like the whole model;
+        - the time to evaluate against all the negatives, both ways.
+
+    Usage (from the root of the repo):
+        python benchmarks/evaluation.py                 # exits with 1 if the numbers don't match
+"""
+import os
+import sys
+import time
+import numpy as np
+import keras.backend as K
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import network
+from utils import evaluation
+
+# Some MACROS
+VOCAB_SIZE = 5000
+EMBEDDING_DIMS = 100
+HIDDEN_UNITS = 64
+QUESTIONS = 200
+NEGATIVE_SAMPLES = 100
+NEG_PATHS_PER_QUESTION = 10
+TEMPLATES = [1, 2, 3, 5, 8]
+TOLERANCE = 1e-4
+
+
+def sequences(_random, _n, _lengths):
+    x = np.zeros((_n, network.MAX_LENGTH), dtype=np.int32)
+    for row, length in enumerate(_random.randint(_lengths[0], _lengths[1] + 1, size=_n)):
+        x[row, :length] = _random.randint(1, VOCAB_SIZE, size=length)
+    return x
+
+
+class WholeModel:
+    """
+        A keras model evaluate can't split into encoders, so that it scores (question, path) rows.
+    """
+
+    def __init__(self, _model):
+        self.predict, self.inputs = _model.predict, _model.inputs
+
+
+def old_rank_precision(_model, _columns, _questions, _pos_paths, _neg_paths):
+    """
+        The rank_precision of network.py before evaluation.py, with the negative columns given.
+    """
+    questions = np.repeat(_questions, len(_columns) + 1, axis=0)
+    all_paths = np.concatenate([_pos_paths[:, np.newaxis, :], _neg_paths[:, _columns, :]], axis=1)
+    all_paths = all_paths.reshape(-1, _questions.shape[1])
+    outputs = _model.predict([questions, all_paths, np.zeros_like(all_paths)])[:, 0]
+    outputs = outputs.reshape(_questions.shape[0], len(_columns) + 1)
+    return float((np.argmax(outputs, axis=1) == 0).sum()) / outputs.shape[0]
+
+
+if __name__ == "__main__":
+    K.clear_session()
+    random = np.random.RandomState(42)
+    model = network.build_model(random.rand(VOCAB_SIZE, EMBEDDING_DIMS).astype(np.float32), network.MAX_LENGTH,
+                                nr_hidden=HIDDEN_UNITS, mask_zero=False)
+
+    questions = sequences(random, QUESTIONS, (6, 20))
+    pos_paths = sequences(random, QUESTIONS, (3, 8))
+    neg_paths = sequences(random, QUESTIONS * NEGATIVE_SAMPLES, (3, 8)).reshape(QUESTIONS, NEGATIVE_SAMPLES, -1)
+    templates = random.choice(TEMPLATES, QUESTIONS)
+
+    # So that the ranks are spread: the positive path shares tokens with the question
+    pos_paths[:, :2] = questions[:, :2]
+
+    passed = True
+    columns = np.random.RandomState(evaluation.SEED).choice(NEGATIVE_SAMPLES, NEG_PATHS_PER_QUESTION, replace=False)
+    old = old_rank_precision(model, columns, questions, pos_paths, neg_paths)
+    new = evaluation.evaluate(model, questions, pos_paths, neg_paths, _negatives=NEG_PATHS_PER_QUESTION)
+    passed = passed and abs(old - new['all']['hits@1']) < 1e-9
+    print("[%s] hits@1 against %d negatives: rank_precision %.4f, evaluate %.4f" % (
+        'PASS' if abs(old - new['all']['hits@1']) < 1e-9 else 'FAIL', NEG_PATHS_PER_QUESTION, old,
+        new['all']['hits@1']))
+
+    encoders = evaluation.Encoders(model)
+    paths = np.concatenate([pos_paths[:, np.newaxis, :], neg_paths], axis=1)
+    difference = np.abs(evaluation._scores_by_encoding(encoders, questions, paths) -
+                        evaluation._scores_by_rows(model, questions, paths)).max()
+    passed = passed and difference <= TOLERANCE
+    print("[%s] encoders against the whole model, max difference: %.2g" % ('PASS' if difference <= TOLERANCE
+                                                                            else 'FAIL', difference))
+
+    for name, evaluated in [('encoders', model), ('whole model', WholeModel(model))]:
+        start = time.time()
+        results = evaluation.evaluate(evaluated, questions, pos_paths, neg_paths, _templates=templates)
+        print("%-11s: %d questions x %d negatives in %.2f s" % (name, QUESTIONS, NEGATIVE_SAMPLES,
+                                                                time.time() - start))
+    evaluation.report(results)
+    sys.exit(0 if passed else 1)
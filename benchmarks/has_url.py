@@ -0,0 +1,80 @@
+"""
+    Micro-benchmark: nlutils.has_url (prefix fast path + LRU memo) vs. plain validators.url
+
+    The stream of strings is what the DBpedia interface sees while answering LC-QuAD:
+        every URI in the SPARQL queries (resources, predicates, classes), their shorthands, and a few literals,
+        repeated over a number of passes (the same URIs keep coming back across questions).
+
+    Usage (from the root of the repo):
+        python benchmarks/has_url.py [passes]
+"""
+import os
+import re
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import validators
+from utils import natural_language_utilities as nlutils
+
+# Some MACROS
+LCQUAD_DIR = './resources/data_set.json'
+PASSES = 5
+URI_RE = re.compile(r'<([^>]+)>')
+SHORTHANDS = {'http://dbpedia.org/ontology/': 'dbo:', 'http://dbpedia.org/property/': 'dbp:',
+              'http://dbpedia.org/resource/': 'dbr:'}
+
+
+def uri_stream(_lcquad_dir=LCQUAD_DIR):
+    """
+        One pass worth of strings, in the order they appear in LC-QuAD.
+    """
+    stream = []
+    for node in json.load(open(_lcquad_dir)):
+        for uri in URI_RE.findall(node[u'sparql_query']):
+            stream.append(uri)
+            for prefix, shorthand in SHORTHANDS.items():
+                if uri.startswith(prefix):
+                    stream.append(shorthand + uri[len(prefix):])
+        stream.append(node[u'corrected_question'] or u'')
+    return stream
+
+
+def old_has_url(_string):
+    if validators.url(_string):
+        return True
+    return False
+
+
+def time_it(_function, _stream, _passes):
+    start = time.time()
+    for _ in range(_passes):
+        for string in _stream:
+            _function(string)
+    return time.time() - start
+
+
+if __name__ == "__main__":
+    passes = int(sys.argv[1]) if len(sys.argv) > 1 else PASSES
+    stream = uri_stream()
+
+    # Sanity check: same verdicts.
+    mismatches = [x for x in set(stream) if old_has_url(x) != nlutils.has_url(x)]
+    print("Strings per pass: %d (%d unique). Mismatches: %d" % (len(stream), len(set(stream)), len(mismatches)))
+    for string in mismatches[:10]:
+        print("\t%r" % string)
+
+    calls = float(len(stream) * passes)
+
+    nlutils.has_url.cache_clear()
+    old = time_it(old_has_url, stream, passes)
+    new = time_it(nlutils.has_url, stream, passes)
+    memo_info = nlutils.has_url.cache_info()
+    no_memo = time_it(nlutils.has_url.__wrapped__, stream, passes)
+
+    print("validators.url:          %8.3f us/call" % (old / calls * 1e6))
+    print("has_url (memo):          %8.3f us/call" % (new / calls * 1e6))
+    print("has_url (no memo):       %8.3f us/call" % (no_memo / calls * 1e6))
+    print("Memo: %s" % str(memo_info))
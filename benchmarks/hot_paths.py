@@ -0,0 +1,226 @@
+"""
+    Micro-benchmarks of the hot primitives of the pipeline, on LC-QuAD inputs, offline:
+        nlutils.tokenize and has_url (memo cleared, and warm), embeddings_interface.vocabularize, vectorize and
+        phrase_similarity, ModelInterpreter.rank and Krantikari.similar_predicates.
+
+    GloVe is replaced by a tiny synthetic one (the tokens of the inputs, UNK_RATE of them left out, random vectors),
+        and the model by one of network.build_model with random weights. The numbers are about the code, not the data.
+
+    Per benchmark: ns/op (best of REPEATS passes over the inputs), and over one more pass, the memory still allocated
+        afterwards (net: eg. what memos keep). With tracemalloc (python 3), also the peak memory of the pass, and the
+        number of blocks still allocated per op. On python 2, the retained memory is the growth of the RSS.
+
+    Baselines are stored in BASELINE_FILE. Runs are compared to it, and ns/op more than REGRESSION slower is flagged.
+        Only compare runs of the same machine (and keep it otherwise idle: on a busy one, passes vary by 2x).
+
+    Usage (from the root of the repo):
+        python benchmarks/hot_paths.py              # exits with 1 on regressions (if there's a baseline)
+        python benchmarks/hot_paths.py save         # run, and store the results as the baseline
+"""
+import os
+import re
+import sys
+import gc
+import json
+import time
+import subprocess
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import network
+import krantikari
+from utils import model_interpreter
+from utils import embeddings_interface
+from utils import natural_language_utilities as nlutils
+
+# Some MACROS
+LCQUAD_DIR = './resources/data_set.json'
+BASELINE_FILE = './benchmarks/baselines/hot_paths.json'
+QUESTIONS = 500
+EMBEDDING_DIMS = 300                # vectorize pads unknown tokens with 300 zeros
+UNK_RATE = 0.1
+HIDDEN_UNITS = 64
+PATHS_PER_CALL = 40                 # rank
+PREDICATES_PER_CALL = 50            # similar_predicates
+RANK_CALLS = 20
+REPEATS = 5
+REGRESSION = 0.25
+SEED = 42
+URI_RE = re.compile(r'<([^>]+)>')
+PREDICATE_RE = re.compile(r'^http://dbpedia\.org/(?:ontology|property)/[a-z]')
+
+
+class Shortlister(krantikari.Krantikari):
+    """
+        Just enough of Krantikari for similar_predicates (without answering anything).
+    """
+
+    def __init__(self, _question):
+        self.question = _question
+        self.EMBEDDING = 'glove'
+
+
+def lcquad_inputs(_n=QUESTIONS, _lcquad_dir=LCQUAD_DIR):
+    """
+    :return: list of questions, list of URIs (as they appear in the queries), sorted list of predicate labels
+    """
+    questions, uris = [], []
+    for node in json.load(open(_lcquad_dir))[:_n]:
+        if node[u'corrected_question']:
+            questions.append(node[u'corrected_question'])
+        uris += URI_RE.findall(node[u'sparql_query'])
+    labels = sorted(set(nlutils.get_label_via_parsing(x) for x in uris if PREDICATE_RE.match(x)))
+    return questions, uris, labels
+
+
+def synthetic_glove(_texts, _random):
+    """
+        Install a GloVe of the tokens of _texts (random vectors) in embeddings_interface, instead of the real one.
+    """
+    vocab = {'UNK': 0, '+': 1, '-': 2, '/': 3}
+    for token in sorted(set(x.lower() for text in _texts for x in nlutils.tokenize(text))):
+        if token not in vocab and _random.rand() >= UNK_RATE:
+            vocab[token] = len(vocab)
+    embeddings_interface.glove_vocab = vocab
+    embeddings_interface.glove_embeddings = _random.normal(0, 0.4, size=(len(vocab), EMBEDDING_DIMS)) \
+        .astype(embeddings_interface.GLOVE_DTYPE)
+    return embeddings_interface.glove_embeddings
+
+
+def benchmarks(_random):
+    """
+    :return: list of (name, function of one input, inputs, setup before every pass (or None))
+    """
+    questions, uris, labels = lcquad_inputs()
+    vectors = synthetic_glove(questions + labels, _random)
+    model = model_interpreter.ModelInterpreter(_gpu=None, _model=network.build_model(
+        vectors, network.MAX_LENGTH, nr_hidden=HIDDEN_UNITS, mask_zero=False))
+
+    tokenized = [nlutils.tokenize(x) for x in questions]
+    texts = questions + labels
+    pairs = [(question, labels[i]) for question, i in zip(questions, _random.randint(0, len(labels), len(questions)))]
+
+    vocabularize = lambda x: embeddings_interface.vocabularize(x, _embedding='glove')
+    rank_calls = []
+    for question in questions[:RANK_CALLS]:
+        paths = [['entity', '+'] + nlutils.tokenize(labels[i]) for i in _random.randint(0, len(labels),
+                                                                                          PATHS_PER_CALL)]
+        rank_calls.append((vocabularize(nlutils.tokenize(question)), [vocabularize(x) for x in paths]))
+    shortlists = [(Shortlister(question), [labels[i] for i in _random.randint(0, len(labels), PREDICATES_PER_CALL)])
+                  for question in questions[:RANK_CALLS]]
+
+    return [('nlutils.tokenize (cold)', nlutils.tokenize, texts, nlutils._tokenize.cache_clear),
+            ('nlutils.tokenize (warm)', nlutils.tokenize, texts, None),
+            ('nlutils.has_url (cold)', nlutils.has_url, uris, nlutils.has_url.cache_clear),
+            ('nlutils.has_url (warm)', nlutils.has_url, uris, None),
+            ('vocabularize', vocabularize, tokenized, None),
+            ('vectorize', lambda x: embeddings_interface.vectorize(x, _embedding='glove'), tokenized, None),
+            ('phrase_similarity', lambda x: embeddings_interface.phrase_similarity(x[0], x[1]), pairs, None),
+            ('ModelInterpreter.rank', lambda x: model.rank(x[0], x[1], _k=5), rank_calls, None),
+            ('Krantikari.similar_predicates', lambda x: x[0].similar_predicates(x[1], _return_indices=True, _k=20),
+             shortlists, None)]
+
+
+def rss_kb():
+    """
+        Resident memory of the process (linux), or 0 where /proc isn't there.
+    """
+    try:
+        return int(open('/proc/self/statm').read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024.0
+    except (IOError, OSError, ValueError):
+        return 0.0
+
+
+def measure(_function, _inputs, _setup=None, _repeats=REPEATS):
+    """
+    :return: dict: ns_per_op, retained_kb, peak_kb and blocks_per_op (None without tracemalloc)
+    """
+    best = np.inf
+    for _ in range(_repeats):
+        if _setup:
+            _setup()
+        start = time.time()
+        for x in _inputs:
+            _function(x)
+        best = min(best, time.time() - start)
+    result = {'ops': len(_inputs), 'ns_per_op': best / len(_inputs) * 1e9}
+
+    if _setup:
+        _setup()
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        for x in _inputs:
+            _function(x)
+        retained = tracemalloc.take_snapshot().statistics('filename')
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result.update({'retained_kb': current / 1024.0, 'peak_kb': peak / 1024.0,
+                       'blocks_per_op': sum(x.count for x in retained) / float(len(_inputs))})
+    else:
+        rss = rss_kb()
+        for x in _inputs:
+            _function(x)
+        gc.collect()
+        result.update({'retained_kb': rss_kb() - rss, 'peak_kb': None, 'blocks_per_op': None})
+    return result
+
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def report(_results, _baseline=None):
+    """
+    :return: names of the benchmarks slower than the baseline by more than REGRESSION
+    """
+    regressions = []
+    optional = lambda x, format: format % x if x is not None else '-'
+    print("%-32s %12s %12s %10s %10s" % ('benchmark', 'ns/op', 'retained KB', 'peak KB', 'blocks/op') +
+          (" %12s %9s" % ('baseline', 'change') if _baseline else ''))
+    for name, result in _results:
+        line = "%-32s %12.0f %12.1f %10s %10s" % (name, result['ns_per_op'], result['retained_kb'],
+                                                  optional(result['peak_kb'], '%.1f'),
+                                                  optional(result['blocks_per_op'], '%.2f'))
+        base = (_baseline or {}).get(name)
+        if base:
+            change = result['ns_per_op'] / base['ns_per_op'] - 1
+            line += " %12.0f %+8.1f%%" % (base['ns_per_op'], 100 * change)
+            if change > REGRESSION:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+    return regressions
+
+
+if __name__ == "__main__":
+    save = len(sys.argv) > 1 and sys.argv[1] == 'save'
+    random = np.random.RandomState(SEED)
+
+    results = []
+    for name, function, inputs, setup in benchmarks(random):
+        results.append((name, measure(function, inputs, setup)))
+
+    baseline = None
+    if not save and os.path.exists(BASELINE_FILE):
+        stored = json.load(open(BASELINE_FILE))
+        baseline = stored['results']
+        print("Baseline: commit %s, python %s" % (stored['commit'], stored['python']))
+    regressions = report(results, baseline)
+
+    if save:
+        if not os.path.exists(os.path.dirname(BASELINE_FILE)):
+            os.makedirs(os.path.dirname(BASELINE_FILE))
+        json.dump({'commit': commit(), 'python': sys.version.split()[0], 'numpy': np.__version__,
+                   'results': dict(results)}, open(BASELINE_FILE, 'w'), indent=1, sort_keys=True)
+        print("Baseline stored in %s" % BASELINE_FILE)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,120 @@
+"""
+    Load test for server.py: LC-QuAD questions (with one topic entity), POSTed to /answer by a number of
+        concurrent clients. Reports requests per second, latency percentiles, failures,
+        and where the time goes on the server (the timings it sends back).
+
+    Usage (from the root of the repo, with the server running):
+        python benchmarks/load_test.py [url] [clients] [requests]
+        eg. python benchmarks/load_test.py http://localhost:8080 8 200
+"""
+import re
+import sys
+import json
+import time
+import urllib2
+import threading
+
+# Some MACROS
+URL = 'http://localhost:8080'
+CLIENTS = 4
+REQUESTS = 100
+LCQUAD_DIR = './resources/data_set.json'
+RESOURCE_RE = re.compile(r'<(http://dbpedia\.org/resource/[^>]+)>')
+READY_TIMEOUT = 600                 # seconds to wait for the server to load everything
+
+
+def questions(_lcquad_dir=LCQUAD_DIR):
+    """
+        (question, [entity]) for every LC-QuAD question with exactly one resource in its query
+    """
+    pairs = []
+    for node in json.load(open(_lcquad_dir)):
+        entities = sorted(set(RESOURCE_RE.findall(node[u'sparql_query'])))
+        if len(entities) == 1 and node[u'corrected_question']:
+            pairs.append((node[u'corrected_question'], entities))
+    return pairs
+
+
+def wait_until_ready(_url, _timeout=READY_TIMEOUT):
+    """
+        Poll /ready until the server has loaded everything. Raises RuntimeError if loading failed, or took too long.
+    """
+    start = time.time()
+    while time.time() - start < _timeout:
+        try:
+            urllib2.urlopen(_url + '/ready', timeout=5).read()
+            return time.time() - start
+        except urllib2.HTTPError as e:
+            # 503 while loading, and after loading failed (then there's no point in waiting)
+            try:
+                body = json.loads(e.read())
+            except ValueError:
+                body = {}
+            if body.get('state') == 'failed':
+                raise RuntimeError("Server at %s failed to load: %s" % (_url, body.get('error')))
+            time.sleep(1)
+        except (urllib2.URLError, IOError):
+            time.sleep(1)
+    raise RuntimeError("Server at %s not ready after %d seconds" % (_url, _timeout))
+
+
+def post(_url, _question, _entities):
+    request = urllib2.Request(_url + '/answer', json.dumps({'question': _question, 'entities': _entities}),
+                              {'Content-Type': 'application/json'})
+    return json.loads(urllib2.urlopen(request, timeout=READY_TIMEOUT).read())
+
+
+def percentile(_values, _q):
+    values = sorted(_values)
+    return values[min(int(_q * len(values)), len(values) - 1)] if values else float('nan')
+
+
+def run(_url, _clients, _requests, _questions):
+    latencies, timings, failures = [], [], []
+    lock = threading.Lock()
+    counter = [0]
+
+    def client():
+        while True:
+            with lock:
+                if counter[0] >= _requests:
+                    return
+                question, entities = _questions[counter[0] % len(_questions)]
+                counter[0] += 1
+            start = time.time()
+            try:
+                result = post(_url, question, entities)
+                with lock:
+                    latencies.append(time.time() - start)
+                    timings.append(result[u'timings'])
+            except Exception as e:
+                with lock:
+                    failures.append(str(e))
+
+    start = time.time()
+    threads = [threading.Thread(target=client) for _ in range(_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, timings, failures, time.time() - start
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else URL
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else CLIENTS
+    requests = int(sys.argv[3]) if len(sys.argv) > 3 else REQUESTS
+
+    print("Waiting for %s to be ready ... %.1f s" % (url, wait_until_ready(url)))
+    latencies, timings, failures, wall = run(url, clients, requests, questions())
+
+    print("%d requests, %d clients: %.2f requests/s, %d failures" % (requests, clients, len(latencies) / wall,
+                                                                     len(failures)))
+    print("Latency (s): p50 %.3f, p90 %.3f, p99 %.3f, max %.3f" %
+          (percentile(latencies, 0.5), percentile(latencies, 0.9), percentile(latencies, 0.99),
+           max(latencies) if latencies else float('nan')))
+    stages = sorted(set(stage for x in timings for stage in x))
+    print("Server side (mean s): " + ", ".join("%s %.3f" % (stage, sum(x.get(stage, 0) for x in timings) / len(timings))
+                                               for stage in stages) if timings else "")
+    for failure in failures[:5]:
+        print("\t%s" % failure)
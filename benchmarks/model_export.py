@@ -0,0 +1,108 @@
+"""
+    Parity and latency of the CPU exports of utils/model_export.py (frozen graph, NumPy) against the Keras model.
+
+    A model like the one of network.build_model (fixed length and unmasked, and dynamic and masked) is built with
+        random weights and saved. It's then exported, and all three score the same question/paths:
+        the scores must match within TOLERANCE. Then, the time of a rank call, for a few numbers of paths.
+
+    Usage (from the root of the repo):
+        python benchmarks/model_export.py               # exits with 1 if the scores don't match
+        python benchmarks/model_export.py <model_dir>   # a trained model instead
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+import keras.backend as K
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import network
+from utils import model_export
+from utils import model_interpreter
+
+# Some MACROS
+VOCAB_SIZE = 5000
+EMBEDDING_DIMS = 100
+HIDDEN_UNITS = 64
+TOLERANCE = 1e-4
+PARITY_PATHS = 200
+PATHS_PER_CALL = [1, 5, 40]
+CALLS = 50
+
+
+def synthetic_model_dir(_dynamic):
+    """
+    :return: a (temporary) directory with a model.h5 of random weights
+    """
+    K.clear_session()
+    random = np.random.RandomState(42)
+    vectors = random.rand(VOCAB_SIZE, EMBEDDING_DIMS).astype(np.float32)
+    model = network.build_model(vectors, None if _dynamic else network.MAX_LENGTH, nr_hidden=HIDDEN_UNITS,
+                                mask_zero=_dynamic)
+    model.compile(optimizer='adam', loss=network.custom_loss)
+    model_dir = tempfile.mkdtemp()
+    model.save(os.path.join(model_dir, 'model.h5'))
+    return model_dir
+
+
+def inputs(_random, _paths):
+    question = _random.randint(1, VOCAB_SIZE, size=_random.randint(6, 20))
+    return question, [_random.randint(1, VOCAB_SIZE, size=_random.randint(3, 9)) for _ in range(_paths)]
+
+
+def compare(_model_dir):
+    """
+    :return: True if the exports score like the Keras model
+    """
+    export_dir = tempfile.mkdtemp()
+    try:
+        model_export.export(_model_dir, export_dir)
+        K.clear_session()
+        scorers = [('keras', model_interpreter.ModelInterpreter(_gpu=None, _model_dir=_model_dir)),
+                   ('frozen', model_export.FrozenScorer(export_dir)),
+                   ('numpy', model_export.NumpyScorer.load(export_dir))]
+    finally:
+        shutil.rmtree(export_dir)
+
+    # Rows of two different questions, as when the batch scheduler mixes requests
+    random = np.random.RandomState(0)
+    padded = [scorers[0][1].pad_inputs(*inputs(random, PARITY_PATHS / 2)) for _ in range(2)]
+    padded_ques, padded_paths = np.concatenate([x[0] for x in padded]), np.concatenate([x[1] for x in padded])
+    reference = scorers[0][1].score(padded_ques, padded_paths)
+
+    passed = True
+    for name, scorer in scorers[1:]:
+        difference = np.abs(scorer.score(padded_ques, padded_paths) - reference).max()
+        passed = passed and difference <= TOLERANCE
+        print("[%s] %-7s max difference to keras: %.2g" % ('PASS' if difference <= TOLERANCE else 'FAIL', name,
+                                                           difference))
+
+    for n in PATHS_PER_CALL:
+        calls = [inputs(random, n) for _ in range(CALLS)]
+        line = []
+        for name, scorer in scorers:
+            scorer.rank(*calls[0])                                  # Warm up
+            start = time.time()
+            for question, paths in calls:
+                scorer.rank(question, paths, _k=5)
+            line.append("%s %8.0f us" % (name, (time.time() - start) / CALLS * 1e6))
+        print("%3d paths per call: %s" % (n, ", ".join(line)))
+    return passed
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        passed = compare(sys.argv[1])
+    else:
+        passed = True
+        for dynamic in [False, True]:
+            print("Synthetic model, %s:" % ('dynamic (masked)' if dynamic else 'fixed length'))
+            model_dir = synthetic_model_dir(dynamic)
+            try:
+                passed = compare(model_dir) and passed
+            finally:
+                shutil.rmtree(model_dir)
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,348 @@
+"""
+    End to end benchmark of Krantikari (question -> best path), on a local stub of the knowledge base, so that runs
+        don't depend on the endpoint at sda-srv01 (its load, its cache, the network) and can be compared between commits.
+
+    The stub KB is built, deterministically, from:
+        - the neighbourhoods stored in the preprocessed JSONs (data/preprocesseddata*/): 1-hop predicates of the topic
+            entities, and the 2-hop predicates behind some of them;
+        - the true paths of resources/data_set.json (so that every question of LC-QuAD can be answered);
+        - for everything else (entities, or hop-1 predicates, without a stored neighbourhood), a sample of the
+            predicates seen so far, seeded by the entity (and predicate).
+    StubDBPedia is the real DBPedia interface (endpoint pool, in-flight coalescing, label handling) with the Redis cache,
+        the neighbourhood index and the label file off, answering the SPARQL queries from the stub instead of over HTTP.
+        So every lookup of the pipeline is a query, and it is counted (per kind of query).
+
+    A fixed set of LC-QuAD questions (one topic entity; those with a stored neighbourhood first, by _id) goes through
+        Krantikari. Per question: the time spent per stage (Krantikari.timings), the queries, and the accuracy
+        (krantikari.evaluate). The summary and every question are written to a JSON file, which later runs can be
+        compared to (say, on another commit).
+
+    Needs GloVe and a trained model (MODEL_DIR), just like krantikari.py.
+
+    Usage (from the root of the repo):
+        python benchmarks/pipeline.py [questions] [output.json] [baseline.json]
+        eg. python benchmarks/pipeline.py 200 head.json
+            git checkout <other commit>; python benchmarks/pipeline.py 200 other.json head.json
+"""
+import os
+import re
+import sys
+import glob
+import json
+import time
+import random
+import hashlib
+import threading
+import subprocess
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import krantikari
+from utils import model_export
+from utils import model_interpreter
+from utils import neighbourhood_index
+from utils import dbpedia_interface as db_interface
+from utils import natural_language_utilities as nlutils
+
+# Some MACROS
+QUESTIONS = 200
+SEED = 42
+PREPROCESSED_DIRS = ['./data/preprocesseddata_new_v2', './data/preprocesseddata']
+MODEL_DIR = model_interpreter.DEFAULT_MODEL_DIR
+SCORER = 'keras'                    # or 'numpy' (see utils/model_export.py)
+LATENCY = 0.0                       # seconds added to every query (to mimic a remote endpoint)
+HOP1_DISTRACTORS = 40               # predicates around an entity without a stored neighbourhood (besides the true ones)
+HOP2_DISTRACTORS = 10               # same, behind a hop-1 predicate
+STUB_ENDPOINT = 'http://stub.kb/sparql'
+STAGES = ['hop1_subgraph', 'hop1_rank', 'hop2', 'total']
+
+
+def _template_re(_template):
+    """
+        A SPARQL template of dbpedia_interface.py -> a regex matching its queries, with a group per placeholder.
+    """
+    pieces = re.split(r'%\((\w+)\)s', _template)
+    pattern = ''.join(re.escape(piece) if i % 2 == 0 else '(?P<%s>.+?)' % piece for i, piece in enumerate(pieces))
+    return re.compile('^' + pattern + '$', re.DOTALL)
+
+
+# The queries the stub answers: (kind, regex, (hop-1 outgoing, hop-2 outgoing) for 2-hop queries)
+QUERIES = [('hop1', _template_re(db_interface.GET_RIGHT_PROPERTIES_OF_RESOURCE), True),
+           ('hop1', _template_re(db_interface.GET_LEFT_PROPERTIES_OF_RESOURCE), False),
+           ('hop1_values', _template_re(db_interface.GET_RIGHT_PROPERTIES_OF_RESOURCES), True),
+           ('hop1_values', _template_re(db_interface.GET_LEFT_PROPERTIES_OF_RESOURCES), False),
+           ('label', _template_re(db_interface.GET_LABEL_OF_RESOURCE), None),
+           ('entities', _template_re(db_interface.GET_OBJECT), True),
+           ('entities', _template_re(db_interface.GET_SUBJECT), False)] + \
+          [('hop2', _template_re(db_interface.GET_HOP2_PROPERTIES % {'hop2': pattern}), directions)
+           for directions, pattern in db_interface.HOP2_PATTERNS.items()]
+
+
+def _results(_variable, _values, _type='uri'):
+    """
+        SPARQL results (JSON) of one variable
+    """
+    bindings = []
+    for value in _values:
+        binding = {u'type': _type, u'value': value}
+        if _type == 'literal':
+            binding[u'xml:lang'] = u'en'
+        bindings.append({_variable: binding})
+    return {u'head': {u'vars': [_variable]}, u'results': {u'bindings': bindings}}
+
+
+class StubKB:
+    """
+        Predicate neighbourhoods of entities (keyed like utils/neighbourhood_index.py), which answer the SPARQL queries
+            of the DBPedia interface. Counts the queries it answers, per kind.
+    """
+
+    def __init__(self, _seed=SEED):
+        self.seed = _seed
+        self.hop1 = {}              # hop1_key -> set of predicate URIs
+        self.hop2 = {}              # hop2_key -> set of predicate URIs
+        self.stored = set()         # entities, and (entity, predicate, direction), whose neighbourhood was stored
+        self.predicates = set()
+        self.pool = None            # sorted self.predicates, to draw distractors from
+        self.queries = dict((kind, 0) for kind, _, _ in QUERIES + [('other', None, None)])
+        self.lock = threading.Lock()
+
+    def _add(self, _table, _key, _predicates):
+        self.predicates.update(_predicates)
+        self.pool = None
+        _table.setdefault(_key, set()).update(_predicates)
+
+    def add_preprocessed(self, _node):
+        """
+            The neighbourhoods of a question of the preprocessed JSONs (node[u'training']).
+                (Its u'x' and u'uri' keys are the candidate types of the variables: not neighbourhoods.)
+        """
+        for entity, neighbourhood in _node.get(u'training', {}).items():
+            if not isinstance(neighbourhood, dict):
+                continue
+            right, left = neighbourhood[u'rel1']
+            self._add(self.hop1, neighbourhood_index.hop1_key(entity, True), right)
+            self._add(self.hop1, neighbourhood_index.hop1_key(entity, False), left)
+            self.stored.add(entity)
+
+            for hop1_right, hop1_predicates in zip([True, False], neighbourhood.get(u'rel2', [])):
+                for hop2 in hop1_predicates:
+                    for predicate, (hop2_right, hop2_left) in hop2.items():
+                        self._add(self.hop2, neighbourhood_index.hop2_key(entity, predicate, hop1_right, True),
+                                  hop2_right)
+                        self._add(self.hop2, neighbourhood_index.hop2_key(entity, predicate, hop1_right, False),
+                                  hop2_left)
+                        self.stored.add((entity, predicate, hop1_right))
+
+    def add_path(self, _entity, _path):
+        """
+            A true path of LC-QuAD (see krantikari.parse_lcquad), eg. ['-http://...starring', '+http://...producer']
+        """
+        self._add(self.hop1, neighbourhood_index.hop1_key(_entity, _path[0][0] == '+'), [_path[0][1:]])
+        if len(_path) > 1:
+            self._add(self.hop2, neighbourhood_index.hop2_key(_entity, _path[0][1:], _path[0][0] == '+',
+                                                              _path[1][0] == '+'), [_path[1][1:]])
+
+    def _distractors(self, _key, _n):
+        """
+            _n predicates of all the known ones, always the same for a key.
+        """
+        if self.pool is None:
+            self.pool = sorted(self.predicates)
+        rng = random.Random(int(hashlib.md5((u'%s\t%s' % (self.seed, _key)).encode('utf-8')).hexdigest(), 16))
+        return rng.sample(self.pool, min(_n, len(self.pool)))
+
+    def get_hop1(self, _entity, _right):
+        key = neighbourhood_index.hop1_key(_entity, _right)
+        predicates = set(self.hop1.get(key, []))
+        if _entity not in self.stored:
+            predicates.update(self._distractors(key, HOP1_DISTRACTORS))
+        return sorted(predicates)
+
+    def get_hop2(self, _entity, _predicate, _right, _right_hop2):
+        key = neighbourhood_index.hop2_key(_entity, _predicate, _right, _right_hop2)
+        predicates = set(self.hop2.get(key, []))
+        if (_entity, _predicate, _right) not in self.stored:
+            predicates.update(self._distractors(key, HOP2_DISTRACTORS))
+        return sorted(predicates)
+
+    def answer(self, _query):
+        """
+        :param _query: str: SPARQL, as made by the DBPedia interface
+        :return: dict: SPARQL results (JSON)
+        """
+        for kind, regex, directions in QUERIES:
+            match = regex.match(_query)
+            if match is None:
+                continue
+            with self.lock:
+                self.queries[kind] += 1
+            values = match.groupdict()
+            uri = lambda name: values[name].strip()[1:-1]
+
+            if kind == 'hop1':
+                return _results('property', self.get_hop1(uri('target_resource'), directions))
+            if kind == 'hop1_values':
+                entities = [x[1:-1] for x in values['target_resources'].split()]
+                return _results('property', sorted(set(p for x in entities for p in self.get_hop1(x, directions))))
+            if kind == 'hop2':
+                return _results('property', self.get_hop2(uri('target_resource'), uri('property'), *directions))
+            if kind == 'label':
+                return _results('label', [nlutils.get_label_via_parsing(uri('target_resource'))], _type='literal')
+            return _results('entity', [])       # No entities in the stub: hop-2 falls back to nothing
+
+        with self.lock:
+            self.queries['other'] += 1
+        return _results('unknown', [])
+
+
+class StubDBPedia(db_interface.DBPedia):
+    """
+        The DBPedia interface, answering from a StubKB. No Redis, no neighbourhood index, and labels only in memory
+            (the stub's labels must not end up in resources/labels.pickle).
+    """
+
+    def __init__(self, _kb, _latency=LATENCY):
+        db_interface.DBPedia.__init__(self, caching=False, _use_neighbourhood_index=False,
+                                      _endpoints=[STUB_ENDPOINT])
+        self.kb = _kb
+        self.latency = _latency
+        self.labels = {}
+
+    def _shoot(self, _endpoint, _custom_query):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.kb.answer(_custom_query)
+
+    def add_labels(self, _labels):
+        with self.labels_lock:
+            self.labels.update(_labels)
+
+
+def load(_n=QUESTIONS, _preprocessed_dirs=PREPROCESSED_DIRS, _lcquad_dir=krantikari.LCQUAD_DIR):
+    """
+    :return: StubKB, list of the (parsed, see krantikari.parse_lcquad) questions to run
+    """
+    kb = StubKB()
+    for directory in _preprocessed_dirs:
+        for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+            for node in json.load(open(path)):
+                kb.add_preprocessed(node)
+
+    questions = []
+    for node in json.load(open(_lcquad_dir)):
+        parsed = krantikari.parse_lcquad(node)
+        if not parsed or len(parsed[u'entity']) != 1:
+            continue
+        kb.add_path(parsed[u'entity'][0], parsed[u'path'])
+        questions.append(parsed)
+
+    questions.sort(key=lambda x: (x[u'entity'][0] not in kb.stored, x[u'_id']))
+    return kb, questions[:_n]
+
+
+def load_model(_scorer=SCORER, _model_dir=MODEL_DIR):
+    if _scorer == 'numpy':
+        return model_export.NumpyScorer.load(_model_dir)
+    return model_interpreter.ModelInterpreter(_gpu=None, _model_dir=_model_dir)
+
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(_kb, _dbp, _model, _questions):
+    """
+    :return: list of dicts, one per question: timings, queries (per kind), accuracy
+    """
+    records = []
+    for parsed in _questions:
+        np.random.seed(SEED)                                # Labels with many forms are picked at random
+        before = dict(_kb.queries)
+        record = {'_id': parsed[u'_id'], 'template': parsed[u'sparql_template_id']}
+        try:
+            qa = krantikari.Krantikari(_question=parsed[u'corrected_question'], _entities=parsed[u'entity'],
+                                       _dbpedia_interface=_dbp, _model_interpreter=_model)
+            evaluation = krantikari.evaluate(parsed, qa.best_path)
+            record.update({'timings': qa.timings, 'path_length': qa.stats.get('path_length'),
+                           'perfect_match': evaluation['perfect-match']['score'],
+                           'right_length': evaluation['path-length']['score']})
+        except Exception as e:
+            record['error'] = '%s: %s' % (e.__class__.__name__, e)
+        record['queries'] = dict((kind, _kb.queries[kind] - before[kind]) for kind in before
+                                 if _kb.queries[kind] > before[kind])
+        records.append(record)
+    return records
+
+
+def summarize(_records, _wall_time):
+    """
+    :return: dict of flat metrics (seconds, counts, fractions)
+    """
+    answered = [x for x in _records if 'error' not in x]
+    summary = {'questions': len(_records), 'failed': len(_records) - len(answered),
+               'questions_per_second': len(_records) / _wall_time if _wall_time else 0.0,
+               'accuracy': float(np.mean([x['perfect_match'] for x in answered])) if answered else 0.0,
+               'path_length_accuracy': float(np.mean([x['right_length'] for x in answered])) if answered else 0.0}
+    for stage in STAGES:
+        seconds = [x['timings'][stage] for x in answered if stage in x['timings']]
+        if seconds:
+            summary.update({'%s_mean' % stage: float(np.mean(seconds)),
+                            '%s_p50' % stage: float(np.percentile(seconds, 50)),
+                            '%s_p95' % stage: float(np.percentile(seconds, 95))})
+    kinds = sorted(set(kind for x in _records for kind in x['queries']))
+    for kind in kinds:
+        summary['queries_%s' % kind] = float(np.mean([x['queries'].get(kind, 0) for x in _records]))
+    summary['queries_total'] = float(np.mean([sum(x['queries'].values()) for x in _records])) if _records else 0.0
+    return summary
+
+
+def report(_summary, _baseline=None):
+    print("%-26s %12s" % ('metric', 'value') + (" %12s %9s" % ('baseline', 'change') if _baseline else ''))
+    for name in sorted(set(_summary) | set(_baseline or {})):
+        value, line = _summary.get(name), "%-26s" % name
+        line += " %12.4f" % value if value is not None else " %12s" % '-'
+        if _baseline:
+            base = _baseline.get(name)
+            line += " %12.4f" % base if base is not None else " %12s" % '-'
+            if value is not None and base:
+                line += " %+8.1f%%" % (100.0 * (value - base) / base)
+        print(line)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else QUESTIONS
+    output = sys.argv[2] if len(sys.argv) > 2 else 'pipeline-%s.json' % commit()
+    baseline = json.load(open(sys.argv[3])) if len(sys.argv) > 3 else None
+
+    start = time.time()
+    kb, questions = load(n)
+    dbp = StubDBPedia(kb)
+    model = load_model()
+    print("Stub KB: %d 1-hop and %d 2-hop neighbourhoods, %d predicates. Loaded (with the model) in %.1f s." %
+          (len(kb.hop1), len(kb.hop2), len(kb.predicates), time.time() - start))
+
+    # Warm up (GloVe is loaded on the first call), and start afresh.
+    krantikari.Krantikari(_question=questions[0][u'corrected_question'], _entities=questions[0][u'entity'],
+                          _dbpedia_interface=dbp, _model_interpreter=model)
+    kb.queries = dict((kind, 0) for kind in kb.queries)
+    dbp.labels = {}
+
+    start = time.time()
+    records = run(kb, dbp, model, questions)
+    summary = summarize(records, time.time() - start)
+
+    config = {'questions': n, 'seed': SEED, 'scorer': SCORER, 'model_dir': MODEL_DIR, 'latency': LATENCY,
+              'early_exit': krantikari.EARLY_EXIT, 'hop1_distractors': HOP1_DISTRACTORS,
+              'hop2_distractors': HOP2_DISTRACTORS}
+    json.dump({'commit': commit(), 'config': config, 'summary': summary, 'questions': records}, open(output, 'w'),
+              indent=1, sort_keys=True)
+
+    report(summary, baseline['summary'] if baseline else None)
+    if baseline and baseline.get('config') != config:
+        print("NOTE: the baseline (%s) ran with another config: %s" % (baseline.get('commit'), baseline.get('config')))
+    print("Written to %s" % output)
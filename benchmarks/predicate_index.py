@@ -0,0 +1,90 @@
+"""
+    Latency of utils/predicate_index.py lookups, per backend (NumPy, and HNSW if hnswlib is installed), at the size of
+        the DBpedia predicate vocabulary (ontology and raw properties: PREDICATES, with FORMS_PER_PREDICATE surface
+        forms each), and at the size of the ontology alone.
+
+    The label vectors are random (unit) vectors of EMBEDDING_DIMS, and the questions are LC-QuAD's, embedded with a
+        synthetic GloVe (see hot_paths.py): lookup latency doesn't depend on the vectors, only on their number.
+
+    Per size and backend: the time to build, and the p50/p99 latency of the nearest rows search alone, and of the
+        whole query (embedding the question, search, unique predicates), for k = K. TARGET is what we aim for.
+
+    Usage (from the root of the repo):
+        python benchmarks/predicate_index.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hot_paths import lcquad_inputs, synthetic_glove
+from utils import predicate_index
+
+# Some MACROS
+SIZES = [('dbo', 2800), ('dbo + dbp', 60000)]       # predicates
+FORMS_PER_PREDICATE = 2
+EMBEDDING_DIMS = 300
+QUESTIONS = 500
+K = 50
+TARGET = 1e-3                                       # seconds, per lookup
+SEED = 42
+
+
+def random_index(_random, _predicates, _use_hnsw):
+    """
+    :return: PredicateIndex over _predicates * FORMS_PER_PREDICATE random unit vectors
+    """
+    rows = _predicates * FORMS_PER_PREDICATE
+    vectors = _random.normal(size=(rows, EMBEDDING_DIMS)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    row_predicates = ['http://dbpedia.org/property/p%d' % (i % _predicates) for i in range(rows)]
+    return predicate_index.PredicateIndex(vectors, row_predicates, _use_hnsw=_use_hnsw)
+
+
+def latencies(_function, _inputs):
+    """
+    :return: np array of seconds, one per input
+    """
+    times = np.zeros(len(_inputs))
+    for i, x in enumerate(_inputs):
+        start = time.time()
+        _function(x)
+        times[i] = time.time() - start
+    return times
+
+
+def report(_name, _times):
+    p50, p99 = np.percentile(_times, 50) * 1e3, np.percentile(_times, 99) * 1e3
+    print("\t%-16s p50 %8.3f ms, p99 %8.3f ms  %s" % (_name, p50, p99, 'ok' if p50 <= TARGET * 1e3 else 'MISSES TARGET'))
+    return p50
+
+
+if __name__ == "__main__":
+    random = np.random.RandomState(SEED)
+    predicate_index.DEBUG = False
+    questions, _, labels = lcquad_inputs(QUESTIONS)
+    synthetic_glove(questions + labels, random)
+    vectors = [x for x in (predicate_index.embed_phrase(x) for x in questions) if x is not None]
+
+    backends = [('numpy', False)] + ([('hnsw', True)] if predicate_index.hnswlib is not None else [])
+    if predicate_index.hnswlib is None:
+        print("hnswlib is not installed: NumPy backend only.")
+
+    missed = []
+    for size_name, predicates in SIZES:
+        for backend, use_hnsw in backends:
+            start = time.time()
+            index = random_index(random, predicates, use_hnsw)
+            print("%s: %d predicates (%d rows), %s, built in %.2f s" % (size_name, predicates, len(index.row_predicates),
+                                                                       backend, time.time() - start))
+            n_rows = K * FORMS_PER_PREDICATE
+            index._nearest_rows(vectors[0], n_rows)
+            search = report('search', latencies(lambda x: index._nearest_rows(x, n_rows), vectors))
+            report('query', latencies(lambda x: index.query(x, _k=K), questions))
+            if search > TARGET * 1e3:
+                missed.append('%s (%s)' % (size_name, backend))
+
+    if missed:
+        print("Searches slower than %.1f ms (p50): %s" % (TARGET * 1e3, ', '.join(missed)))
@@ -0,0 +1,73 @@
+"""
+    Benchmark of utils/quantization.py on a synthetic model of the real size (a 30k x 300 GloVe slice, a 5000 x 300
+        tuned table, a BiLSTM of 128 units), with random weights, and synthetic questions/paths:
+        memory saved and change in hits@1 (see quantization.evaluate), and the time to score a question's paths.
+
+    Usage (from the root of the repo):
+        python benchmarks/quantization.py
+    (for the trained model and the real held out split: python -m utils.quantization <model_dir>)
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import model_export
+from utils import quantization
+
+# Some MACROS
+VOCAB_SIZE = 30000
+EMBEDDING_DIMS = 300
+NR_TUNE = 5000
+HIDDEN_UNITS = 128
+MAX_LENGTH = 25
+QUESTIONS = 500
+NEGATIVE_SAMPLES = 50
+PATHS_PER_CALL = 40
+CALLS = 20
+
+
+def synthetic_scorer(_random):
+    glorot = lambda shape: _random.uniform(-1, 1, size=shape) * np.sqrt(6.0 / sum(shape))
+    weights = {'embed': _random.normal(0, 0.4, size=(VOCAB_SIZE, EMBEDDING_DIMS)),
+               'tune': _random.uniform(-0.05, 0.05, size=(NR_TUNE, EMBEDDING_DIMS)),
+               'project': glorot((EMBEDDING_DIMS, EMBEDDING_DIMS))}
+    for direction in ['forward', 'backward']:
+        weights[direction + '_kernel'] = glorot((EMBEDDING_DIMS, 4 * HIDDEN_UNITS))
+        weights[direction + '_recurrent'] = glorot((HIDDEN_UNITS, 4 * HIDDEN_UNITS))
+        weights[direction + '_bias'] = np.zeros(4 * HIDDEN_UNITS)
+    config = {'units': HIDDEN_UNITS, 'activation': 'tanh', 'recurrent_activation': 'hard_sigmoid',
+              'merge_mode': 'concat', 'mask_zero': True, 'max_ques_len': MAX_LENGTH, 'max_path_len': MAX_LENGTH,
+              'dynamic': True}
+    return model_export.NumpyScorer(weights, config)
+
+
+def sequences(_random, _n, _lengths):
+    x = np.zeros((_n, MAX_LENGTH), dtype=np.int32)
+    for row, length in enumerate(_random.randint(_lengths[0], _lengths[1] + 1, size=_n)):
+        x[row, :length] = _random.randint(1, VOCAB_SIZE, size=length)
+    return x
+
+
+if __name__ == "__main__":
+    random = np.random.RandomState(42)
+    scorer = synthetic_scorer(random)
+    questions = sequences(random, QUESTIONS, (6, 20))
+    pos_paths = sequences(random, QUESTIONS, (3, 8))
+    neg_paths = sequences(random, QUESTIONS * NEGATIVE_SAMPLES, (3, 8)).reshape(QUESTIONS, NEGATIVE_SAMPLES, -1)
+
+    # So that hits@1 means something: the positive path shares a token with the question
+    pos_paths[:, :1] = questions[:, :1]
+
+    quantization.evaluate(scorer, questions, pos_paths, neg_paths)
+
+    calls = [(questions[i], sequences(random, PATHS_PER_CALL, (3, 8))) for i in range(CALLS)]
+    for embeddings, weights in [(None, None)] + quantization.SETTINGS:
+        quantized = quantization.quantize(scorer, embeddings, weights)
+        start = time.time()
+        for question, paths in calls:
+            quantized.rank(question, paths, _k=5)
+        print("%-9s %-9s %7.2f ms per rank call (%d paths)" % (embeddings or 'float32', weights or 'float32',
+                                                                (time.time() - start) / CALLS * 1e3, PATHS_PER_CALL))
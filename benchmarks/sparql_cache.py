@@ -0,0 +1,180 @@
+"""
+    Benchmark: the old cache layer (a GET/SET round trip per query, plain json) vs. utils/sparql_cache.py
+        (MGET/pipelines, compact binary values), plus a per-value comparison of the encodings:
+        plain json, zlib compressed json and the columnar binary form (decoded into dicts, or into columns).
+
+    The workload is what answering LC-QuAD looks like to the cache: label queries for every URI in the dataset,
+        and property queries (bindings of some tens of predicates) for every resource.
+
+    Usage (from the root of the repo):
+        python benchmarks/sparql_cache.py                   # against fakeredis, with a simulated round trip time
+        python benchmarks/sparql_cache.py localhost:6379    # against a (scratch!) redis-server. It gets flushed.
+"""
+import os
+import re
+import sys
+import zlib
+import json
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+from utils import sparql_cache
+from utils import dbpedia_interface as db_interface
+
+# Some MACROS
+LCQUAD_DIR = './resources/data_set.json'
+URI_RE = re.compile(r'<(http://dbpedia\.org/[^>]+)>')
+BATCH = 50                      # Queries per batch (eg. labels of all the predicates around an entity)
+PROPERTIES_PER_RESOURCE = 40
+SIMULATED_RTT = 0.0002          # seconds per round trip, for fakeredis (which lives in the same process)
+
+
+class SlowRedis:
+    """
+        fakeredis, plus a sleep for every round trip to the server.
+    """
+
+    def __init__(self, _r, _rtt=SIMULATED_RTT):
+        self.r = _r
+        self.rtt = _rtt
+
+    def _round_trip(self, _function):
+        def wrapper(*args, **kwargs):
+            time.sleep(self.rtt)
+            return _function(*args, **kwargs)
+        return wrapper
+
+    def __getattr__(self, _name):
+        if _name in ['get', 'set', 'mget']:
+            return self._round_trip(getattr(self.r, _name))
+        if _name == 'pipeline':
+            def pipeline(*args, **kwargs):
+                pipe = self.r.pipeline(*args, **kwargs)
+                pipe.execute = self._round_trip(pipe.execute)
+                return pipe
+            return pipeline
+        return getattr(self.r, _name)
+
+
+def connect(_address=None):
+    if _address is None:
+        import fakeredis
+        return SlowRedis(fakeredis.FakeStrictRedis())
+    host, port = _address.split(':')
+    return redis.StrictRedis(host=host, port=int(port), db=15)
+
+
+def workload(_lcquad_dir=LCQUAD_DIR):
+    """
+        (query, response) pairs shaped like the ones DBPedia.shoot_custom_query sees.
+    """
+    uris = sorted(set(uri for node in json.load(open(_lcquad_dir)) for uri in URI_RE.findall(node[u'sparql_query'])))
+    predicates = [x for x in uris if '/ontology/' in x or '/property/' in x]
+    random.seed(42)
+
+    items = []
+    for uri in uris:
+        query = db_interface.GET_LABEL_OF_RESOURCE % {'target_resource': '<' + uri + '>'}
+        label = uri.split('/')[-1].replace('_', ' ')
+        items.append((query, {u'head': {u'vars': [u'label']}, u'results': {u'distinct': False, u'ordered': True,
+                      u'bindings': [{u'label': {u'type': u'literal', u'xml:lang': u'en', u'value': label}}]}}))
+
+        if '/resource/' in uri:
+            query = db_interface.GET_RIGHT_PROPERTIES_OF_RESOURCE % {'target_resource': '<' + uri + '>'}
+            bindings = [{u'property': {u'type': u'uri', u'value': x}}
+                        for x in random.sample(predicates, min(PROPERTIES_PER_RESOURCE, len(predicates)))]
+            items.append((query, {u'head': {u'vars': [u'property']}, u'results': {u'distinct': False,
+                          u'ordered': True, u'bindings': bindings}}))
+    return items
+
+
+def run_old(_r, _items):
+    """
+        What shoot_custom_query used to do: one GET (and one SET on a miss) per query, plain json.
+    """
+    start = time.time()
+    for query, response in _items:
+        if _r.get(query) is None:
+            _r.set(query, json.dumps(response))
+    write = time.time() - start
+
+    start = time.time()
+    for query, response in _items:
+        json.loads(_r.get(query))
+    return write, time.time() - start
+
+
+def run_new(_r, _items):
+    cache = sparql_cache.SparqlCache(_r)
+
+    start = time.time()
+    for i in range(0, len(_items), BATCH):
+        batch = _items[i:i + BATCH]
+        cached = cache.get_many([x[0] for x in batch])
+        cache.set_many([item for item, value in zip(batch, cached) if value is None])
+    write = time.time() - start
+
+    start = time.time()
+    for i in range(0, len(_items), BATCH):
+        cache.get_many([x[0] for x in _items[i:i + BATCH]])
+    return write, time.time() - start
+
+
+def run_columns(_r, _items):
+    """
+        Same as run_new, but reading the way the DBPedia methods do (shoot_custom_query(..., _columns=True)).
+    """
+    write, _ = run_new(_r, _items)
+    cache = sparql_cache.SparqlCache(_r)
+
+    start = time.time()
+    for i in range(0, len(_items), BATCH):
+        cache.get_many_columns([x[0] for x in _items[i:i + BATCH]])
+    return write, time.time() - start
+
+
+def compare_encodings(_items):
+    """
+        Bytes per value, and decode time per value, for every encoding. No redis involved.
+    """
+    responses = [x[1] for x in _items]
+    encodings = [
+        ('json', lambda x: json.dumps(x), json.loads),
+        ('zlib json', lambda x: sparql_cache.MAGIC + zlib.compress(json.dumps(x, separators=(',', ':')),
+                                                                   sparql_cache.COMPRESSION_LEVEL), sparql_cache.decode),
+        ('binary -> dict', sparql_cache.encode, sparql_cache.decode),
+        ('binary -> columns', sparql_cache.encode, sparql_cache.decode_as_columns),
+    ]
+    for name, encode, decode in encodings:
+        values = [encode(x) for x in responses]
+        start = time.time()
+        for value in values:
+            decode(value)
+        elapsed = time.time() - start
+        print("%-22s %8.1f bytes/value, decode: %8.2f us/value" %
+              (name, sum(len(x) for x in values) / float(len(values)), elapsed / len(values) * 1e6))
+
+
+def stored_bytes(_r):
+    _r = getattr(_r, 'r', _r)
+    return sum(len(_r.get(key)) for key in _r.keys('*'))
+
+
+if __name__ == "__main__":
+    address = sys.argv[1] if len(sys.argv) > 1 else None
+    items = workload()
+    print("Queries: %d, in batches of %d" % (len(items), BATCH))
+
+    compare_encodings(items)
+
+    for name, run in [('GET/SET, json', run_old), ('MGET/pipeline, binary', run_new),
+                      ('... read as columns', run_columns)]:
+        r = connect(address)
+        r.flushdb()
+        write, read = run(r, items)
+        print("%-22s cold: %8.2f us/query, warm: %8.2f us/query, stored: %8.1f KB" %
+              (name, write / len(items) * 1e6, read / len(items) * 1e6, stored_bytes(r) / 1024.0))
+        r.flushdb()
@@ -70,7 +70,8 @@
 
 # Imports
 import sys
-import json
+import time
+import hashlib
 import pickle
 import warnings
 import traceback
@@ -79,7 +80,12 @@ import numpy as np
 from progressbar import ProgressBar
 
 # Local file imports
+from utils import interning
+from utils import path_arena
 from utils import model_interpreter
+from utils import predicate_index
+from utils import predicate_filter
+from utils import dataset_reader
 from utils import embeddings_interface
 from utils import dbpedia_interface as db_interface
 from utils import natural_language_utilities as nlutils
@@ -91,6 +97,12 @@ LCQUAD_DIR = './resources/data_set.json'
 RESULTS_DIR = './resources/results.pickle'
 QALD_DIR = './resources/qald-7-train-multilingual.json'
 MODEL_DIR = 'data/training/multi_path_mini/model_00/model.h5'
+EARLY_EXIT = False                  # Skip/curtail hop-2 expansion when the hop-1 scores are convincing enough
+EARLY_EXIT_MARGIN = 0.5             # Skip hop-2 if best 1-hop path beats the runner up by this much (calibrate!)
+EARLY_EXIT_SLACK = 0.1              # How much better a 2-hop path can score than its 1-hop prefix (calibrate!)
+EARLY_EXIT_MIN_SLACK = 0.01         # Lower bound of the slack (at 0, hop-2 would stop after the first predicate)
+HOP2_FANOUT = 100                   # Max intermediate entities whose predicates are fetched, per hop-1 predicate
+LATENCY_BINS = [0, 0.5, 1, 2, 5, 10, 30, 60, 120, np.inf]      # seconds
 
 
 short_forms = {
@@ -100,8 +112,16 @@ short_forms = {
     'dbp:': 'http://dbpedia.org/property/'
 }
 
-# Load a predicate blacklist from disk
-PREDICATE_BLACKLIST = open('./resources/predicate.blacklist').read().split()
+# The four kinds of 2-hop paths (hop-1 direction, hop-2 direction), in the order in which paths are generated.
+HOP2_PATH_KINDS = [('-', '-'), ('-', '+'), ('+', '+'), ('+', '-')]
+
+# Load a predicate blacklist from disk, and compile it into filters. Key: (use blacklist, only dbo)
+PREDICATE_BLACKLIST = predicate_filter.PredicateFilter.load('./resources/predicate.blacklist')
+PREDICATE_FILTERS = {
+    (True, False): PREDICATE_BLACKLIST,
+    (True, True): PREDICATE_BLACKLIST.restrict(predicate_filter.DBO_NAMESPACES),
+    (False, True): predicate_filter.PredicateFilter(_namespaces=predicate_filter.DBO_NAMESPACES)
+}
 
 
 # Better warning formatting. Ignore.
@@ -111,12 +131,16 @@ def better_warning(message, category, filename, lineno, file=None, line=None):
 
 class Krantikari:
 
-    def __init__(self, _question, _entities, _dbpedia_interface, _model_interpreter, _qald=False):
+    def __init__(self, _question, _entities, _dbpedia_interface, _model_interpreter, _qald=False,
+                 _predicate_index=None, _early_exit=EARLY_EXIT, _early_exit_margin=EARLY_EXIT_MARGIN,
+                 _early_exit_slack=EARLY_EXIT_SLACK):
         """
             This function inputs one question, and topic entities, and returns a SPARQL query (or s'thing else)
 
         :param _question: a string of question
         :param _entities: a list of strings (each being a URI)
+        :param _predicate_index: (optional) utils.predicate_index.PredicateIndex, used to prune hop-2 expansion
+        :param _early_exit: bool: expand hop-2 lazily, and not at all if hop-1 is convincing (see rank_hop2_lazily)
         :return: SPARQL/CoreChain/Answers (and or)
         """
         # QA Specific Macros
@@ -124,7 +148,12 @@ class Krantikari:
         self.K_1HOP_MODEL = 5
         self.K_2HOP_GLOVE = 10
         self.K_2HOP_MODEL = 5
+        self.K_ANN = 50
         self.EMBEDDING = "glove"
+        self.EARLY_EXIT = _early_exit
+        self.EARLY_EXIT_MARGIN = _early_exit_margin
+        self.EARLY_EXIT_SLACK = _early_exit_slack
+        self.HOP2_FANOUT = HOP2_FANOUT
 
         # Internalize args
         self.question = _question
@@ -134,34 +163,35 @@ class Krantikari:
         # Useful objects
         self.dbp = _dbpedia_interface
         self.model = _model_interpreter
+        self.predicate_index = _predicate_index
+
+        # What happened while answering (see runtime)
+        self.stats = {}
+        self.timings = {}           # seconds spent per stage
+        self.candidates = []        # every ranked path: {'path': [uri, sign, uri, ...], 'score': float, 'hops': int}
 
         # @TODO: Catch answers once it returns something.
+        start = time.time()
         self.runtime(self.question, self.entities, self.qald)
+        self.timings['total'] = time.time() - start
 
     @staticmethod
     def filter_predicates(_predicates, _use_blacklist=True, _only_dbo=False):
         """
             Function used to filter out predicates based on some logic
-                - use a blacklist/whitelist @TODO: Make and plug one in.
+                - use a blacklist/whitelist (see utils/predicate_filter.py)
                 - only use dbo predicates, even.
 
-        :param _predicates: A list of strings (uri of predicates)
+        :param _predicates: np array of interned IDs (see utils/interning.py) of predicates
         :param _use_blacklist: bool
         :param _only_dbo: bool
-        :return: A list of strings (uri)
+        :return: np array of interned IDs (sorted, unique)
         """
-
-        if _use_blacklist:
-            _predicates = [x for x in _predicates
-                           if x not in PREDICATE_BLACKLIST]
-
-        if _only_dbo:
-            _predicates = [x for x in _predicates
-                           if x.startswith('http://dbpedia.org/ontology')
-                           or x.startswith('dbo:')]
-
         # Filter out uniques
-        _predicates = list(set(_predicates))
+        _predicates = interning.unique(_predicates)
+
+        if _use_blacklist or _only_dbo:
+            _predicates = PREDICATE_FILTERS[(_use_blacklist, _only_dbo)].filter_ids(_predicates)
 
         return _predicates
 
@@ -186,29 +216,86 @@ class Krantikari:
     def convert_core_chain_to_sparql(self, _core_chain):  # @TODO
         pass
 
+    def get_label(self, _predicate):
+        """
+            Surface form of an interned predicate (ID).
+        """
+        return self.dbp.get_label(interning.get_uri(_predicate))
+
+    def get_labels(self, _predicates):
+        """
+            Surface forms of a bunch of interned predicates (fetched together).
+        """
+        return self.dbp.get_labels(interning.get_uris(_predicates))
+
     def get_hop2_subgraph(self, _entity, _predicate, _right=True):
         """
-            Function fetches the 2hop subgraph around this entity, and following this predicate
+            Function fetches the 2hop subgraph around this entity, and following this predicate.
+                If the endpoint can't aggregate it in one go, falls back to a sample of the intermediate entities.
+
+            Stats: hop2_aggregated / hop2_fallbacks count the expansions done either way. Only the fallback lists the
+                intermediate entities, so hop2_intermediates(_pruned) are those of the fallbacks alone:
+                the aggregated query never prunes any, and doesn't say how many there were.
         :param _entity: str: URI of the entity around which we need the subgraph
-        :param _predicate: str: URI of the predicate with which we curtail the 2hop graph (and get a tangible number of ops)
+        :param _predicate: int: interned ID of the predicate with which we curtail the 2hop graph (and get a tangible number of ops)
         :param _right: Boolean: True -> _predicate is on the right of entity (outgoing), else left (incoming)
 
-        :return: List, List: ight (outgoing), left (incoming) preds
+        :return: np array, np array: interned IDs of right (outgoing), left (incoming) preds
         """
-        # Get the entities which will come out of _entity +/- _predicate chain
-        intermediate_entities = self.dbp.get_entity(_entity, [_predicate], _right)
+        # One (aggregated) query per direction. Also looks up the neighbourhood index first.
+        try:
+            subgraph = self.dbp.get_hop2_property_ids(_entity, interning.get_uri(_predicate), _right)
+            self.stats['hop2_aggregated'] = self.stats.get('hop2_aggregated', 0) + 1
+            return subgraph
+        except db_interface.QueryFailed:
+            # Usually a timeout, when the predicate fans out into too many entities. Sample some of them instead.
+            if DEBUG:
+                warnings.warn("Aggregated 2-hop query failed for %s %s %s. Sampling intermediate entities." %
+                              (_entity, '+' if _right else '-', interning.get_uri(_predicate)))
+            self.stats['hop2_fallbacks'] = self.stats.get('hop2_fallbacks', 0) + 1
+
+        # Get the entities which will come out of _entity +/- _predicate chain (none, if that fails too)
+        intermediate_entities = self.dbp.get_entity(_entity, [interning.get_uri(_predicate)], _right,
+                                                    _skip_failures=True)
 
         # Filter out the literals, and keep uniques.
-        intermediate_entities = list(set([x for x in intermediate_entities if x.startswith('http://dbpedia.org/resource')]))
+        intermediate_entities = list(set([x for x in intermediate_entities or [] if x.startswith('http://dbpedia.org/resource')]))
 
-        left_predicates, right_predicates = [], []  # Places to store data.
+        # Keep the fan-out in check (dbo:country has thousands of subjects)
+        sampled_entities = sample_intermediates(intermediate_entities, self.HOP2_FANOUT,
+                                                _seed='%s %s %s' % (_entity, _right, interning.get_uri(_predicate)))
+        self.stats['hop2_intermediates'] = self.stats.get('hop2_intermediates', 0) + len(intermediate_entities)
+        self.stats['hop2_intermediates_pruned'] = self.stats.get('hop2_intermediates_pruned', 0) \
+            + len(intermediate_entities) - len(sampled_entities)
 
-        for entity in intermediate_entities:
-            temp_l, temp_r = self.dbp.get_properties(_uri=entity, label=False)
-            left_predicates += temp_l
-            right_predicates += temp_r
+        # Let the endpoint aggregate the predicates over all of them (the batches which fail are left out).
+        return self.dbp.get_property_ids_of_resources(sampled_entities, right=True, _skip_failures=True), \
+            self.dbp.get_property_ids_of_resources(sampled_entities, right=False, _skip_failures=True)
+
+    def prune_hop2_expansion(self, _question, _right_predicates, _left_predicates):
+        """
+            Function uses the predicate index (if any) to throw away those hop-1 predicates,
+                which do not figure in the K_ANN most plausible predicates (for this question) of the whole ontology.
 
-        return list(set(right_predicates)), list(set(left_predicates))
+            If nothing survives the pruning, the predicates are returned as is.
+
+        :param _question: str
+        :param _right_predicates: np array of interned IDs
+        :param _left_predicates: np array of interned IDs
+        :return: np array, np array: right, left predicates which need to be expanded.
+        """
+        if self.predicate_index is None:
+            return _right_predicates, _left_predicates
+
+        plausible_predicates = interning.get_ids(self.predicate_index.query(_question, _k=self.K_ANN))
+
+        right_predicates = _right_predicates[np.in1d(_right_predicates, plausible_predicates)]
+        left_predicates = _left_predicates[np.in1d(_left_predicates, plausible_predicates)]
+
+        if len(right_predicates) + len(left_predicates) == 0:
+            return _right_predicates, _left_predicates
+
+        return right_predicates, left_predicates
 
     def similar_predicates(self, _predicates, _return_indices=False, _k=5):
         """
@@ -254,10 +341,150 @@ class Krantikari:
         # Use this to choose from _predicates and return
         return [_predicates[i] for i in argmaxes]
 
+    def expand_hop2(self, _entity, _hop1_predicates, _qald, _subgraph=None):
+        """
+            Fetches the 2-hop subgraph following the given hop-1 predicates.
+
+            The 2-hop subgraph is kept as two parallel lists of (hop-1, hop-2) predicate ID arrays for every kind of path:
+                ('-', '-') : e_in_in_to_e_in
+                ('-', '+') : e_in_to_e_in_out
+                ('+', '+') : e_out_to_e_out_out
+                ('+', '-') : e_out_in_to_e_out
+
+        :param _entity: str: URI of the topic entity
+        :param _hop1_predicates: list of (sign, predicate ID) tuples
+        :param _qald: bool: Whether or not to use only dbo properties
+        :param _subgraph: (optional) a subgraph returned before, to which these predicates are added
+        :return: dict of {path kind: (list of np arrays of hop-1 IDs, list of np arrays of hop-2 IDs)}
+        """
+        hop2_subgraph = _subgraph if _subgraph is not None else dict((kind, ([], [])) for kind in HOP2_PATH_KINDS)
+
+        for hop1_sign, pred in _hop1_predicates:
+            temp_r, temp_l = self.get_hop2_subgraph(_entity=_entity, _predicate=pred, _right=hop1_sign == '+')
+            for hop2_predicates, hop2_sign in [(temp_r, '+'), (temp_l, '-')]:
+                hop2_predicates = self.filter_predicates(hop2_predicates, _use_blacklist=True, _only_dbo=_qald)
+                hop1_ids, hop2_ids = hop2_subgraph[(hop1_sign, hop2_sign)]
+                hop1_ids.append(np.repeat(pred, hop2_predicates.shape[0]).astype(interning.ID_DTYPE))
+                hop2_ids.append(hop2_predicates)
+
+        return hop2_subgraph
+
+    def rank_hop2_subgraph(self, _id_q, _entity, _subgraph, _arena, _hop1_segments):
+        """
+            Generates the 2-hop paths of a subgraph (see expand_hop2), shortlists them with word embeddings
+                (K_2HOP_GLOVE per kind of path), and ranks the shortlist with the model.
+
+        :param _id_q: vocabularized question
+        :param _arena: utils.path_arena.PathArena in which the 1-hop paths are
+        :param _hop1_segments: dict of {(sign, predicate ID): segment of the 1-hop path in the arena}
+        :return: list of path IDs (in the arena), list of uri paths, np array of scores. Ranked, at most K_2HOP_MODEL.
+        """
+        hop2_subgraph = {}
+        for kind in HOP2_PATH_KINDS:
+            hop1_ids, hop2_ids = _subgraph[kind]
+            hop2_subgraph[kind] = (np.concatenate(hop1_ids) if hop1_ids else interning.empty(),
+                                   np.concatenate(hop2_ids) if hop2_ids else interning.empty())
+
+        # Get their surface forms (and tokens), maintain a key-value store (one lookup per unique predicate)
+        uris = interning.unique(np.concatenate([ids for _, ids in hop2_subgraph.values()]))
+        sf_vocab = dict(zip(uris, self.get_labels(uris)))
+        tokens_vocab = dict(zip(sf_vocab.keys(), nlutils.tokenize_many(sf_vocab.values())))
+
+        # Generate 2-hop paths out of them. They share their prefix with the 1-hop path they come from.
+        paths_hop2 = []
+        paths_hop2_uri = []
+        for hop1_sign, hop2_sign in HOP2_PATH_KINDS:
+            hop1_ids, hop2_ids = hop2_subgraph[(hop1_sign, hop2_sign)]
+
+            # WORD-EMBEDDING FILTERING
+            filter_indices = self.similar_predicates(_predicates=[sf_vocab[x] for x in hop2_ids],
+                                                     _return_indices=True,
+                                                     _k=self.K_2HOP_GLOVE)
+
+            for i in filter_indices:
+                path = _arena.add_path([_hop1_segments[(hop1_sign, hop1_ids[i])],
+                                        _arena.add_segment([hop2_sign] + tokens_vocab[hop2_ids[i]])])
+                paths_hop2.append(path)
+
+                path_uri = [_entity, hop1_sign, hop1_ids[i], hop2_sign, hop2_ids[i]]
+                paths_hop2_uri.append(path_uri)
+
+        if len(paths_hop2) == 0:
+            return [], [], np.zeros(0)
+
+        # MODEL FILTERING
+        hop2_indices, hop2_scores = self.model.rank(_id_q=_id_q,
+                                                    _id_ps=_arena.pad(self.model.max_path_len, paths_hop2),
+                                                    _return_only_indices=False,
+                                                    _k=self.K_2HOP_MODEL)
+
+        return [paths_hop2[i] for i in hop2_indices], [paths_hop2_uri[i] for i in hop2_indices], hop2_scores
+
+    def rank_hop2(self, _id_q, _entity, _hop1_predicates, _qald, _arena, _hop1_segments):
+        """
+            Expands the 2-hop subgraph following the given hop-1 predicates, generates the paths, and ranks them.
+
+        :param _id_q: vocabularized question
+        :param _entity: str: URI of the topic entity
+        :param _hop1_predicates: list of (sign, predicate ID) tuples
+        :param _qald: bool: Whether or not to use only dbo properties
+        :param _arena: utils.path_arena.PathArena in which the 1-hop paths are
+        :param _hop1_segments: dict of {(sign, predicate ID): segment of the 1-hop path in the arena}
+        :return: list of path IDs (in the arena), list of uri paths, np array of scores. Ranked, at most K_2HOP_MODEL.
+        """
+        hop2_subgraph = self.expand_hop2(_entity, _hop1_predicates, _qald)
+        return self.rank_hop2_subgraph(_id_q, _entity, hop2_subgraph, _arena, _hop1_segments)
+
+    def rank_hop2_lazily(self, _id_q, _entity, _hop1_candidates, _hop1_scores, _qald, _arena, _hop1_segments):
+        """
+            The early exit version of rank_hop2.
+
+            If the best 1-hop path beats the runner up by at least EARLY_EXIT_MARGIN, hop-2 is skipped altogether.
+            Otherwise, hop-1 predicates are expanded one at a time, best first, until none of the remaining ones
+                can produce a path scoring better than the best one so far. We assume that a 2-hop path scores at most
+                EARLY_EXIT_SLACK more than its 1-hop prefix (see calibrate_early_exit). The slack is at least
+                EARLY_EXIT_MIN_SLACK: with none, every predicate after the best one would be cut off.
+
+            After every expansion, the subgraph expanded so far is shortlisted and ranked as a whole, as rank_hop2 does:
+                the two only differ in which predicates get expanded (and give the same paths if none is cut off).
+
+        :param _hop1_candidates: list of (sign, predicate ID, hop-1 score) tuples, best first
+        :param _hop1_scores: np array: scores of the ranked 1-hop paths
+        :return: same as rank_hop2
+        """
+        ranked = [], [], np.zeros(0)
+        self.stats['hop2_expanded'] = 0
+
+        if hop1_margin(_hop1_scores) >= self.EARLY_EXIT_MARGIN:
+            self.stats['early_exit'] = 'margin'
+            return ranked
+
+        slack = max(self.EARLY_EXIT_SLACK, EARLY_EXIT_MIN_SLACK)
+        best_hop1_score = np.max(_hop1_scores) if len(_hop1_scores) > 0 else -np.inf
+        best_score = best_hop1_score
+        hop2_subgraph = None
+        for sign, predicate, score in _hop1_candidates:
+
+            if score + slack <= best_score:
+                self.stats['early_exit'] = 'bound'
+                break
+
+            hop2_subgraph = self.expand_hop2(_entity, [(sign, predicate)], _qald, _subgraph=hop2_subgraph)
+            self.stats['hop2_expanded'] += 1
+
+            # A path may drop out of the shortlist as more predicates come in: the bound is the best of the current one
+            ranked = self.rank_hop2_subgraph(_id_q, _entity, hop2_subgraph, _arena, _hop1_segments)
+            best_score = max(best_hop1_score, np.max(ranked[2])) if len(ranked[2]) > 0 else best_hop1_score
+
+        return ranked
+
     def runtime(self, _question, _entities, _qald=False):
         """
             This function inputs one question, and topic entities, and returns a SPARQL query (or s'thing else)
 
+            NOTE: Predicates are handled as interned IDs (see utils/interning.py) throughout.
+                They are turned back into strings only for their surface forms, and in self.best_path.
+
         :param _question: a string of question
         :param _entities: a list of strings (each being a URI)
         :param _qald: bool: Whether or not to use only dbo properties
@@ -272,18 +499,18 @@ class Krantikari:
 
         # Algo differs based on whether there's one topic entity or two
         if len(_entities) == 1:
+            start = time.time()
 
             # Get 1-hop subgraph around the entity
-            right_properties, left_properties = self.dbp.get_properties(_uri=_entities[0], label=False)
+            right_properties, left_properties = self.dbp.get_properties(_uri=_entities[0], label=False, _ids=True)
 
-            # @TODO: Use predicate whitelist/blacklist to trim this shit.
             right_properties = self.filter_predicates(right_properties, _use_blacklist=True, _only_dbo=_qald)
             left_properties = self.filter_predicates(left_properties, _use_blacklist=True, _only_dbo=_qald)
 
             # Get the surface forms of Entity and the predicates
             entity_sf = self.dbp.get_label(_resource_uri=_entities[0])
-            right_properties_sf = [self.dbp.get_label(x) for x in right_properties]
-            left_properties_sf = [self.dbp.get_label(x) for x in left_properties]
+            right_properties_sf = self.get_labels(right_properties)
+            left_properties_sf = self.get_labels(left_properties)
 
             # WORD-EMBEDDING FILTERING
             right_properties_filter_indices = self.similar_predicates(_predicates=right_properties_sf,
@@ -297,22 +524,28 @@ class Krantikari:
             right_properties_filtered_sf = [right_properties_sf[i] for i in right_properties_filter_indices]
             left_properties_filtered_sf = [left_properties_sf[i] for i in left_properties_filter_indices]
 
-            # Generate their URI counterparts
+            # Generate their URI (ID) counterparts
             right_properties_filtered_uri = [right_properties[i] for i in right_properties_filter_indices]
             left_properties_filtered_uri = [left_properties[i] for i in left_properties_filter_indices]
 
-            # Generate 1-hop paths out of them
-            paths_hop1_sf = [nlutils.tokenize(entity_sf) + ['+'] + nlutils.tokenize(_p)
-                             for _p in right_properties_filtered_sf]
-            paths_hop1_sf += [nlutils.tokenize(entity_sf) + ['-'] + nlutils.tokenize(_p)
-                              for _p in left_properties_filtered_sf]
-
-            # Create their corresponding paths but with URI.
-            paths_hop1_uri = [[_entities[0], '+', _p] for _p in right_properties_filtered_uri]
-            paths_hop1_uri += [[_entities[0], '-', _p] for _p in left_properties_filtered_uri]
+            self.timings['hop1_subgraph'] = time.time() - start
+            start = time.time()
+
+            # Generate 1-hop paths out of them (stored in an arena. See utils/path_arena.py)
+            arena = path_arena.PathArena(_embedding=self.EMBEDDING)
+            entity_tokens = nlutils.tokenize(entity_sf)
+            hop1_segments = {}      # (sign, predicate) -> segment, which is also the prefix of the 2-hop paths.
+            paths_hop1 = []
+            paths_hop1_uri = []     # Their corresponding paths but with URI.
+            for sign, predicates_sf, predicates in [('+', right_properties_filtered_sf, right_properties_filtered_uri),
+                                                    ('-', left_properties_filtered_sf, left_properties_filtered_uri)]:
+                for _p, tokens in zip(predicates, nlutils.tokenize_many(predicates_sf)):
+                    hop1_segments[(sign, _p)] = arena.add_segment(entity_tokens + [sign] + tokens)
+                    paths_hop1.append(arena.add_path([hop1_segments[(sign, _p)]]))
+                    paths_hop1_uri.append([_entities[0], sign, _p])
 
             # Vectorize these paths.
-            id_ps = [embeddings_interface.vocabularize(path, _embedding=self.EMBEDDING) for path in paths_hop1_sf]
+            id_ps = arena.pad(self.model.max_path_len, paths_hop1)
 
             # MODEL FILTERING
             hop1_indices, hop1_scores = self.model.rank(_id_q=id_q,
@@ -321,253 +554,69 @@ class Krantikari:
                                                         _k=self.K_1HOP_MODEL)
 
             # Impose indices on the paths.
-            ranked_paths_hop1_sf = [paths_hop1_sf[i] for i in hop1_indices]
+            ranked_paths_hop1_sf = [arena.get_tokens(paths_hop1[i]) for i in hop1_indices]
             ranked_paths_hop1_uri = [paths_hop1_uri[i] for i in hop1_indices]
+            self.timings['hop1_rank'] = time.time() - start
 
             # if DEBUG:
             #     pprint(ranked_paths_hop1_sf)
             #     pprint(ranked_paths_hop1_uri)
 
-            # Collect URI of predicates so filtered (for 2nd hop)
-            left_properties_filtered, right_properties_filtered = [], []
-
-            # Gather all the left and right predicates (from paths selected by the model)
-            for i in hop1_indices:
-
-                hop1_path = paths_hop1_sf[i]
-
-                # See if it is from the left or right predicate set.
-                if '-' in hop1_path:
-                    # This belongs to the left pred list.
-                    # Offset index to match to left_properties_filter_indices index.
-
-                    i -= len(right_properties_filter_indices)
-                    predicate = left_properties[left_properties_filter_indices[i]]
-                    left_properties_filtered.append(predicate)
-
-                else:
-                    # This belongs to the right pred list.
-                    # No offset needed
-
-                    predicate = right_properties[right_properties_filter_indices[i]]
-                    right_properties_filtered.append(predicate)
+            # Collect the predicates so filtered (for 2nd hop). The right ones come first in paths_hop1_uri.
+            right_properties_filtered = np.asarray([paths_hop1_uri[i][2] for i in hop1_indices
+                                                    if i < len(right_properties_filter_indices)],
+                                                   dtype=interning.ID_DTYPE)
+            left_properties_filtered = np.asarray([paths_hop1_uri[i][2] for i in hop1_indices
+                                                   if i >= len(right_properties_filter_indices)],
+                                                  dtype=interning.ID_DTYPE)
+
+            # Only expand the hop-1 predicates which the ANN index finds plausible (saves SPARQL traffic at hop-2)
+            right_properties_filtered, left_properties_filtered = self.prune_hop2_expansion(
+                _question, right_properties_filtered, left_properties_filtered)
+
+            # The hop-1 predicates to expand, best first: (sign, predicate, hop-1 score)
+            hop1_candidates = []
+            for i, score in zip(hop1_indices, hop1_scores):
+                sign, predicate = paths_hop1_uri[i][1], paths_hop1_uri[i][2]
+                if predicate in (right_properties_filtered if sign == '+' else left_properties_filtered):
+                    hop1_candidates.append((sign, predicate, score))
 
             """
                 2 - Hop COMMENCES
 
                 Note: Switching to LC-QuAD nomenclature hereon. Refer to /resources/nomenclature.png
             """
-            e_in_in_to_e_in = {}
-            e_in_to_e_in_out = {}
-            e_out_to_e_out_out = {}
-            e_out_in_to_e_out = {}
-
-            for pred in right_properties_filtered:
-                temp_r, temp_l = self.get_hop2_subgraph(_entity=_entities[0], _predicate=pred, _right=True)
-                e_out_to_e_out_out[pred] = self.filter_predicates(temp_r, _use_blacklist=True, _only_dbo=_qald)
-                e_out_in_to_e_out[pred] = self.filter_predicates(temp_l, _use_blacklist=True, _only_dbo=_qald)
-
-            for pred in left_properties_filtered:
-                temp_r, temp_l = self.get_hop2_subgraph(_entity=_entities[0], _predicate=pred, _right=False)
-                e_in_to_e_in_out[pred] = self.filter_predicates(temp_r, _use_blacklist=True, _only_dbo=_qald)
-                e_in_in_to_e_in[pred] = self.filter_predicates(temp_l, _use_blacklist=True, _only_dbo=_qald)
-
-            # Get uniques
-            # e_in_in_to_e_in = list(set(e_in_in_to_e_in))
-            # e_in_to_e_in_out = list(set(e_in_to_e_in_out))
-            # e_out_to_e_out_out = list(set(e_out_to_e_out_out))
-            # e_out_in_to_e_out = list(set(e_out_in_to_e_out))
-
-            # Predicates generated. @TODO: Use predicate whitelist/blacklist to trim this shit.
-
-            # if DEBUG:
-            #     print("HOP2 Subgraph")
-            #     pprint(e_in_in_to_e_in)
-            #     pprint(e_in_to_e_in_out)
-            #     pprint(e_out_to_e_out_out)
-            #     pprint(e_out_in_to_e_out)
-
-            # Get their surface forms, maintain a key-value store
-            sf_vocab = {}
-            for key in e_in_in_to_e_in.keys():
-                for uri in e_in_in_to_e_in[key]:
-                    sf_vocab[uri] = self.dbp.get_label(uri)
-            for key in e_in_to_e_in_out.keys():
-                for uri in e_in_to_e_in_out[key]:
-                    sf_vocab[uri] = self.dbp.get_label(uri)
-            for key in e_out_to_e_out_out.keys():
-                for uri in e_out_to_e_out_out[key]:
-                    sf_vocab[uri] = self.dbp.get_label(uri)
-            for key in e_out_in_to_e_out.keys():
-                for uri in e_out_in_to_e_out[key]:
-                    sf_vocab[uri] = self.dbp.get_label(uri)
-
-            # Flatten the four kind of predicates, and use their surface forms.
-            e_in_in_to_e_in_sf = [sf_vocab[x] for uris in e_in_in_to_e_in.values() for x in uris]
-            e_in_to_e_in_out_sf = [sf_vocab[x] for uris in e_in_to_e_in_out.values() for x in uris]
-            e_out_to_e_out_out_sf = [sf_vocab[x] for uris in e_out_to_e_out_out.values() for x in uris]
-            e_out_in_to_e_out_sf = [sf_vocab[x] for uris in e_out_in_to_e_out.values() for x in uris]
-
-            # WORD-EMBEDDING FILTERING
-            e_in_in_to_e_in_filter_indices = self.similar_predicates(_predicates=e_in_in_to_e_in_sf,
-                                                                     _return_indices=True,
-                                                                     _k=self.K_2HOP_GLOVE)
-            e_in_to_e_in_out_filter_indices = self.similar_predicates(_predicates=e_in_to_e_in_out_sf,
-                                                                      _return_indices=True,
-                                                                      _k=self.K_2HOP_GLOVE)
-            e_out_to_e_out_out_filter_indices = self.similar_predicates(_predicates=e_out_to_e_out_out_sf,
-                                                                        _return_indices=True,
-                                                                        _k=self.K_2HOP_GLOVE)
-            e_out_in_to_e_out_filter_indices = self.similar_predicates(_predicates=e_out_in_to_e_out_sf,
-                                                                       _return_indices=True,
-                                                                       _k=self.K_2HOP_GLOVE)
-
-            # Impose these indices to generate filtered predicate list.
-            e_in_in_to_e_in_filtered = [e_in_in_to_e_in_sf[i] for i in e_in_in_to_e_in_filter_indices]
-            e_in_to_e_in_out_filtered = [e_in_to_e_in_out_sf[i] for i in e_in_to_e_in_out_filter_indices]
-            e_out_to_e_out_out_filtered = [e_out_to_e_out_out_sf[i] for i in e_out_to_e_out_out_filter_indices]
-            e_out_in_to_e_out_filtered = [e_out_in_to_e_out_sf[i] for i in e_out_in_to_e_out_filter_indices]
-
-            # Use them to make a filtered dictionary of hop1: [hop2_filtered] pairs
-            e_in_in_to_e_in_filtered_subgraph = {}
-            for x in e_in_in_to_e_in_filtered:
-                for uri in sf_vocab.keys():
-                    if x == sf_vocab[uri]:
-
-                        # That's the URI. Find it's 1-hop Pred.
-                        for hop1 in e_in_in_to_e_in.keys():
-                            if uri  in e_in_in_to_e_in[hop1]:
-
-                                # Now we found a matching :sweat:
-                                try:
-                                    e_in_in_to_e_in_filtered_subgraph[hop1].append(uri)
-                                except KeyError:
-                                    e_in_in_to_e_in_filtered_subgraph[hop1] = [uri]
-
-            e_in_to_e_in_out_filtered_subgraph = {}
-            for x in e_in_to_e_in_out_filtered:
-                for uri in sf_vocab.keys():
-                    if x == sf_vocab[uri]:
-
-                        # That's the URI. Find it's 1-hop Pred.
-                        for hop1 in e_in_to_e_in_out.keys():
-                            if uri in e_in_to_e_in_out[hop1]:
-
-                                # Now we found a matching :sweat:
-                                try:
-                                    e_in_to_e_in_out_filtered_subgraph[hop1].append(uri)
-                                except KeyError:
-                                    e_in_to_e_in_out_filtered_subgraph[hop1] = [uri]
-
-            e_out_to_e_out_out_filtered_subgraph = {}
-            for x in e_out_to_e_out_out_filtered:
-                for uri in sf_vocab.keys():
-                    if x == sf_vocab[uri]:
-
-                        # That's the URI. Find it's 1-hop Pred.
-                        for hop1 in e_out_to_e_out_out.keys():
-                            if uri in e_out_to_e_out_out[hop1]:
-
-                                # Now we found a matching :sweat:
-                                try:
-                                    e_out_to_e_out_out_filtered_subgraph[hop1].append(uri)
-                                except KeyError:
-                                    e_out_to_e_out_out_filtered_subgraph[hop1] = [uri]
-
-            e_out_in_to_e_out_filtered_subgraph = {}
-            for x in e_out_in_to_e_out_filtered:
-                for uri in sf_vocab.keys():
-                    if x == sf_vocab[uri]:
-
-                        # That's the URI. Find it's 1-hop Pred.
-                        for hop1 in e_out_in_to_e_out.keys():
-                            if uri in e_out_in_to_e_out[hop1]:
-
-                                # Now we found a matching :sweat:
-                                try:
-                                    e_out_in_to_e_out_filtered_subgraph[hop1].append(uri)
-                                except KeyError:
-                                    e_out_in_to_e_out_filtered_subgraph[hop1] = [uri]
-
-            # Generate 2-hop paths out of them.
-            paths_hop2_log = []
-            paths_hop2_sf = []
-            paths_hop2_uri = []
-            for key in e_in_in_to_e_in_filtered_subgraph.keys():
-                for r2 in e_in_in_to_e_in_filtered_subgraph[key]:
-
-                    path = nlutils.tokenize(entity_sf)                  \
-                            + ['-'] + nlutils.tokenize(sf_vocab[key])   \
-                            + ['-'] + nlutils.tokenize(sf_vocab[r2])
-                    paths_hop2_sf.append(path)
-
-                    path_uri = [_entities[0], '-', key, '-', r2]
-                    paths_hop2_uri.append(path_uri)
-
-            paths_hop2_log.append(len(paths_hop2_sf))
-            for key in e_in_to_e_in_out_filtered_subgraph.keys():
-                for r2 in e_in_to_e_in_out_filtered_subgraph[key]:
-
-                    path = nlutils.tokenize(entity_sf)                  \
-                            + ['-'] + nlutils.tokenize(sf_vocab[key])   \
-                            + ['+'] + nlutils.tokenize(sf_vocab[r2])
-                    paths_hop2_sf.append(path)
-
-                    path_uri = [_entities[0], '-', key, '+', r2]
-                    paths_hop2_uri.append(path_uri)
-
-            paths_hop2_log.append(len(paths_hop2_sf))
-            for key in e_out_to_e_out_out_filtered_subgraph.keys():
-                for r2 in e_out_to_e_out_out_filtered_subgraph[key]:
-
-                    path = nlutils.tokenize(entity_sf)                  \
-                            + ['+'] + nlutils.tokenize(sf_vocab[key])   \
-                            + ['+'] + nlutils.tokenize(sf_vocab[r2])
-                    paths_hop2_sf.append(path)
-
-                    path_uri = [_entities[0], '+', key, '+', r2]
-                    paths_hop2_uri.append(path_uri)
-
-            paths_hop2_log.append(len(paths_hop2_sf))
-            for key in e_out_to_e_out_out_filtered_subgraph.keys():
-                for r2 in e_out_to_e_out_out_filtered_subgraph[key]:
-
-                    path = nlutils.tokenize(entity_sf)                  \
-                            + ['+'] + nlutils.tokenize(sf_vocab[key])   \
-                            + ['-'] + nlutils.tokenize(sf_vocab[r2])
-                    paths_hop2_sf.append(path)
-
-                    path_uri = [_entities[0], '+', key, '+', r2]
-                    paths_hop2_uri.append(path_uri)
-
-            paths_hop2_log.append(len(paths_hop2_sf))
-
-            # Vectorize these paths
-            id_ps = [embeddings_interface.vocabularize(path, _embedding=self.EMBEDDING) for path in paths_hop2_sf]
-
-            if not len(id_ps) == 0:
+            start = time.time()
+            if self.EARLY_EXIT:
+                ranked_paths_hop2, ranked_paths_hop2_uri, hop2_scores = self.rank_hop2_lazily(
+                    id_q, _entities[0], hop1_candidates, hop1_scores, _qald, arena, hop1_segments)
+            else:
+                ranked_paths_hop2, ranked_paths_hop2_uri, hop2_scores = self.rank_hop2(
+                    id_q, _entities[0], [x[:2] for x in hop1_candidates], _qald, arena, hop1_segments)
 
-                # MODEL FILTERING
-                hop2_indices, hop2_scores = self.model.rank(_id_q=id_q,
-                                                            _id_ps=id_ps,
-                                                            _return_only_indices=False,
-                                                            _k=self.K_2HOP_MODEL)
+                # Note how much better than their hop-1 prefix the 2-hop paths score (to calibrate the early exit)
+                hop1_score = dict(((x[0], x[1]), x[2]) for x in hop1_candidates)
+                self.stats['hop2_gains'] = [score - hop1_score[(path[1], path[2])]
+                                            for path, score in zip(ranked_paths_hop2_uri, hop2_scores)]
 
-                # Impose indices
-                ranked_paths_hop2_sf = [paths_hop2_sf[i] for i in hop2_indices]
-                ranked_paths_hop2_uri = [paths_hop2_uri[i] for i in hop2_indices]
+            ranked_paths_hop2_sf = [arena.get_tokens(x) for x in ranked_paths_hop2]
+            self.timings['hop2'] = time.time() - start
 
-                self.path_length = self.choose_path_length(hop1_scores, hop2_scores)
+            # Keep all the ranked paths around (eg. for server.py), best first.
+            self.candidates = sorted([{'path': uri_path(path), 'score': float(score), 'hops': hops}
+                                      for hops, paths, scores in [(1, ranked_paths_hop1_uri, hop1_scores),
+                                                                  (2, ranked_paths_hop2_uri, hop2_scores)]
+                                      for path, score in zip(paths, scores)], key=lambda x: -x['score'])
 
-                # @TODO: Merge hop1 and hop2 into one list and then rank/shortlist.
+            # @TODO: Merge hop1 and hop2 into one list and then rank/shortlist.
 
-            else:
+            if len(ranked_paths_hop2) == 0:
 
                 # No paths generated at all.
-                if DEBUG:
+                if DEBUG and not self.stats.get('early_exit'):
                     warnings.warn('No paths generated at the second hop. Question is \"%s\"' % _question)
                     warnings.warn('1-hop paths are: \n')
-                    print(paths_hop1_sf)
+                    print([arena.get_tokens(x) for x in paths_hop1])
 
                 NO_PATHS_HOP2 = True
 
@@ -575,6 +624,9 @@ class Krantikari:
             if NO_PATHS_HOP2 is False: self.path_length = self.choose_path_length(hop1_scores, hop2_scores)
             else: self.path_length = 1
 
+            self.stats['hop1_margin'] = hop1_margin(hop1_scores)
+            self.stats['path_length'] = self.path_length
+
         if len(_entities) >= 2:
             self.best_path = 0  # @TODO: FIX THIS ONCE WE IMPLEMENT DIS!
             NO_PATHS = True
@@ -590,11 +642,88 @@ class Krantikari:
             self.best_path = None
             return None
 
-        # Choose best path
+        # Choose best path (and only now, turn the IDs back into URIs)
         if self.path_length == 1:
-            self.best_path = ranked_paths_hop1_uri[np.argmax(hop1_scores)]
+            self.best_path = uri_path(ranked_paths_hop1_uri[np.argmax(hop1_scores)])
         elif self.path_length == 2:
-            self.best_path = ranked_paths_hop2_uri[np.argmax(hop2_scores)]
+            self.best_path = uri_path(ranked_paths_hop2_uri[np.argmax(hop2_scores)])
+
+
+def uri_path(_path):
+    """
+        Turn the interned predicate IDs of a path back into URIs.
+            eg. ['http://dbpedia.org/resource/Gestapo', '+', 1201] -> [..., '+', 'http://dbpedia.org/ontology/leader']
+    """
+    return [x if isinstance(x, basestring) else interning.get_uri(x) for x in _path]
+
+
+def sample_intermediates(_entities, _budget, _seed=''):
+    """
+        Deterministic stratified sample of (at most) _budget entities.
+            The entities are sorted and cut into _budget contiguous strata, and from every stratum
+            the one with the smallest hash (salted with _seed) is picked.
+            Same input -> same sample, whatever order the endpoint returned the entities in.
+
+    :param _entities: list of str (uri)
+    :param _budget: int
+    :param _seed: str: eg. the entity and predicate being expanded
+    :return: list of str (uri)
+    """
+    if len(_entities) <= _budget:
+        return _entities
+
+    _entities = sorted(_entities)
+    bounds = np.linspace(0, len(_entities), _budget + 1).astype(np.int64)
+    return [min(_entities[start:end], key=lambda x: hashlib.md5((_seed + x).encode("utf-8")).digest())
+            for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def hop1_margin(_hop1_scores):
+    """
+        By how much does the best 1-hop path beat the runner up.
+    """
+    if len(_hop1_scores) < 2:
+        return np.inf
+    top = np.sort(_hop1_scores)[::-1]
+    return float(top[0] - top[1])
+
+
+def calibrate_early_exit(_stats, _quantile=0.95):
+    """
+        Pick the early exit thresholds from the stats of a run made without early exit.
+            - margin: _quantile of the hop-1 margins of the questions which got a 2-hop answer.
+                (i.e. skipping hop-2 above it would have changed only 1 - _quantile of those answers)
+            - slack: _quantile of how much better the 2-hop paths scored than their 1-hop prefix, and at least
+                EARLY_EXIT_MIN_SLACK (if the 2-hop paths hardly ever scored better, the bound would prune them all).
+
+    :param _stats: list of Krantikari.stats
+    :return: (margin, slack)
+    """
+    margins = [x['hop1_margin'] for x in _stats if x.get('path_length') == 2 and np.isfinite(x['hop1_margin'])]
+    gains = [gain for x in _stats for gain in x.get('hop2_gains', [])]
+
+    margin = float(np.percentile(margins, _quantile * 100)) if margins else EARLY_EXIT_MARGIN
+    slack = float(np.percentile(gains, _quantile * 100)) if gains else EARLY_EXIT_SLACK
+    if slack < EARLY_EXIT_MIN_SLACK:
+        warnings.warn("Calibrated early exit slack %.4f is below %.4f. Using %.4f instead." %
+                      (slack, EARLY_EXIT_MIN_SLACK, EARLY_EXIT_MIN_SLACK))
+        slack = EARLY_EXIT_MIN_SLACK
+    return margin, slack
+
+
+def report(_results, _latencies, _title=''):
+    """
+        Print accuracy (perfect path matches) and a latency histogram of a run.
+    """
+    scores = [x['perfect-match']['score'] for x in _results if isinstance(x, dict)]
+    counts, edges = np.histogram(_latencies, bins=LATENCY_BINS)
+
+    print("\n%s" % _title)
+    print("Accuracy (perfect match): %.4f over %d questions" % (np.mean(scores) if scores else 0.0, len(scores)))
+    print("Latency (s): mean %.3f, p50 %.3f, p95 %.3f" % (np.mean(_latencies), np.percentile(_latencies, 50),
+                                                         np.percentile(_latencies, 95)))
+    for count, low, high in zip(counts, edges[:-1], edges[1:]):
+        print("\t[%6.1f, %6.1f): %5d %s" % (low, high, count, '#' * int(60.0 * count / max(1, len(_latencies)))))
 
 
 def evaluate(_true, _predicted):
@@ -902,7 +1031,20 @@ def parse_qald(_data):
     return  parsed_response
 
 
-def run_lcquad(_target_gpu):
+def load_predicate_index():
+    """
+        Load the ANN predicate index from disk. If it isn't there (see utils/predicate_index.py), run without one.
+    """
+    try:
+        return predicate_index.PredicateIndex.load()
+    except IOError:
+        if DEBUG:
+            warnings.warn("Predicate index not found on disk. Hop-2 expansion will not be pruned.")
+        return None
+
+
+def run_lcquad(_target_gpu, _early_exit=EARLY_EXIT, _early_exit_margin=EARLY_EXIT_MARGIN,
+               _early_exit_slack=EARLY_EXIT_SLACK, _dbp=None, _model=None):
     """
         Function to run the entire script on LC-QuAD, the lord of all datasets.
         - Load dataset
@@ -912,20 +1054,26 @@ def run_lcquad(_target_gpu):
         - Compare lengths.
         - Store results in an array.
 
-    :return:
+    :return: list of results, list of Krantikari.stats, list of latencies (s)
     """
     results = []
+    stats = []
+    latencies = []
 
     # Create a DBpedia object.
-    dbp = db_interface.DBPedia(_verbose=True, caching=True)  # Summon a DBpedia interface
+    dbp = _dbp or db_interface.DBPedia(_verbose=True, caching=True)  # Summon a DBpedia interface
 
     # Create a model interpreter.
-    model = model_interpreter.ModelInterpreter(_gpu=_target_gpu)  # Model interpreter to be used for ranking
+    model = _model or model_interpreter.ModelInterpreter(_gpu=_target_gpu)  # Model interpreter to be used for ranking
 
-    # Load LC-QuAD
-    dataset = json.load(open(LCQUAD_DIR))
+    # Load the predicate index, if it has been built.
+    index = load_predicate_index()
 
-    progbar = ProgressBar()
+    # Load LC-QuAD (lazily, a question at a time)
+    dataset = dataset_reader.questions(LCQUAD_DIR)
+
+    # A generator has no len(): the progress bar is told how long it is (counted in one pass, keeping nothing)
+    progbar = ProgressBar(maxval=dataset_reader.count(LCQUAD_DIR))
     iterator = progbar(dataset)
 
     # Parse it
@@ -943,12 +1091,47 @@ def run_lcquad(_target_gpu):
             # results.append([0, 0])
             continue
 
-        qa = Krantikari(_question=q, _entities=e, _model_interpreter=model, _dbpedia_interface=dbp)
+        start = time.time()
+        qa = Krantikari(_question=q, _entities=e, _model_interpreter=model, _dbpedia_interface=dbp,
+                        _predicate_index=index, _early_exit=_early_exit, _early_exit_margin=_early_exit_margin,
+                        _early_exit_slack=_early_exit_slack)
+        latencies.append(time.time() - start)
+        stats.append(qa.stats)
         results.append(evaluate(parsed_data, qa.best_path))
 
     # I don't know what to do of results. So just pickle shit
     pickle.dump(results, open(RESULTS_DIR, 'w+'))
 
+    report(results, latencies, _title="LC-QuAD (early exit %s)" % ('on' if _early_exit else 'off'))
+    print("Hop-2 expansions: %d aggregated, %d sampled. Intermediate entities of the sampled ones: %d, pruned: %d" % tuple(
+        sum(x.get(key, 0) for x in stats)
+        for key in ['hop2_aggregated', 'hop2_fallbacks', 'hop2_intermediates', 'hop2_intermediates_pruned']))
+    if hasattr(dbp, 'inflight'):
+        print("SPARQL queries coalesced with identical ones in flight: %(coalesced)d of %(calls)d" % dbp.inflight.stats)
+    return results, stats, latencies
+
+
+def compare_early_exit(_target_gpu):
+    """
+        Run LC-QuAD without early exit, calibrate the thresholds on that run, and run it again with early exit.
+            Reports accuracy and latency histograms of both.
+    """
+    dbp = db_interface.DBPedia(_verbose=True, caching=True)
+    model = model_interpreter.ModelInterpreter(_gpu=_target_gpu)
+
+    results_off, stats_off, latencies_off = run_lcquad(_target_gpu, _early_exit=False, _dbp=dbp, _model=model)
+    margin, slack = calibrate_early_exit(stats_off)
+    results_on, stats_on, latencies_on = run_lcquad(_target_gpu, _early_exit=True, _early_exit_margin=margin,
+                                                    _early_exit_slack=slack, _dbp=dbp, _model=model)
+
+    print("\nEarly exit calibrated to margin %.4f, slack %.4f" % (margin, slack))
+    print("Skipped hop-2 (margin): %d, stopped expanding (bound): %d, hop-1 predicates expanded: %d" %
+          (len([x for x in stats_on if x.get('early_exit') == 'margin']),
+           len([x for x in stats_on if x.get('early_exit') == 'bound']),
+           sum(x.get('hop2_expanded', 0) for x in stats_on)))
+    report(results_off, latencies_off, _title="Early exit off")
+    report(results_on, latencies_on, _title="Early exit on")
+
 
 def run_qald():
 
@@ -960,19 +1143,21 @@ def run_qald():
     # Create a model interpreter.
     model = model_interpreter.ModelInterpreter()  # Model interpreter to be used for ranking
 
-    # Load QALD
-    dataset = json.load(open(QALD_DIR))
+    # Load the predicate index, if it has been built.
+    index = load_predicate_index()
 
-    # Basic Pre-Processing
-    dataset = dataset['questions']
-    for i in range(len(dataset)):
-        dataset[i]['query']['sparql'] = dataset[i]['query']['sparql'].replace('.\n', '. ')
+    # Load QALD (lazily, a question at a time)
+    stop = 5
+    dataset = dataset_reader.questions(QALD_DIR, _key='questions', _stop=stop)
 
-    progbar = ProgressBar()
-    iterator = progbar(dataset[:5])
+    progbar = ProgressBar(maxval=min(stop, dataset_reader.count(QALD_DIR, _key='questions')))
+    iterator = progbar(dataset)
 
     # Parse it
     for node in iterator:
+        # Basic Pre-Processing
+        node['query']['sparql'] = node['query']['sparql'].replace('.\n', '. ')
+
         parsed_data = parse_qald(node)
 
         if not parsed_data:
@@ -986,7 +1171,8 @@ def run_qald():
             results.append([0, 0])
             continue
 
-        qa = Krantikari(_question=q, _entities=e, _model_interpreter=model, _dbpedia_interface=dbp, _qald=True)
+        qa = Krantikari(_question=q, _entities=e, _model_interpreter=model, _dbpedia_interface=dbp, _qald=True,
+                        _predicate_index=index)
         results.append(evaluate(parsed_data, qa.best_path))
 
     # I don't know what to do of results. So just pickle shit
@@ -1023,7 +1209,10 @@ if __name__ == "__main__":
         gpu = raw_input("Specify the GPU you wanna use boi:\t")
 
     """
-        TEST 2 : Check LCQuAD Parser
+        TEST 2 : Check LCQuAD Parser (python krantikari.py <gpu> early-exit : to compare with and without early exit)
     """
-    run_lcquad(gpu)
+    if len(sys.argv) > 2 and sys.argv[2] == 'early-exit':
+        compare_early_exit(gpu)
+    else:
+        run_lcquad(gpu)
 
@@ -5,6 +5,7 @@ import pickle
 import sys
 import json
 import math
+import time
 from keras.preprocessing.sequence import pad_sequences
 import numpy as np
 import pandas as pd
@@ -37,6 +38,9 @@ from keras.layers.pooling import GlobalAveragePooling1D, GlobalMaxPooling1D
 from keras.layers import Merge
 from sklearn.utils import shuffle
 
+# Our scripts
+from utils import memory_profiling
+
 
 # Some Macros
 DEBUG = True
@@ -46,6 +50,9 @@ BATCH_SIZE = 880 # Around 11 splits for full training dataset
 LEARNING_RATE = 0.001
 LOSS = 'categorical_crossentropy'
 NEGATIVE_SAMPLES = 1000
+MAX_LENGTH = 50 # Sequences are stored padded (post) to this, longer ones lose their first tokens
+DYNAMIC_PADDING = True # Variable length inputs (masked), fed in batches of similar lengths. See bucketed_batches
+BUCKETS = [4, 8, 12, 16, 24, 32, MAX_LENGTH] # Upper bounds of the length buckets
 OPTIMIZER = optimizers.Adam(LEARNING_RATE)
 
 '''
@@ -187,24 +194,58 @@ def custom_loss(y_true, y_pred):
 
 
 def rank_precision(model, neg_paths_per_epoch, max_length, test_questions, test_pos_paths, test_neg_paths):
-    questions = np.reshape(np.repeat(np.reshape(test_questions,
-                                            (test_questions.shape[0], 1, test_questions.shape[1])),
-                                 neg_paths_per_epoch+1, axis=1), (-1, max_length))
-    pos_paths = np.reshape(test_pos_paths,
-                                    (test_pos_paths.shape[0], 1, test_pos_paths.shape[1]))
-    neg_paths = test_neg_paths[:, np.random.randint(0, NEGATIVE_SAMPLES, neg_paths_per_epoch), :]
-    all_paths = np.reshape(np.concatenate([pos_paths, neg_paths], axis=1), (-1, max_length))
+    '''
+        hits@1 against neg_paths_per_epoch (seeded) negative paths. See utils/evaluation.py for the other metrics.
+    '''
+    from utils import evaluation
+    return evaluation.evaluate(model, test_questions, test_pos_paths, test_neg_paths,
+                               _negatives=neg_paths_per_epoch)['all']['hits@1']
+
+
+def sequence_lengths(x):
+    '''
+        Number of tokens in every (post padded) row of x
+    '''
+    nonzero = x != 0
+    return np.where(nonzero.any(axis=1), x.shape[1] - np.argmax(nonzero[:, ::-1], axis=1), 0)
+
+
+def trim(x, lengths):
+    '''
+        Drop the padding columns that no row needs (but keep at least one)
+    '''
+    return x[:, :max(int(lengths.max()) if len(lengths) else 0, 1)]
+
+
+def bucketed_batches(lengths, batch_size, buckets=BUCKETS, randomize=True):
+    '''
+        Group rows by the length bucket of each of their inputs, and cut every group into batches of at most batch_size.
+            Every batch can then be trimmed to its longest row, instead of being padded to the max length.
+
+    :param lengths: list of np arrays (one per input) of the lengths of every row
+    :param randomize: shuffle the order of the batches (the rows keep their order within a group)
+    :return: list of np arrays of row indices
+    '''
+    keys = np.zeros(len(lengths[0]), dtype=np.int64)
+    for x in lengths:
+        keys = keys * (len(buckets) + 1) + np.searchsorted(buckets, x)
 
-    outputs = model.predict([questions, all_paths, np.zeros_like(all_paths)])[:,0]
-    outputs = np.reshape(outputs, (test_questions.shape[0], neg_paths_per_epoch+1))
+    # Stable sort, so that shuffled rows stay shuffled within their group
+    order = np.argsort(keys, kind='mergesort')
+    boundaries = np.flatnonzero(np.diff(keys[order])) + 1
+    batches = [group[i:i + batch_size] for group in np.split(order, boundaries) if len(group)
+               for i in range(0, len(group), batch_size)]
 
-    precision = float(len(np.where(np.argmax(outputs, axis=1)==0)[0]))/outputs.shape[0]
-    return precision
+    if randomize:
+        np.random.shuffle(batches)
+    return batches
 
 
 class TrainingDataGenerator(Sequence):
-    def __init__(self, questions, pos_paths, neg_paths, max_length, neg_paths_per_epoch, batch_size):
+    @memory_profiling.profiled('TrainingDataGenerator.__init__')
+    def __init__(self, questions, pos_paths, neg_paths, max_length, neg_paths_per_epoch, batch_size, bucketed=False):
         self.dummy_y = np.zeros(batch_size)
+        self.bucketed = bucketed
         self.firstDone = False
         self.max_length = max_length
         self.neg_paths_per_epoch = neg_paths_per_epoch
@@ -228,11 +269,29 @@ class TrainingDataGenerator(Sequence):
 
 
         self.batch_size = batch_size
+        self.make_batches()
+
+    def make_batches(self):
+        if not self.bucketed:
+            return
+        # Bucket on the question and positive path lengths only: epochs just shuffle those rows, so the number of
+        # batches stays the same (keras reads len() once). The negatives are resampled every epoch: trimmed per batch.
+        self.lengths = [sequence_lengths(self.questions_shuffled), sequence_lengths(self.pos_paths_shuffled),
+                        sequence_lengths(self.neg_paths_shuffled)]
+        self.batches = bucketed_batches(self.lengths[:2], self.batch_size)
 
     def __len__(self):
+        if self.bucketed:
+            return len(self.batches)
         return math.ceil(len(self.questions) / self.batch_size)
 
     def __getitem__(self, idx):
+        if self.bucketed:
+            rows = self.batches[idx]
+            return ([trim(self.questions_shuffled[rows], self.lengths[0][rows]),
+                     trim(self.pos_paths_shuffled[rows], self.lengths[1][rows]),
+                     trim(self.neg_paths_shuffled[rows], self.lengths[2][rows])], np.zeros(len(rows)))
+
         index = lambda x: x[idx * self.batch_size:(idx + 1) * self.batch_size]
         batch_questions = index(self.questions_shuffled)
         batch_pos_paths = index(self.pos_paths_shuffled)
@@ -246,17 +305,32 @@ class TrainingDataGenerator(Sequence):
 
         return ([batch_questions, batch_pos_paths, batch_neg_paths], self.dummy_y)
 
+    @memory_profiling.profiled('TrainingDataGenerator.on_epoch_end')
     def on_epoch_end(self):
         self.firstDone = not self.firstDone
         self.neg_paths_sampled = np.reshape(self.neg_paths[:,np.random.randint(0, NEGATIVE_SAMPLES, self.neg_paths_per_epoch), :],
                                             (-1, self.max_length))
         self.questions_shuffled, self.pos_paths_shuffled, self.neg_paths_shuffled = \
             shuffle(self.questions, self.pos_paths, self.neg_paths_sampled)
+        self.make_batches()
+
+    def count_tokens(self):
+        '''
+            Tokens in an epoch: (actual tokens, tokens fed to the model i.e. including the padding)
+        '''
+        inputs = [self.questions_shuffled, self.pos_paths_shuffled, self.neg_paths_shuffled]
+        tokens = sum(int(sequence_lengths(x).sum()) for x in inputs)
+        if not self.bucketed:
+            return tokens, len(self) * self.batch_size * self.max_length * len(inputs)
+        fed = sum(len(rows) * sum(max(int(x[rows].max()), 1) for x in self.lengths) for rows in self.batches)
+        return tokens, fed
 
 
 class ValidationDataGenerator(Sequence):
-    def __init__(self, questions, pos_paths, neg_paths, max_length, neg_paths_per_epoch, batch_size):
+    @memory_profiling.profiled('ValidationDataGenerator.__init__')
+    def __init__(self, questions, pos_paths, neg_paths, max_length, neg_paths_per_epoch, batch_size, bucketed=False):
         self.dummy_y = np.zeros(batch_size)
+        self.bucketed = bucketed
         self.firstDone = False
         self.max_length = max_length
         self.neg_paths_per_epoch = neg_paths_per_epoch
@@ -281,6 +355,11 @@ class ValidationDataGenerator(Sequence):
         batch_questions = index(self.questions)
         batch_all_paths = index(self.all_paths)
 
+        # Rows are in groups of neg_paths_per_epoch+1 (see rank_precision_metric): no reordering, just trimming.
+        if self.bucketed:
+            batch_questions = trim(batch_questions, sequence_lengths(batch_questions))
+            batch_all_paths = trim(batch_all_paths, sequence_lengths(batch_all_paths))
+
         # if self.firstDone == False:
         #     batch_neg_paths = index(self.neg_paths)
         # else:
@@ -289,6 +368,7 @@ class ValidationDataGenerator(Sequence):
 
         return ([batch_questions, batch_all_paths, np.zeros_like(batch_all_paths)], self.dummy_y)
 
+    @memory_profiling.profiled('ValidationDataGenerator.on_epoch_end')
     def on_epoch_end(self):
         self.firstDone = not self.firstDone
         neg_paths_sampled = self.neg_paths[:, np.random.randint(0, NEGATIVE_SAMPLES, self.neg_paths_per_epoch), :]
@@ -410,12 +490,35 @@ class _GlobalSumPooling1D(Layer):
         else:
             return K.sum(x, axis=1)
 
+class TokensPerSecond(Callback):
+    '''
+        Reports the tokens (not counting padding) trained on per second, every epoch, and the share of padding fed.
+    '''
+    def __init__(self, generator):
+        super(TokensPerSecond, self).__init__()
+        self.generator = generator
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = self.end = time.time()
+
+    def on_batch_end(self, batch, logs=None):
+        self.end = time.time()
+
+    def on_epoch_end(self, epoch, logs=None):
+        tokens, fed = self.generator.count_tokens()
+        seconds = max(self.end - self.start, 1e-9)
+        if logs is not None:
+            logs['tokens_per_second'] = tokens / seconds
+        print("Epoch %d: %.0f tokens/s (%.0f fed/s, %.1f%% padding)" % (epoch + 1, tokens / seconds, fed / seconds,
+                                                                         100.0 * (fed - tokens) / max(fed, 1)))
+
+
 class _BiRNNEncoding(object):
     def __init__(self, max_length, embedding_dims, units, dropout=0.0):
-        self.model = Sequential()
-        self.model.add(Bidirectional(LSTM(units, return_sequences=False,
-                                         dropout_W=dropout, dropout_U=dropout),
-                                         input_shape=(max_length, embedding_dims)))
+        # The layer itself (not wrapped in a Sequential, whose input layer would drop the padding mask)
+        self.model = Bidirectional(LSTM(units, return_sequences=False,
+                                        dropout_W=dropout, dropout_U=dropout),
+                                   input_shape=(max_length, embedding_dims))
         # self.model.add(TimeDistributed(Dense(units, activation='relu', init='he_normal')))
         # self.model.add(TimeDistributed(Dropout(0.2)))
 
@@ -423,7 +526,7 @@ class _BiRNNEncoding(object):
         return self.model(sentence)
 
 class _StaticEmbedding(object):
-    def __init__(self, vectors, max_length, nr_out, nr_tune=5000, dropout=0.0):
+    def __init__(self, vectors, max_length, nr_out, nr_tune=5000, dropout=0.0, mask_zero=False):
         self.nr_out = nr_out
         self.max_length = max_length
         self.embed = Embedding(
@@ -432,6 +535,7 @@ class _StaticEmbedding(object):
                         input_length=max_length,
                         weights=[vectors],
                         name='embed',
+                        mask_zero=mask_zero,
                         trainable=False,)
         self.tune = Embedding(
                         nr_tune,
@@ -442,7 +546,7 @@ class _StaticEmbedding(object):
                         trainable=True,
                         dropout=dropout)
         self.mod_ids = Lambda(lambda sent: sent % (nr_tune-1)+1,
-                              output_shape=(self.max_length,))
+                              output_shape=lambda shape: shape)
 
         self.project = TimeDistributed(
                             Dense(
@@ -492,6 +596,7 @@ def cross_correlation(x):
     ifft = tf.ifft(tf.conj(a_fft) * b_fft)
     return tf.cast(tf.real(ifft), 'float32')
 
+@memory_profiling.profiled('network.load_data')
 def load_data(file, max_sequence_length):
     glove_embeddings = get_glove_embeddings()
 
@@ -513,10 +618,11 @@ def load_data(file, max_sequence_length):
             neg_paths = [path for paths in neg_paths for path in paths]
             neg_paths = pad_sequences(neg_paths, maxlen=max_sequence_length, padding='post')
 
-            all = np.concatenate([questions, pos_paths, neg_paths], axis=0)
-            mapped_all, index = pd.factorize(all.flatten(), sort=True)
-            mapped_all = mapped_all.reshape((-1, max_sequence_length))
-            vectors = glove_embeddings[index]
+            with memory_profiling.phase('network.load_data: factorize'):
+                all = np.concatenate([questions, pos_paths, neg_paths], axis=0)
+                mapped_all, index = pd.factorize(all.flatten(), sort=True)
+                mapped_all = mapped_all.reshape((-1, max_sequence_length))
+                vectors = glove_embeddings[index]
 
             questions, pos_paths, neg_paths = np.split(mapped_all, [questions.shape[0], questions.shape[0]*2])
             neg_paths = np.reshape(neg_paths, (len(questions), NEGATIVE_SAMPLES, max_sequence_length))
@@ -529,6 +635,84 @@ def load_data(file, max_sequence_length):
 
 
 
+def build_model(vectors, max_length=None, nr_hidden=128, dropout=0.4, mask_zero=True):
+    '''
+        The (uncompiled) pairwise model: [question, positive path, negative path] -> [pos score, neg score, loss].
+
+    :param max_length: None for variable length inputs (see bucketed_batches), or fixed
+    :param mask_zero: skip the padding (ID 0) in the encoder. Needed so that scores don't depend on the padding.
+    '''
+    # Define input to the models
+    x_ques = Input(shape=(max_length,), dtype='int32', name='x_ques')
+    x_pos_path = Input(shape=(max_length,), dtype='int32', name='x_pos_path')
+    x_neg_path = Input(shape=(max_length,), dtype='int32', name='x_neg_path')
+
+    embedding_dims = vectors.shape[1]
+
+    # holographic_forward = Dense(1, activation='sigmoid')
+    # final_forward = Dense(1, activation='sigmoid')
+
+    embed = _StaticEmbedding(vectors, max_length, embedding_dims, dropout=dropout, mask_zero=mask_zero)
+    encode = _BiRNNEncoding(max_length, embedding_dims,  nr_hidden, dropout)
+    # attend = _Attention(max_length, nr_hidden, dropout=0.4, L2=0.01)
+    # align = _SoftAlignment(max_length, nr_hidden)
+    # compare = _Comparison(max_length, nr_hidden, dropout=0.4, L2=0.01)
+    # entail = _Entailment(nr_hidden, 1, dropout=0.4, L2=0.01)
+
+    def getScore(ques, path):
+        x_ques_embedded = embed(ques)
+        x_path_embedded = embed(path)
+
+        ques_encoded = encode(x_ques_embedded)
+        path_encoded = encode(x_path_embedded)
+
+        # holographic_score = holographic_forward(Lambda(lambda x: cross_correlation(x)) ([ques_encoded, path_encoded]))
+        dot_score = dot([ques_encoded, path_encoded], axes=-1)
+        # l1_score = Lambda(lambda x: K.abs(x[0]-x[1]))([ques_encoded, path_encoded])
+
+        # return final_forward(concatenate([holographic_score, dot_score, l1_score], axis=-1))
+        return dot_score
+
+        #
+        # attention = attend(ques_encoded, path_encoded)
+        #
+        # align_ques = align(path_encoded, attention)
+        # align_path = align(ques_encoded, attention, transpose=True)
+        #
+        # feats_ques = compare(ques_encoded, align_ques)
+        # feats_path = compare(path_encoded, align_path)
+        #
+        # return entail(feats_ques, feats_path)
+
+    pos_score = getScore(x_ques, x_pos_path)
+    neg_score = getScore(x_ques, x_neg_path)
+
+    loss = Lambda(lambda x: K.maximum(0., 1.0 - x[0] + x[1]))([pos_score, neg_score])
+
+    output = concatenate([pos_score, neg_score, loss], axis=-1)
+
+    # Model time!
+    model = Model(inputs=[x_ques, x_pos_path, x_neg_path],
+        outputs=[output])
+    return model
+
+
+def load_templates(file):
+    '''
+        The LC-QuAD template of every question of the dataset (see parser.run), or None if the dataset has none.
+    '''
+    try:
+        return np.load(os.path.join(DATA_DIR, file + ".templates.npy"))
+    except IOError:
+        with open(os.path.join(DATA_DIR, file)) as fp:
+            dataset = pickle.load(fp)
+        if not all(len(i) > 4 for i in dataset):
+            return None
+        templates = np.asarray([-1 if i[4] is None else i[4] for i in dataset])
+        np.save(os.path.join(DATA_DIR, file + ".templates.npy"), templates)
+        return templates
+
+
 def main():
 
     gpu = sys.argv[1]
@@ -539,7 +723,7 @@ def main():
         Data Time!
     """
     # Pull the data up from disk
-    max_length = 50
+    max_length = MAX_LENGTH
     vectors, questions, pos_paths, neg_paths = load_data("results_jan_12_full.pickle", max_length)
     # pad_till = abs(pos_paths.shape[1] - questions.shape[1])
     # pad = lambda x: np.pad(x, [(0,0), (0,pad_till), (0,0)], 'constant', constant_values=0.)
@@ -589,59 +773,7 @@ def main():
             Model Time!
         """
         max_length = train_questions.shape[1]
-        # Define input to the models
-        x_ques = Input(shape=(max_length,), dtype='int32', name='x_ques')
-        x_pos_path = Input(shape=(max_length,), dtype='int32', name='x_pos_path')
-        x_neg_path = Input(shape=(max_length,), dtype='int32', name='x_neg_path')
-
-        embedding_dims = vectors.shape[1]
-        nr_hidden = 128
-
-        # holographic_forward = Dense(1, activation='sigmoid')
-        # final_forward = Dense(1, activation='sigmoid')
-
-        embed = _StaticEmbedding(vectors, max_length, embedding_dims, dropout=0.4)
-        encode = _BiRNNEncoding(max_length, embedding_dims,  nr_hidden, 0.4)
-        # attend = _Attention(max_length, nr_hidden, dropout=0.4, L2=0.01)
-        # align = _SoftAlignment(max_length, nr_hidden)
-        # compare = _Comparison(max_length, nr_hidden, dropout=0.4, L2=0.01)
-        # entail = _Entailment(nr_hidden, 1, dropout=0.4, L2=0.01)
-
-        def getScore(ques, path):
-            x_ques_embedded = embed(ques)
-            x_path_embedded = embed(path)
-
-            ques_encoded = encode(x_ques_embedded)
-            path_encoded = encode(x_path_embedded)
-
-            # holographic_score = holographic_forward(Lambda(lambda x: cross_correlation(x)) ([ques_encoded, path_encoded]))
-            dot_score = dot([ques_encoded, path_encoded], axes=-1)
-            # l1_score = Lambda(lambda x: K.abs(x[0]-x[1]))([ques_encoded, path_encoded])
-
-            # return final_forward(concatenate([holographic_score, dot_score, l1_score], axis=-1))
-            return dot_score
-
-            #
-            # attention = attend(ques_encoded, path_encoded)
-            #
-            # align_ques = align(path_encoded, attention)
-            # align_path = align(ques_encoded, attention, transpose=True)
-            #
-            # feats_ques = compare(ques_encoded, align_ques)
-            # feats_path = compare(path_encoded, align_path)
-            #
-            # return entail(feats_ques, feats_path)
-
-        pos_score = getScore(x_ques, x_pos_path)
-        neg_score = getScore(x_ques, x_neg_path)
-
-        loss = Lambda(lambda x: K.maximum(0., 1.0 - x[0] + x[1]))([pos_score, neg_score])
-
-        output = concatenate([pos_score, neg_score, loss], axis=-1)
-
-        # Model time!
-        model = Model(inputs=[x_ques, x_pos_path, x_neg_path],
-            outputs=[output])
+        model = build_model(vectors, None if DYNAMIC_PADDING else max_length, mask_zero=DYNAMIC_PADDING)
 
         print(model.summary())
 
@@ -652,9 +784,11 @@ def main():
         training_input = [train_questions, train_pos_paths, train_neg_paths]
 
         training_generator = TrainingDataGenerator(train_questions, train_pos_paths, train_neg_paths,
-                                                  max_length, neg_paths_per_epoch_train, BATCH_SIZE)
+                                                  max_length, neg_paths_per_epoch_train, BATCH_SIZE,
+                                                  bucketed=DYNAMIC_PADDING)
         validation_generator = ValidationDataGenerator(train_questions, train_pos_paths, train_neg_paths,
-                                                  max_length, neg_paths_per_epoch_test, BATCH_SIZE*3)
+                                                  max_length, neg_paths_per_epoch_test, BATCH_SIZE*3,
+                                                  bucketed=DYNAMIC_PADDING)
 
 
         json_desc, dir = get_smart_save_path(model)
@@ -663,7 +797,7 @@ def main():
         checkpointer = ModelCheckpoint(filepath=model_save_path, monitor='val_metric', verbose=1, save_best_only=True, mode='max', period=10)
 
         model.fit_generator(training_generator, epochs=EPOCHS,
-            validation_data=validation_generator, workers=3, use_multiprocessing=True, callbacks=[checkpointer])
+            validation_data=validation_generator, workers=3, use_multiprocessing=True, callbacks=[checkpointer, TokensPerSecond(training_generator)])
             # callbacks=[EarlyStopping(monitor='val_loss', min_delta=0, patience=0, verbose=0, mode='auto')
     # ])
 
@@ -671,7 +805,10 @@ def main():
 
         # Prepare test data
 
-        print "Precision (hits@1) = ", rank_precision(model, test_questions, test_pos_paths, test_neg_paths)
+        from utils import evaluation
+        templates = load_templates("results_jan_12_full.pickle")
+        evaluation.report(evaluation.evaluate(model, test_questions, test_pos_paths, test_neg_paths,
+                                              _templates=test_split(templates) if templates is not None else None))
 
     # print "Evaluation Complete"
     # print "Loss     = ", results[0]
@@ -19,6 +19,7 @@ from pprint import pprint
 # Custom files
 import utils.dbpedia_interface as db_interface
 import utils.embeddings_interface as sim
+import utils.dataset_reader as dataset_reader
 
 
 '''
@@ -343,12 +344,10 @@ controller = []
 def create_dataset(skip=0,end=None,debug=True,time_limit=False):
     final_data = []
     file_directory = "resources/data_set.json"
-    json_data = open(file_directory).read()
-    data = json.loads(json_data)
     counter = 0
     skip = skip
     if end == None:
-        end = len(data)
+        end = dataset_reader.count(file_directory)
     OUTPUT_DIR = 'data/preprocesseddata_parallel/' + str(skip)+str(end)  # Place to store the files
     print OUTPUT_DIR
     try:
@@ -356,7 +355,7 @@ def create_dataset(skip=0,end=None,debug=True,time_limit=False):
     except OSError:
         print("Folder already exists")
 
-    for node in data[int(skip):int(end)]:
+    for node in dataset_reader.questions(file_directory, _start=int(skip), _stop=int(end)):
         '''
             For now focusing on just simple question
         '''
@@ -743,10 +742,8 @@ def test(_entity, _relation):
 def create_simple_dataset():
 
     file_directory = "resources/data_set.json"
-    json_data = open(file_directory).read()
-    data = json.loads(json_data)
     counter = 0
-    for node in data:
+    for node in dataset_reader.questions(file_directory):
         # print node[u"sparql_template_id"]
         # raw_input("check sparql templated id")
         # pass
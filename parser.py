@@ -19,6 +19,7 @@ from pprint import pprint
 from gensim import models
 from progressbar import ProgressBar
 
+from utils import memory_profiling
 from utils import embeddings_interface
 from utils import dbpedia_interface as db_interface
 from utils import natural_language_utilities as nlutils
@@ -235,6 +236,7 @@ def parse(_raw):
 
         return -1
 
+@memory_profiling.profiled('parser.run')
 def run(_readfiledir='data/preprocesseddata_new_v2/', _writefilename='data/training/pairwise/',
         _phase_i_dir='resources/data_embedded_phase_i.pickle'):
     """
@@ -286,25 +288,26 @@ def run(_readfiledir='data/preprocesseddata_new_v2/', _writefilename='data/train
             print("parser: phase I: Started reading JSONs from disk.")
 
         # Read JSON files.
-        for filename in iterable:
-            data = json.load(open(os.path.join(_readfiledir, filename)))
+        with memory_profiling.phase('parser.run: phase I'):
+            for filename in iterable:
+                data = json.load(open(os.path.join(_readfiledir, filename)))
 
-            # Shuffle data too
-            random.shuffle(data)
+                # Shuffle data too
+                random.shuffle(data)
 
-            # Each file has multiple datapoints (questions).
-            for question in data:
+                # Each file has multiple datapoints (questions).
+                for question in data:
 
-                # Collect the response
-                ops = parse(question)
+                    # Collect the response
+                    ops = parse(question)
 
-                if ops == -1:
-                    continue
+                    if ops == -1:
+                        continue
 
-                id_q, id_tp, id_fps, v_y = ops
+                    id_q, id_tp, id_fps, v_y = ops
 
-                # Collect data for each question
-                data_embedded.append([id_q, id_tp, id_fps, v_y])
+                    # Collect data for each question (and its template, to evaluate per template: utils/evaluation.py)
+                    data_embedded.append([id_q, id_tp, id_fps, v_y, question.get(u'sparql_template_id')])
 
         if DEBUG:
             print("""
@@ -315,9 +318,10 @@ def run(_readfiledir='data/preprocesseddata_new_v2/', _writefilename='data/train
             Collect the vectorized things in a variable.
             """)
 
-        f = open(_phase_i_dir, 'w+')
-        pickle.dump(data_embedded, f)
-        f.close()
+        with memory_profiling.phase('parser.run: pickle'):
+            f = open(_phase_i_dir, 'w+')
+            pickle.dump(data_embedded, f)
+            f.close()
 
 
 def test():
@@ -17,6 +17,8 @@ from pprint import pprint
 # Custom files
 import utils.dbpedia_interface as db_interface
 import utils.embeddings_interface as sim
+import utils.dataset_reader as dataset_reader
+from utils.predicate_filter import PredicateFilter
 
 
 '''
@@ -39,7 +41,7 @@ STOP_WORD = True
 dbp = db_interface.DBPedia(_verbose=True, caching=True)
 
 skip = 0
-relations_stop_word = open(RELATION_STOP_WORD_DIR).read().split()
+relations_stop_word = PredicateFilter.load(RELATION_STOP_WORD_DIR)
 final_answer_dataset = []                   # Used in create_simple_dataset()
 
 
@@ -177,6 +179,14 @@ def updated_get_relationship_hop(_entity, _relations):
         This function gives all the relations after the _relationship chain. The
         difference in this and the get_relationship_hop is that it gives all the relationships from _relations[:-1],
     '''
+    if len(_relations) == 1:
+        # One round-trip per direction, aggregated on the endpoint
+        rel = [dbp.get_hop2_properties(_entity, _relations[0][0], _right=_relations[0][1], _right_hop2=True),
+               dbp.get_hop2_properties(_entity, _relations[0][0], _right=_relations[0][1], _right_hop2=False)]
+        if STOP_WORD:
+            rel = [relations_stop_word.filter(x) for x in rel]
+        return [list(set(rel[0])), list(set(rel[1]))]
+
     entities = [_entity]    #entites are getting pushed here
     for rel in _relations:
         outgoing = rel[1]
@@ -202,11 +212,7 @@ def updated_get_relationship_hop(_entity, _relations):
     for ent in entities:
 
         if STOP_WORD:
-            rel = []
-            a = dbp.get_properties(ent,label=False)
-            for _rel in a:
-                if _rel not in relations_stop_word:
-                    rel.append(_rel)
+            rel = [relations_stop_word.filter(x) for x in dbp.get_properties(ent,label=False)]
         else:
             rel = dbp.get_properties(ent,label=False)
         outgoing_relationships =  outgoing_relationships + list(set(rel[0]))
@@ -224,14 +230,8 @@ def get_stochastic_relationship_hop(_entity, _relation, _question=None,STOP_WORD
         :return: [[set(incoming property)],[set(outgoing property]]
     '''
     temp_out,temp_incoming =  dbp.get_properties(_entity,_relation[0][0],label=False)
-    out, incoming = [],[]
     if STOP_WORD:
-        for rel in temp_out:
-            if rel not in relations_stop_word:
-                out.append(rel)
-        for rel in temp_incoming:
-            if rel not in relations_stop_word:
-                incoming.append(rel)
+        out, incoming = relations_stop_word.filter(temp_out), relations_stop_word.filter(temp_incoming)
     else:
         out, incoming = temp_out,temp_incoming
 
@@ -250,14 +250,10 @@ def get_stochastic_relationship_hop(_entity, _relation, _question=None,STOP_WORD
         # print "******"
         if STOP_WORD:
             #do something
-            interm = []
             a = get_set_list(
             get_top_k(get_rank_rel(updated_get_relationship_hop(_entity, [(rel, True)]), (rel, True),_question), (rel, True),
                       hop=2))
-            for _rel in a:
-                if _rel not in relations_stop_word:
-                    interm.append(_rel)
-            temp[rel] = interm
+            temp[rel] = [relations_stop_word.filter(x) for x in a]
         else:
             temp[rel] = get_set_list(
             get_top_k(get_rank_rel(updated_get_relationship_hop(_entity, [(rel, True)]), (rel, True),_question), (rel, True),
@@ -269,12 +265,8 @@ def get_stochastic_relationship_hop(_entity, _relation, _question=None,STOP_WORD
         temp = {}
         if STOP_WORD:
             #dosomething
-            interm = []
             a = get_set_list(get_top_k(get_rank_rel(updated_get_relationship_hop(_entity, [(rel, False)]),(rel,False),_question),(rel,False),hop=2))
-            for _rel in a:
-                if _rel not in relations_stop_word:
-                    interm.append(_rel)
-            temp[rel] = interm
+            temp[rel] = [relations_stop_word.filter(x) for x in a]
         else:
             temp[rel] = get_set_list(get_top_k(get_rank_rel(updated_get_relationship_hop(_entity, [(rel, False)]),(rel,False),_question),(rel,False),hop=2))
         incoming_relationships.append(temp)
@@ -332,12 +324,10 @@ controller = []
 def create_dataset(debug=True,time_limit=False):
     final_data = []
     file_directory = "resources/data_set.json"
-    json_data = open(file_directory).read()
-    data = json.loads(json_data)
     counter = 0
     skip = 0
     log = []
-    for node in data:
+    for node in dataset_reader.questions(file_directory):
         '''
             For now focusing on just simple question
         '''
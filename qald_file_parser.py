@@ -1,9 +1,9 @@
-import json
 import pickle
 from pprint import pprint
 import utils.dbpedia_interface as db_interface
 import utils.natural_language_utilities as nlutils
 import utils.embeddings_interface as sim
+import utils.dataset_reader as dataset_reader
 from termcolor import colored
 short_forms = {
 	'dbo:' : 'http://dbpedia.org/ontology/',
@@ -26,8 +26,7 @@ dbp = db_interface.DBPedia(_verbose=True, caching=True)
 
 File = 'resources/qald-7-train-multilingual.json'
 UNPROCESSED_TWO_TRIPLE = 'data/manual_qald.pickle'
-data = json.load(open(File))
-data = data['questions']
+data = dataset_reader.questions(File, _key='questions')
 
 data_triple = [] #This is a list of list having [question,[topic_entity],[relation],id]
 unprocessed_two_triple = pickle.load(open(UNPROCESSED_TWO_TRIPLE))
@@ -95,13 +94,11 @@ def top_k_relation(entity,question,relations,k=20,method=1):
     else:
 		return temp_relations	
 
-for i in xrange(len(data)):
-	data[i]['query']['sparql'] = data[i]['query']['sparql'].replace('.\n','. ')
-
 final_response = []
 log = []
 processed_data = []
 for node in data:
+	node['query']['sparql'] = node['query']['sparql'].replace('.\n','. ')
 	parsed_response = {}
 	sparql_query = node['query']['sparql']	#The sparql query of the question
 	parsed_response[u'sparql_query'] = node['query']['sparql']
@@ -43,6 +43,8 @@ from keras.layers.pooling import GlobalAveragePooling1D, GlobalMaxPooling1D
 from keras.layers import Merge
 from sklearn.utils import shuffle
 
+from utils import evaluation
+
 
 # Some Macros
 DEBUG = True
@@ -69,20 +71,11 @@ import torch as t
 
 
 def rank_precision(model, test_questions, test_pos_paths, test_neg_paths, neg_paths_per_epoch=100, batch_size=1000):
-    max_length = test_questions.shape[-1]
-    questions = np.reshape(np.repeat(np.reshape(test_questions,
-                                            (test_questions.shape[0], 1, test_questions.shape[1])),
-                                 neg_paths_per_epoch+1, axis=1), (-1, max_length))
-    pos_paths = np.reshape(test_pos_paths,
-                                    (test_pos_paths.shape[0], 1, test_pos_paths.shape[1]))
-    neg_paths = test_neg_paths[:, np.random.randint(0, NEGATIVE_SAMPLES, neg_paths_per_epoch), :]
-    all_paths = np.reshape(np.concatenate([pos_paths, neg_paths], axis=1), (-1, max_length))
-
-    outputs = model.predict([questions, all_paths, np.zeros_like(all_paths)], batch_size=batch_size)[:,0]
-    outputs = np.reshape(outputs, (test_questions.shape[0], neg_paths_per_epoch+1))
-
-    precision = float(len(np.where(np.argmax(outputs, axis=1)==0)[0]))/outputs.shape[0]
-    return precision
+    '''
+        hits@1 against neg_paths_per_epoch (seeded) negative paths, streamed (see utils/evaluation.py)
+    '''
+    return evaluation.evaluate(model, test_questions, test_pos_paths, test_neg_paths,
+                               _negatives=neg_paths_per_epoch, _batch_size=batch_size)['all']['hits@1']
 
 
 
@@ -217,7 +210,8 @@ with K.tf.device('/gpu:' + gpu):
     from keras.models import load_model
     metric = rank_precision_metric(10)
     model = load_model("data/training/pairwise/model_56/model.h5", {'custom_loss':custom_loss, 'metric':metric})
-    print rank_precision(model, test_questions, test_pos_paths, test_neg_paths, 1000, 10000)
+    # hits@1/5/10, MRR and ranks against all the negative paths
+    evaluation.report(evaluation.evaluate(model, test_questions, test_pos_paths, test_neg_paths))
 
 
 
@@ -0,0 +1,236 @@
+"""
+    Author: geraltofrivia; saist1993
+    Krantikari as a long running HTTP service.
+
+    Everything heavy (GloVe, the labels pickle, the Keras model, the predicate index, the DBpedia interface) is loaded
+        once, in the background, and then shared by every request. Requests are served by a thread each, and at most
+        MAX_CONCURRENT_REQUESTS of them run the pipeline at once (the rest wait for their turn).
+
+    API:
+        POST /answer    {"question": "Who is the president of Nicaragua ?",
+                         "entities": ["http://dbpedia.org/resource/Nicaragua"],
+                         "qald": false, "early_exit": false, "max_candidates": 20}        (the last three are optional)
+            ->  {"best_path": [...], "path_length": 1, "candidates": [{"path": [...], "score": 0.9, "hops": 1}, ...],
+                 "timings": {"queue": 0.0, "total": 1.2, "hop1_subgraph": ..., ...}, "stats": {...}}
+        GET  /ready     200 once everything is loaded, 503 before (or if loading failed).
+
+    Usage:
+        python server.py <gpu, or cpu> [host:port]
+        (see benchmarks/load_test.py to load test it)
+"""
+
+# Imports
+import sys
+import json
+import time
+import bottle
+import SocketServer
+import threading
+import traceback
+import numpy as np
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+
+# Local file imports
+import krantikari
+from utils import model_export
+from utils import quantization
+from utils import batch_scheduler
+from utils import model_interpreter
+from utils import embeddings_interface
+from utils import dbpedia_interface as db_interface
+
+# Some MACROS
+HOST = '0.0.0.0'
+PORT = 8080
+MAX_CONCURRENT_REQUESTS = 8         # running the pipeline at once. Others wait.
+MAX_CANDIDATES = 20                 # ranked paths returned per question (by default)
+WARMUP_TOKENS = ['who', 'is', 'the', 'president']
+SCORER = 'keras'                    # or the CPU exports of utils/model_export.py: 'frozen', 'numpy'
+QUANTIZATION = None                 # with SCORER = 'numpy': 'float16' or 'int8' embedding tables (utils/quantization.py)
+MICRO_BATCHING = False              # score the paths of concurrent questions together (see utils/batch_scheduler.py).
+                                    # Off: benchmarks/batch_scheduler.py shows no throughput win on CPU (measure first)
+
+app = bottle.Bottle()
+
+
+class Pipeline:
+    """
+        Everything Krantikari needs, loaded once (in a thread of its own, so that the server can say it's not ready yet).
+    """
+
+    def __init__(self, _gpu):
+        self.gpu = _gpu
+        self.state = 'loading'          # -> 'ready' or 'failed'
+        self.error = None
+        self.started = time.time()
+        self.ready_since = None
+
+        self.dbp = None
+        self.model = None
+        self.index = None
+
+        self.slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+        self.lock = threading.Lock()
+        self.stats = {'answered': 0, 'failed': 0, 'in_flight': 0}
+
+    def load(self):
+        try:
+            self.dbp = db_interface.DBPedia(_verbose=True, caching=True)
+            if SCORER == 'frozen':
+                self.model = model_export.FrozenScorer()
+            elif SCORER == 'numpy':
+                self.model = model_export.NumpyScorer.load()
+                if QUANTIZATION:
+                    self.model = quantization.quantize(self.model, _embeddings=QUANTIZATION)
+            else:
+                self.model = model_interpreter.ModelInterpreter(_gpu=self.gpu)
+            if MICRO_BATCHING:
+                self.model = batch_scheduler.RankScheduler(self.model)
+            self.index = krantikari.load_predicate_index()
+
+            # GloVe is loaded lazily, on the first call. Let that not be the first request.
+            embeddings_interface.vocabularize(WARMUP_TOKENS, _embedding='glove')
+
+            self.ready_since = time.time()
+            self.state = 'ready'
+            print("Pipeline loaded in %.1f seconds. Ready." % (self.ready_since - self.started))
+        except Exception as e:
+            traceback.print_exc()
+            self.error = str(e)
+            self.state = 'failed'
+
+    def answer(self, _question, _entities, _qald=False, _early_exit=krantikari.EARLY_EXIT):
+        """
+        :return: krantikari.Krantikari, seconds spent waiting for a slot
+        """
+        start = time.time()
+        with self.slots:
+            waited = time.time() - start
+            with self.lock:
+                self.stats['in_flight'] += 1
+            try:
+                qa = krantikari.Krantikari(_question=_question, _entities=_entities, _dbpedia_interface=self.dbp,
+                                           _model_interpreter=self.model, _qald=_qald, _predicate_index=self.index,
+                                           _early_exit=_early_exit)
+            finally:
+                with self.lock:
+                    self.stats['in_flight'] -= 1
+        return qa, waited
+
+
+PIPELINE = None
+
+
+def to_json(_object):
+    """
+        json.dumps, which also takes numpy scalars and arrays (eg. in Krantikari.stats)
+    """
+    def convert(x):
+        if isinstance(x, np.ndarray):
+            return x.tolist()
+        if isinstance(x, np.generic):
+            return x.item()
+        return str(x)
+
+    bottle.response.content_type = 'application/json'
+    return json.dumps(_object, default=convert)
+
+
+def error(_status, _message):
+    bottle.response.status = _status
+    return to_json({'error': _message})
+
+
+@app.get('/ready')
+def ready():
+    if PIPELINE is None or PIPELINE.state != 'ready':
+        bottle.response.status = 503
+        return to_json({'ready': False, 'state': PIPELINE.state if PIPELINE else 'loading',
+                        'error': PIPELINE.error if PIPELINE else None})
+    return to_json({'ready': True, 'uptime': time.time() - PIPELINE.ready_since, 'stats': PIPELINE.stats})
+
+
+@app.post('/answer')
+def answer():
+    if PIPELINE is None or PIPELINE.state != 'ready':
+        return error(503, "Not ready yet.")
+
+    # Parse and check the request
+    try:
+        data = json.loads(bottle.request.body.read())
+        question = data[u'question']
+        entities = data[u'entities']
+        assert isinstance(question, basestring) and question.strip(), "question must be a non empty string"
+        assert isinstance(entities, list) and len(entities) > 0 and \
+            all(isinstance(x, basestring) for x in entities), "entities must be a non empty list of URIs"
+        max_candidates = int(data.get(u'max_candidates', MAX_CANDIDATES))
+    except KeyError as e:
+        return error(400, "Bad request: %s is missing" % e.message)
+    except (ValueError, TypeError, AssertionError) as e:
+        return error(400, "Bad request: %s" % (e.message or "expected {\"question\": ..., \"entities\": [...]}"))
+
+    try:
+        qa, waited = PIPELINE.answer(question, [x.encode('ascii', 'ignore') for x in entities],
+                                     _qald=bool(data.get(u'qald', False)),
+                                     _early_exit=bool(data.get(u'early_exit', krantikari.EARLY_EXIT)))
+    except Exception as e:
+        traceback.print_exc()
+        with PIPELINE.lock:
+            PIPELINE.stats['failed'] += 1
+        return error(500, str(e))
+
+    with PIPELINE.lock:
+        PIPELINE.stats['answered'] += 1
+
+    timings = dict(qa.timings)
+    timings['queue'] = waited
+    return to_json({'question': question, 'entities': entities, 'best_path': qa.best_path,
+                    'path_length': getattr(qa, 'path_length', None), 'candidates': qa.candidates[:max_candidates],
+                    'timings': timings, 'stats': qa.stats})
+
+
+class ThreadedServer(bottle.ServerAdapter):
+    """
+        bottle's default (wsgiref) server, with a thread per request.
+    """
+
+    def run(self, _app):
+        quiet = self.quiet
+
+        class Server(SocketServer.ThreadingMixIn, WSGIServer):
+            daemon_threads = True
+
+        class Handler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                if not quiet:
+                    WSGIRequestHandler.log_request(self, *args, **kwargs)
+
+        make_server(self.host, self.port, _app, Server, Handler).serve_forever()
+
+
+def serve(_gpu, _host=HOST, _port=PORT, _pipeline=None, _quiet=True):
+    """
+        Start loading the pipeline, and serve (blocks).
+
+    :param _pipeline: a Pipeline (or anything like it). By default, Pipeline(_gpu).
+    """
+    global PIPELINE
+    PIPELINE = _pipeline or Pipeline(_gpu)
+
+    loader = threading.Thread(target=PIPELINE.load)
+    loader.daemon = True
+    loader.start()
+
+    bottle.run(app, server=ThreadedServer, host=_host, port=_port, quiet=_quiet)
+
+
+if __name__ == "__main__":
+    try:
+        gpu = sys.argv[1]
+    except IndexError:
+        # No arguments given. Take from user
+        gpu = raw_input("Specify the GPU you wanna use boi:\t")
+    gpu = None if gpu == 'cpu' else gpu
+
+    host, port = (sys.argv[2].split(':') if len(sys.argv) > 2 else (HOST, PORT))
+    serve(gpu, host, int(port))
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+
+# The scripts import each other from the root of the repo (as they're run from there)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from utils import model_export
+
+
+class FakeRedis:
+    """
+        Just enough of redis.StrictRedis for SparqlCache, which remembers the TTL of every key.
+    """
+
+    def __init__(self):
+        self.values, self.ttls = {}, {}
+
+    def get(self, _key):
+        return self.values.get(_key)
+
+    def mget(self, _keys):
+        return [self.values.get(x) for x in _keys]
+
+    def set(self, _key, _value, ex=None):
+        self.values[_key] = _value
+        self.ttls[_key] = ex
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        pass
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def numpy_scorer():
+    """
+        Factory of model_export.NumpyScorer with random weights: numpy_scorer(random, vocab, dims, units, ...)
+    """
+    def make(_random, _vocab, _dims, _units, _max_ques_len=10, _max_path_len=10):
+        weights = {'embed': _random.normal(0, 0.5, (_vocab, _dims))}
+        for direction in ['forward', 'backward']:
+            weights[direction + '_kernel'] = _random.normal(0, 0.3, (_dims, 4 * _units))
+            weights[direction + '_recurrent'] = _random.normal(0, 0.3, (_units, 4 * _units))
+            weights[direction + '_bias'] = _random.normal(0, 0.1, 4 * _units)
+        config = {'units': _units, 'activation': 'tanh', 'recurrent_activation': 'hard_sigmoid',
+                  'merge_mode': 'concat', 'mask_zero': True, 'max_ques_len': _max_ques_len,
+                  'max_path_len': _max_path_len, 'dynamic': False}
+        return model_export.NumpyScorer(weights, config)
+    return make
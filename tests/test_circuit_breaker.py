@@ -0,0 +1,43 @@
+import time
+
+from utils import circuit_breaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = circuit_breaker.CircuitBreaker(_failure_threshold=3, _reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow() and breaker.ready()
+    breaker.record_failure()
+    assert breaker.state == circuit_breaker.OPEN
+    assert not breaker.allow() and not breaker.ready()
+    assert breaker.stats['refused'] == 1 and breaker.stats['opened'] == 1
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = circuit_breaker.CircuitBreaker(_failure_threshold=1, _reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.ready()
+    assert breaker.allow() and breaker.state == circuit_breaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+def test_ignored_failures_leave_the_endpoint_alone():
+    breaker = circuit_breaker.CircuitBreaker(_failure_threshold=2, _reset_timeout=0.01)
+    for _ in range(10):
+        breaker.record_ignored()
+    assert breaker.state == circuit_breaker.CLOSED and breaker.failures == 0
+
+    # A probe which fails because of itself: the next caller probes again
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_ignored()
+    assert breaker.allow() and breaker.state == circuit_breaker.HALF_OPEN
@@ -0,0 +1,74 @@
+import io
+import json
+
+import pytest
+
+from utils import dataset_reader
+
+
+QUESTIONS = [{u'_id': i, u'corrected_question': u'What is the \xe9 number %d, "quoted" [%d]?' % (i, i),
+              u'score': i * 0.5, u'nested': {u'list': [1, 2.5e-3, None, True], u'empty': {}}} for i in range(25)]
+
+
+@pytest.fixture(params=[False, True], ids=['raw_decode', 'ijson'])
+def parser(request, monkeypatch):
+    if request.param and dataset_reader.ijson is None:
+        pytest.skip('ijson is not installed')
+    monkeypatch.setattr(dataset_reader, 'USE_IJSON', request.param)
+
+
+def write(_path, _value):
+    with io.open(str(_path), 'w', encoding='utf-8') as f:
+        f.write(u'%s' % json.dumps(_value, indent=2))
+    return str(_path)
+
+
+def test_read_matches_json_load(tmpdir, parser):
+    path = write(tmpdir.join('data_set.json'), QUESTIONS)
+    assert [node for _, node in dataset_reader.read(path)] == json.load(open(path))
+    assert [index for index, _ in dataset_reader.read(path)] == list(range(len(QUESTIONS)))
+    assert dataset_reader.count(path) == len(QUESTIONS)
+
+
+def test_read_under_a_key(tmpdir, parser):
+    path = write(tmpdir.join('qald.json'), {u'dataset': {u'id': u'qald'}, u'questions': QUESTIONS, u'after': 1})
+    assert list(dataset_reader.questions(path, _key='questions')) == json.load(open(path))['questions']
+    with pytest.raises(KeyError):
+        list(dataset_reader.questions(path, _key='missing'))
+
+
+def test_small_chunks(tmpdir, monkeypatch):
+    path = write(tmpdir.join('data_set.json'), QUESTIONS)
+    monkeypatch.setattr(dataset_reader, 'USE_IJSON', False)
+    for chunk_size in [1, 2, 7, 64]:
+        with io.open(path, 'r', encoding='utf-8') as f:
+            assert list(dataset_reader._array(dataset_reader._Buffer(f, chunk_size))) == QUESTIONS
+
+
+def test_empty_dataset(tmpdir, parser):
+    path = write(tmpdir.join('empty.json'), [])
+    assert list(dataset_reader.read(path)) == []
+
+
+@pytest.mark.parametrize('extension', ['.json', '.jsonl'])
+def test_start_stop_and_shards(tmpdir, extension):
+    path = write(tmpdir.join('data_set.json'), QUESTIONS)
+    if extension == '.jsonl':
+        path = dataset_reader.to_jsonl(path)
+        assert dataset_reader.count(path) == len(QUESTIONS)
+
+    assert list(dataset_reader.read(path, _start=5, _stop=12)) == list(enumerate(QUESTIONS))[5:12]
+
+    shards = [list(dataset_reader.read(path, _shard=(i, 3))) for i in range(3)]
+    for i, shard in enumerate(shards):
+        assert shard == [(index, node) for index, node in enumerate(QUESTIONS) if index % 3 == i]
+    assert sorted(x for shard in shards for x in shard) == list(enumerate(QUESTIONS))
+
+    assert list(dataset_reader.read(path, _start=4, _stop=20, _shard=(1, 4))) == \
+        [(index, QUESTIONS[index]) for index in [5, 9, 13, 17]]
+
+
+def test_invalid_shard(tmpdir):
+    path = write(tmpdir.join('data_set.json'), QUESTIONS)
+    with pytest.raises(ValueError):
+        list(dataset_reader.read(path, _shard=(3, 3)))
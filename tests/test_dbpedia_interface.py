@@ -0,0 +1,100 @@
+import time
+import socket
+import urllib2
+
+import pytest
+from SPARQLWrapper.SPARQLExceptions import EndPointInternalError, QueryBadFormed
+
+from utils import sparql_cache
+from utils import singleflight
+from utils import dbpedia_interface as db_interface
+
+
+class CountingDBPedia(db_interface.DBPedia):
+    """
+        A DBPedia on a dict instead of redis, which answers every query with _properties (and counts them).
+    """
+
+    def __init__(self, _redis, _properties):
+        self.cache = sparql_cache.SparqlCache(_redis)
+        self.properties = _properties
+        self.queries = 0
+
+    def shoot_custom_query(self, _custom_query, _columns=False):
+        self.queries += 1
+        return {u'property': list(self.properties), u'count': [u'1'] * len(self.properties)}
+
+
+class TimingOutDBPedia(db_interface.DBPedia):
+    """
+        A DBPedia on a dict instead of redis, whose endpoint times out on every query (and records them).
+    """
+
+    def __init__(self, _redis):
+        self.cache = sparql_cache.SparqlCache(_redis)
+        self.inflight = singleflight.SingleFlight()
+        self.fetched = []
+
+    def query_endpoint(self, _custom_query):
+        self.fetched.append(_custom_query)
+        raise db_interface.QueryFailed(sparql_cache.Failure('timeout', 'timed out', 'http://a', time.time(), None))
+
+
+def test_cached_failures_are_not_remembered_again(redis):
+    dbp = TimingOutDBPedia(redis)
+    dbp.cache.set_failure('Q', 'timeout', 'timed out', 'http://a')
+    cached, redis.ttls['Q'] = redis.values['Q'], 'untouched'
+
+    assert dbp.shoot_custom_queries(['Q', 'R', 'Q'], _skip_failures=True) == [None, None, None]
+    assert dbp.fetched == ['R']
+    assert (redis.values['Q'], redis.ttls['Q']) == (cached, 'untouched')
+    assert redis.ttls['R'] == sparql_cache.FAILURE_TTL
+
+    with pytest.raises(db_interface.QueryFailed):
+        dbp.shoot_custom_queries(['Q'])
+    assert dbp.fetched == ['R'] and redis.ttls['Q'] == 'untouched'
+
+
+def test_sampling_queries_can_skip_failures(redis):
+    dbp = TimingOutDBPedia(redis)
+    resources = ['http://dbpedia.org/resource/E%d' % i for i in range(3 * db_interface.VALUES_BATCH_SIZE)]
+    assert len(dbp.get_property_ids_of_resources(resources, _skip_failures=True)) == 0
+    assert len(dbp.fetched) == 3
+    assert dbp.get_entity('http://dbpedia.org/resource/E0', ['http://dbpedia.org/ontology/team'],
+                          _skip_failures=True) is None
+    with pytest.raises(db_interface.QueryFailed):
+        dbp.get_property_ids_of_resources(resources)
+
+
+def test_hop2_properties_are_cached(redis):
+    dbp = CountingDBPedia(redis, [u'http://dbpedia.org/ontology/team'])
+    args = ('http://dbpedia.org/resource/Tim_Duncan', 'http://dbpedia.org/ontology/draftTeam')
+    assert dbp.get_hop2_properties(*args) == ['http://dbpedia.org/ontology/team']
+    assert dbp.get_hop2_properties(*args) == ['http://dbpedia.org/ontology/team']
+    assert dbp.queries == 1
+
+
+def test_empty_hop2_neighbourhoods_are_cache_hits(redis):
+    dbp = CountingDBPedia(redis, [])
+    args = ('http://dbpedia.org/resource/Tim_Duncan', 'http://dbpedia.org/ontology/height')
+    for _ in range(3):
+        assert dbp.get_hop2_properties(*args) == []
+    assert dbp.queries == 1
+
+    for _ in range(3):
+        assert dbp.get_hop2_properties(*args, _counts=True) == {}
+    assert dbp.queries == 2
+    # Counts serve both kinds of calls
+    assert dbp.get_hop2_properties(*args) == []
+    assert dbp.queries == 2
+
+
+def test_only_unreachable_endpoints_and_server_errors_are_endpoint_failures():
+    assert db_interface.is_endpoint_failure(urllib2.URLError(socket.error(111, 'Connection refused')))
+    assert db_interface.is_endpoint_failure(urllib2.HTTPError('http://a', 503, 'Unavailable', {}, None))
+    assert db_interface.is_endpoint_failure(EndPointInternalError('500'))
+    assert not db_interface.is_endpoint_failure(urllib2.URLError(socket.timeout('timed out')))
+    assert not db_interface.is_endpoint_failure(socket.timeout('timed out'))
+    assert not db_interface.is_endpoint_failure(urllib2.HTTPError('http://a', 400, 'Bad Request', {}, None))
+    assert not db_interface.is_endpoint_failure(QueryBadFormed('400'))
+    assert not db_interface.is_endpoint_failure(ValueError('No JSON object could be decoded'))
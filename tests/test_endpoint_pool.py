@@ -0,0 +1,65 @@
+import pytest
+
+from utils import endpoint_pool
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+class ConnectionRefused(Exception):
+    pass
+
+
+def pool(_urls, **kwargs):
+    return endpoint_pool.EndpointPool(_urls, _hedge=False,
+                                      _is_endpoint_failure=lambda e: isinstance(e, ConnectionRefused), **kwargs)
+
+
+def fail(_error):
+    def function(_url):
+        raise _error
+    return function
+
+
+def test_request_failures_dont_open_the_breaker():
+    endpoints = pool(['http://a'])
+    for _ in range(3 * endpoint_pool.circuit_breaker.FAILURE_THRESHOLD):
+        with pytest.raises(endpoint_pool.EndpointError) as e:
+            endpoints.execute(fail(QueryTimeout('timed out')))
+        assert isinstance(e.value.error, QueryTimeout)
+    endpoint = endpoints.endpoints[0]
+    assert endpoint.breaker.state == endpoint_pool.circuit_breaker.CLOSED
+    assert endpoint.error_rate == 0.0
+    assert endpoint.stats['request_errors'] == 3 * endpoint_pool.circuit_breaker.FAILURE_THRESHOLD
+    assert endpoints.execute(lambda url: url) == 'http://a'
+
+
+def test_endpoint_failures_open_the_breaker():
+    endpoints = pool(['http://a'])
+    for _ in range(endpoint_pool.circuit_breaker.FAILURE_THRESHOLD):
+        with pytest.raises(endpoint_pool.EndpointError):
+            endpoints.execute(fail(ConnectionRefused()))
+    assert endpoints.endpoints[0].breaker.state == endpoint_pool.circuit_breaker.OPEN
+    with pytest.raises(endpoint_pool.EndpointError) as e:
+        endpoints.execute(lambda url: url)
+    assert e.value.error is None
+
+
+def test_only_endpoint_failures_are_retried():
+    calls = []
+
+    def function(_url):
+        calls.append(_url)
+        raise QueryTimeout() if 'query' in _url else ConnectionRefused()
+
+    endpoints = pool(['http://query-a', 'http://query-b', 'http://query-c'], _method='select-one')
+    with pytest.raises(endpoint_pool.EndpointError):
+        endpoints.execute(function)
+    assert len(calls) == 1 and endpoints.stats['retries'] == 0
+
+    del calls[:]
+    endpoints = pool(['http://a', 'http://b', 'http://c'], _method='select-one')
+    with pytest.raises(endpoint_pool.EndpointError):
+        endpoints.execute(function)
+    assert len(calls) == endpoint_pool.MAX_ATTEMPTS and endpoints.stats['retries'] == endpoint_pool.MAX_ATTEMPTS - 1
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from utils import evaluation
+
+UNITS = 4
+DIMS = 5
+VOCAB = 30
+
+
+class FirstTokenRanker:
+    """
+        Scores a path by its first ID (padding: higher than anything, to check that it isn't counted).
+    """
+    max_ques_len = max_path_len = None
+
+    def score(self, _padded_ques, _padded_paths):
+        return np.where(_padded_paths[:, 0] == 0, 1000, _padded_paths[:, 0]).astype(np.float32)
+
+
+class RowsOnly:
+    """
+        A model whose encoders are out of reach: evaluate has to score (question, path) rows.
+    """
+
+    def __init__(self, _scorer):
+        self.scorer = _scorer
+        self.max_ques_len, self.max_path_len = _scorer.max_ques_len, _scorer.max_path_len
+
+    def score(self, _padded_ques, _padded_paths):
+        return self.scorer.score(_padded_ques, _padded_paths)
+
+
+def test_hand_computed_metrics():
+    questions = np.asarray([[1, 2, 0]] * 4)
+    pos_paths = np.asarray([[5, 1, 0]] * 4)
+    neg_paths = np.asarray([[[3, 1, 0], [4, 0, 0], [0, 0, 0]],      # rank 1 (padding doesn't count)
+                            [[6, 1, 0], [2, 0, 0], [7, 2, 0]],      # rank 3
+                            [[9, 0, 0], [8, 0, 0], [6, 0, 0]],      # rank 4
+                            [[5, 2, 0], [1, 0, 0], [2, 0, 0]]])     # rank 1 (ties go to the true path)
+
+    results = evaluation.evaluate(FirstTokenRanker(), questions, pos_paths, neg_paths,
+                                  _templates=np.asarray(['a', 'a', 'b', 'b']), _chunk=3)
+    assert list(results['ranks']) == [1, 3, 4, 1]
+    assert results['all'] == pytest.approx({'questions': 4, 'hits@1': 0.5, 'hits@5': 1.0, 'hits@10': 1.0,
+                                            'mrr': (1 + 1 / 3.0 + 1 / 4.0 + 1) / 4, 'mean_rank': 2.25,
+                                            'median_rank': 2.0})
+    assert results['templates']['a']['mrr'] == pytest.approx((1 + 1 / 3.0) / 2)
+    assert results['templates']['b']['hits@1'] == 0.5
+
+
+def test_sampled_negatives():
+    questions = np.asarray([[1, 0]] * 2)
+    pos_paths = np.asarray([[5, 0]] * 2)
+    neg_paths = np.asarray([[[6, 0], [7, 0], [1, 0], [2, 0]]] * 2)
+    results = evaluation.evaluate(FirstTokenRanker(), questions, pos_paths, neg_paths, _negatives=2, _seed=3)
+    columns = np.random.RandomState(3).choice(4, 2, replace=False)
+    assert list(results['ranks']) == [1 + (neg_paths[0, columns, 0] > 5).sum()] * 2
+    assert evaluation.summarize(np.zeros(0)) == {'questions': 0}
+
+
+def test_encoders_rank_like_rows(numpy_scorer):
+    random = np.random.RandomState(0)
+    scorer = numpy_scorer(random, VOCAB, DIMS, UNITS, _max_ques_len=8, _max_path_len=6)
+
+    questions = random.randint(1, VOCAB, (7, 8))
+    questions[:, 5:] = 0
+    pos_paths = random.randint(1, VOCAB, (7, 6))
+    pos_paths[:, 3:] = 0
+    neg_paths = random.randint(1, VOCAB, (7, 9, 6))
+    neg_paths[:, :, 4:] = 0
+    neg_paths[:, 2] = neg_paths[:, 5]           # the same paths, encoded once
+    neg_paths[:, 7] = 0
+
+    by_encoding = evaluation.evaluate(scorer, questions, pos_paths, neg_paths, _chunk=4)
+    by_rows = evaluation.evaluate(RowsOnly(scorer), questions, pos_paths, neg_paths, _chunk=4)
+    assert list(by_encoding['ranks']) == list(by_rows['ranks'])
+    assert by_encoding['all'] == by_rows['all']
+    assert len(set(by_encoding['ranks'])) > 1
@@ -0,0 +1,165 @@
+import warnings
+
+import numpy as np
+import pytest
+
+import krantikari
+from utils import interning
+from utils import sparql_cache
+from utils import dbpedia_interface as db_interface
+from utils.model_interpreter import top_k
+
+DBO = 'http://dbpedia.org/ontology/'
+ENTITY = 'http://dbpedia.org/resource/Tim_Duncan'
+
+# hop-1 predicate: (its outgoing, incoming hop-2 predicates)
+SUBGRAPH = {'A': (['a1', 'a2', 'a3'], ['a4']), 'B': (['b1', 'b2'], []), 'C': (['c1'], ['c2', 'c3'])}
+# b2 is the best path for the model, but too far from the question for the word embedding shortlist
+SIMILARITY = {'a1': .9, 'a2': .8, 'a3': .7, 'a4': .5, 'b1': .85, 'b2': .1, 'c1': .6, 'c2': .4, 'c3': .3}
+SCORES = {'a1': .5, 'a2': .7, 'a3': .2, 'a4': .4, 'b1': .6, 'b2': 1.0, 'c1': .3, 'c2': .2, 'c3': .1}
+HOP1 = [('+', 'A'), ('+', 'B'), ('-', 'C')]
+
+
+def ids(_names):
+    return interning.get_ids([DBO + x for x in _names])
+
+
+class Arena:
+    """
+        Paths as tuples of segments, and segments as tuples of tokens.
+    """
+
+    def add_segment(self, _tokens):
+        return tuple(_tokens)
+
+    def add_path(self, _segments):
+        return tuple(_segments)
+
+    def pad(self, _maxlen, _paths):
+        return list(_paths)
+
+
+class Model:
+    """
+        Scores a 2-hop path by its hop-2 predicate (SCORES).
+    """
+    max_path_len = None
+
+    def rank(self, _id_q, _id_ps, _return_only_indices=False, _k=0):
+        return top_k(np.asarray([SCORES[path[-1][1]] for path in _id_ps]), _k, _return_only_indices)
+
+
+class Hop2Krantikari(krantikari.Krantikari):
+    """
+        Only what the 2-hop ranking needs: the subgraph, labels and word embedding similarities come from the dicts above.
+    """
+
+    def __init__(self, _early_exit_slack):
+        self.K_2HOP_GLOVE = 2
+        self.K_2HOP_MODEL = 5
+        self.EARLY_EXIT_MARGIN = np.inf
+        self.EARLY_EXIT_SLACK = _early_exit_slack
+        self.model = Model()
+        self.stats = {}
+
+    def get_hop2_subgraph(self, _entity, _predicate, _right=True):
+        return [ids(x) for x in SUBGRAPH[interning.get_uri(_predicate)[len(DBO):]]]
+
+    @staticmethod
+    def filter_predicates(_predicates, _use_blacklist=True, _only_dbo=False):
+        return interning.unique(_predicates)
+
+    def get_labels(self, _predicates):
+        return [interning.get_uri(x)[len(DBO):] for x in _predicates]
+
+    def similar_predicates(self, _predicates, _return_indices=False, _k=5):
+        return np.argsort([-SIMILARITY[x] for x in _predicates], kind='mergesort')[:_k]
+
+
+def rank(_early_exit_slack, _hop1_scores):
+    """
+    :return: (the eager ranking, the lazy ranking, the lazy Krantikari), over the whole of SUBGRAPH
+    """
+    ranker = Hop2Krantikari(_early_exit_slack)
+    hop1 = [(sign, ids([name])[0]) for sign, name in HOP1]
+    segments = dict((x, x) for x in hop1)
+    candidates = [x + (score,) for x, score in zip(hop1, _hop1_scores)]
+
+    eager = ranker.rank_hop2(None, ENTITY, hop1, False, Arena(), segments)
+    lazy = ranker.rank_hop2_lazily(None, ENTITY, candidates, np.asarray(_hop1_scores), False, Arena(), segments)
+    return eager, lazy, ranker
+
+
+def test_calibrated_slack_is_never_below_the_minimum():
+    stats = [{'hop2_gains': [-0.3, -0.2, -0.1]}, {'hop2_gains': [-0.05]}]
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        _, slack = krantikari.calibrate_early_exit(stats)
+    assert slack == krantikari.EARLY_EXIT_MIN_SLACK
+    assert len(caught) == 1
+
+    _, slack = krantikari.calibrate_early_exit([{'hop2_gains': [0.2, 0.3, 0.4]}])
+    assert slack > krantikari.EARLY_EXIT_MIN_SLACK
+
+
+def test_early_exit_ranks_like_eager_when_nothing_is_cut_off():
+    eager, lazy, ranker = rank(1.0, [.5, .45, .4])
+    assert ranker.stats['hop2_expanded'] == 3
+    assert eager[1] == lazy[1] and list(eager[2]) == list(lazy[2])
+    assert eager[0] == lazy[0]
+
+    # b2 scores best, but the word embedding shortlist of the whole subgraph leaves it out
+    best = krantikari.uri_path(eager[1][0])
+    assert best == [ENTITY, '+', DBO + 'B', '+', DBO + 'b1']
+
+
+def test_zero_slack_still_expands_close_predicates():
+    _, lazy, ranker = rank(0.0, [.9, .895, .2])
+    assert ranker.stats['hop2_expanded'] == 2
+    assert ranker.stats['early_exit'] == 'bound'
+    assert set(x[2] for x in lazy[1]) == set(ids(['A', 'B']))
+
+
+class FanOutDBPedia:
+    """
+        An endpoint on which the aggregated 2-hop query fails with _error, and where _predicate has 150 subjects.
+    """
+
+    def __init__(self, _error):
+        self.error = _error
+        self.sampled = []
+
+    def get_hop2_property_ids(self, _resource_uri, _property, _right=True):
+        raise self.error
+
+    def get_entity(self, _resource_uri, _relation, outgoing=True, _skip_failures=False):
+        assert _skip_failures
+        return ['http://dbpedia.org/resource/E%d' % i for i in range(150)] + ['a literal']
+
+    def get_property_ids_of_resources(self, _resource_uris, right=True, _skip_failures=False):
+        assert _skip_failures
+        self.sampled.append(_resource_uris)
+        return ids(['a1'] if right else ['a4'])
+
+
+class FanOutKrantikari(krantikari.Krantikari):
+
+    def __init__(self, _dbp):
+        self.dbp = _dbp
+        self.HOP2_FANOUT = 100
+        self.stats = {}
+
+
+def test_failed_aggregated_queries_fall_back_to_a_sample():
+    timeout = db_interface.QueryFailed(sparql_cache.Failure('timeout', 'timed out', 'http://a', 0, None))
+    ranker = FanOutKrantikari(FanOutDBPedia(timeout))
+    right, left = ranker.get_hop2_subgraph(ENTITY, ids(['A'])[0], True)
+    assert list(right) == list(ids(['a1'])) and list(left) == list(ids(['a4']))
+    assert [len(x) for x in ranker.dbp.sampled] == [100, 100]
+    assert ranker.stats == {'hop2_fallbacks': 1, 'hop2_intermediates': 150, 'hop2_intermediates_pruned': 50}
+
+
+def test_other_errors_are_not_swallowed():
+    ranker = FanOutKrantikari(FanOutDBPedia(KeyError('property')))
+    with pytest.raises(KeyError):
+        ranker.get_hop2_subgraph(ENTITY, ids(['A'])[0], True)
@@ -0,0 +1,42 @@
+from utils.lru_cache import lru_cache
+
+
+def test_memoizes_by_arguments():
+    calls = []
+
+    @lru_cache(maxsize=8)
+    def add(a, b=0):
+        calls.append((a, b))
+        return a + b
+
+    assert [add(1), add(1), add(1, b=2), add(1, b=2), add(1, 2)] == [1, 1, 3, 3, 3]
+    assert calls == [(1, 0), (1, 2), (1, 2)]       # keywords and positionals are different keys
+    assert add.cache_info() == (2, 3, 8, 3)
+    assert add.__wrapped__(4, 5) == 9
+
+    add.cache_clear()
+    assert add.cache_info() == (0, 0, 8, 0)
+    add(1)
+    assert calls[-1] == (1, 0)
+
+
+def test_bounded_and_keeps_recent_entries():
+    calls = []
+
+    @lru_cache(maxsize=4)
+    def identity(x):
+        calls.append(x)
+        return x
+
+    for x in range(100):
+        identity(x)
+        identity(0)                                 # hit every time: never evicted
+        assert identity.cache_info().currsize <= 4
+    assert calls.count(0) == 1
+    assert len(calls) == 100
+
+    identity(98)
+    identity(99)
+    assert len(calls) == 100
+    identity(1)
+    assert len(calls) == 101
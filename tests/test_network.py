@@ -0,0 +1,59 @@
+import numpy as np
+
+import network
+
+
+def sequences(_random, _n, _lengths, _max_length=network.MAX_LENGTH):
+    x = np.zeros((_n, _max_length), dtype=np.int32)
+    for row, length in enumerate(_random.randint(_lengths[0], _lengths[1] + 1, size=_n)):
+        x[row, :length] = _random.randint(1, 100, size=length)
+    return x
+
+
+def test_sequence_lengths_and_trim():
+    x = np.array([[3, 4, 0, 0], [0, 0, 0, 0], [1, 0, 2, 0]])
+    lengths = network.sequence_lengths(x)
+    assert lengths.tolist() == [2, 0, 3]
+    assert network.trim(x, lengths).shape == (3, 3)
+    assert network.trim(x[1:2], lengths[1:2]).shape == (1, 1)
+
+
+def test_bucketed_batches_cover_every_row_once():
+    random = np.random.RandomState(0)
+    lengths = [random.randint(0, 40, 500), random.randint(0, 10, 500)]
+    batches = network.bucketed_batches(lengths, 32)
+    rows = np.concatenate(batches)
+    assert sorted(rows.tolist()) == list(range(500))
+    assert all(len(x) <= 32 for x in batches)
+    for batch in batches:
+        for x in lengths:
+            assert len(set(np.searchsorted(network.BUCKETS, x[batch]))) == 1
+
+
+def test_bucketed_batches_same_count_when_rows_are_shuffled():
+    random = np.random.RandomState(1)
+    lengths = [random.randint(0, 40, 500), random.randint(0, 10, 500)]
+    counts = set()
+    for _ in range(5):
+        order = random.permutation(500)
+        counts.add(len(network.bucketed_batches([x[order] for x in lengths], 32)))
+    assert len(counts) == 1
+
+
+def test_training_generator_length_is_stable_across_epochs():
+    random = np.random.RandomState(2)
+    np.random.seed(2)
+    questions = sequences(random, 60, (6, 20))
+    pos_paths = sequences(random, 60, (3, 8))
+    neg_paths = sequences(random, 60 * network.NEGATIVE_SAMPLES, (1, 30)).reshape(60, network.NEGATIVE_SAMPLES, -1)
+
+    generator = network.TrainingDataGenerator(questions, pos_paths, neg_paths, network.MAX_LENGTH, 10, 16,
+                                              bucketed=True)
+    length = len(generator)
+    for _ in range(5):
+        generator.on_epoch_end()
+        assert len(generator) == length
+        for idx in range(length):
+            x, y = generator[idx]
+            assert x[0].shape[0] == x[1].shape[0] == x[2].shape[0] == len(y)
+            assert (network.sequence_lengths(x[2]) <= x[2].shape[1]).all()
@@ -0,0 +1,53 @@
+import threading
+
+from utils import interning
+from utils import predicate_filter
+
+DBO = 'http://dbpedia.org/ontology/'
+
+
+def test_rules():
+    relation_filter = predicate_filter.PredicateFilter(_blacklist=[DBO + 'abstract'], _stop_words=['label'])
+    predicates = [DBO + 'birthPlace', DBO + 'abstract', 'http://www.w3.org/2000/01/rdf-schema#label',
+                  'http://dbpedia.org/property/birthPlace', DBO + 'birthPlace']
+    assert relation_filter.filter(predicates) == [DBO + 'birthPlace', 'http://dbpedia.org/property/birthPlace',
+                                                  DBO + 'birthPlace']
+    restricted = relation_filter.restrict(predicate_filter.DBO_NAMESPACES)
+    assert restricted.filter(predicates) == [DBO + 'birthPlace', DBO + 'birthPlace']
+
+
+def test_filter_ids_matches_filter():
+    relation_filter = predicate_filter.PredicateFilter(_blacklist=[DBO + 'abstract'],
+                                                       _namespaces=predicate_filter.DBO_NAMESPACES)
+    predicates = [DBO + 'abstract', DBO + 'team', 'http://xmlns.com/foaf/0.1/name', DBO + 'team']
+    ids = interning.get_ids(predicates)
+    assert interning.get_uris(relation_filter.filter_ids(ids)) == relation_filter.filter(predicates)
+    assert len(relation_filter.filter_ids(interning.empty())) == 0
+
+    # IDs interned after the bitmap was grown
+    later = interning.get_ids([DBO + 'testFilterIdsLater%d' % i for i in range(100)])
+    assert relation_filter.filter_ids(later).tolist() == later.tolist()
+
+
+def test_mask_ids_from_many_threads():
+    relation_filter = predicate_filter.PredicateFilter(_stop_words=['odd'])
+    errors, masks = [], {}
+
+    def run(_thread):
+        try:
+            # Every thread interns new URIs (so the bitmap grows while the others look it up)
+            for i in range(50):
+                uris = [DBO + 'thread%d_%d_%d/%s' % (_thread, i, j, 'odd' if j % 2 else 'even') for j in range(20)]
+                masks[(_thread, i)] = relation_filter.mask_ids(interning.get_ids(uris)).tolist()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(x,)) for x in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert all(mask == [j % 2 == 0 for j in range(20)] for mask in masks.values())
+    assert (relation_filter.verdicts[:interning.size()] != predicate_filter.UNKNOWN).sum() >= 8 * 50 * 20
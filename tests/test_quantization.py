@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from utils import model_export
+from utils import quantization
+
+UNITS = 8
+DIMS = 6
+VOCAB = 50
+
+
+@pytest.mark.parametrize('mode,axis', [('float16', 1), ('int8', 1), ('int8', 0)])
+def test_quantized_arrays(mode, axis):
+    values = np.random.RandomState(0).normal(0, 1, (20, 12)).astype(np.float32)
+    quantized = quantization.Quantized(values, mode, axis)
+    assert quantized.dequantize().dtype == np.float32
+    assert np.abs(quantized.dequantize() - values).max() < (1e-2 if mode == 'int8' else 1e-3) * np.abs(values).max()
+    assert np.allclose(quantized[[3, 5]], quantized.dequantize()[[3, 5]])
+    x = np.random.RandomState(1).normal(0, 1, (4, 20)).astype(np.float32)
+    assert np.allclose(quantized.rdot(x), np.dot(x, quantized.dequantize()), atol=1e-4)
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        quantization.Quantized(np.zeros((2, 2)), 'int4', 0)
+
+
+def test_quantized_scorer_scores_like_its_dequantized_weights(numpy_scorer):
+    random = np.random.RandomState(2)
+    base = numpy_scorer(random, VOCAB, DIMS, UNITS)
+    ids = random.randint(1, VOCAB, (5, 10))
+    ids[:, 7:] = 0
+
+    quantized = quantization.quantize(base, _embeddings='int8', _weights='int8')
+    dequantized = model_export.NumpyScorer(dict((k, v.dequantize() if isinstance(v, quantization.Quantized) else v)
+                                                for k, v in quantized.weights.items()), base.config)
+    assert np.allclose(quantized.encode(ids), dequantized.encode(ids), atol=1e-5)
+    assert np.abs(quantized.encode(ids) - base.encode(ids)).max() < 0.05
+    assert quantization.memory(quantized) < quantization.memory(base) / 2
@@ -0,0 +1,80 @@
+import time
+import threading
+
+import pytest
+
+from utils import singleflight
+
+THREADS = 8
+DEADLINE = 5                    # seconds: a regression fails the test instead of hanging it
+
+
+def run_concurrently(_group, _key, _function):
+    """
+        THREADS callers of _group.do(_key, _function), released once they're all waiting on the same call.
+    :return: list of (result or exception) per thread
+    """
+    results = [None] * THREADS
+
+    def call(i):
+        try:
+            results[i] = _group.do(_key, _function)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(THREADS)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join(DEADLINE)
+    assert not any(thread.is_alive() for thread in threads), "callers still running after %d s" % DEADLINE
+    return results
+
+
+def blocking(_group, _result):
+    """
+        A function which returns (or raises) _result once every other thread waits on its call
+            (or fails, if they don't within DEADLINE).
+    """
+    runs = []
+
+    def function():
+        runs.append(1)
+        deadline = time.time() + DEADLINE
+        while True:
+            with _group.lock:
+                if sum(call.waiters for call in _group.calls.values()) == THREADS - 1:
+                    break
+            if time.time() > deadline:
+                raise AssertionError("the other callers weren't coalesced within %d s" % DEADLINE)
+            time.sleep(0.001)
+        if isinstance(_result, Exception):
+            raise _result
+        return _result
+    return function, runs
+
+
+def test_concurrent_calls_run_once():
+    group = singleflight.SingleFlight()
+    function, runs = blocking(group, [1, 2])
+    results = run_concurrently(group, 'query', function)
+    assert len(runs) == 1
+    assert all(x is results[0] for x in results) and results[0] == [1, 2]
+    assert group.stats == {'calls': THREADS, 'executed': 1, 'coalesced': THREADS - 1}
+    assert group.in_flight() == 0
+
+
+def test_errors_reach_every_caller():
+    group = singleflight.SingleFlight()
+    error = ValueError('timed out')
+    function, runs = blocking(group, error)
+    results = run_concurrently(group, 'query', function)
+    assert len(runs) == 1
+    assert all(x is error for x in results)
+
+    # Nothing is remembered once the call is done
+    assert group.do('query', lambda: 'again') == 'again'
+    with pytest.raises(KeyError):
+        group.do('other', {}.__getitem__, 'missing')
+    assert group.stats['executed'] == 3 and group.in_flight() == 0
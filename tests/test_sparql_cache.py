@@ -0,0 +1,76 @@
+import json
+
+from utils import sparql_cache
+
+
+def uri(_value):
+    return {u'type': u'uri', u'value': _value}
+
+
+RESPONSE = {u'head': {u'vars': [u'property', u'label', u'count']}, u'results': {u'bindings': [
+    {u'property': uri(u'http://dbpedia.org/ontology/birthPlace'),
+     u'label': {u'type': u'literal', u'value': u'birth place', u'xml:lang': u'en'},
+     u'count': {u'type': u'typed-literal', u'value': u'12',
+                u'datatype': u'http://www.w3.org/2001/XMLSchema#integer'}},
+    {u'property': uri(u'http://dbpedia.org/ontology/birthPlace'),
+     u'label': {u'type': u'literal', u'value': u'lieu de naissance \xe9', u'xml:lang': u'fr'}},
+    {u'property': {u'type': u'bnode', u'value': u'b0'},
+     u'label': {u'type': u'literal', u'value': u'plain'}},
+]}}
+
+
+def test_binary_round_trip():
+    value = sparql_cache.encode(RESPONSE)
+    assert value.startswith(sparql_cache.BINARY_MAGIC)
+    assert sparql_cache.decode(value) == RESPONSE
+    assert sparql_cache.decode_as_columns(value) == sparql_cache.columns_of(RESPONSE) == {
+        u'property': [u'http://dbpedia.org/ontology/birthPlace'] * 2 + [u'b0'],
+        u'label': [u'birth place', u'lieu de naissance \xe9', u'plain'],
+        u'count': [u'12', None, None]}
+
+
+def test_json_round_trip():
+    # Not representable in binary: a separator in a string, and a term with both a language and a datatype
+    odd = {u'head': {u'vars': [u'x']}, u'results': {u'bindings': [{u'x': uri(u'a\x00b')}]}}
+    both = {u'head': {u'vars': [u'x']}, u'results': {u'bindings': [
+        {u'x': {u'type': u'literal', u'value': u'v', u'xml:lang': u'en', u'datatype': u'd'}}]}}
+    for value in [odd, both, {u'boolean': True}, [u'a', 1, None], {u'a': [1.5, {u'b': u'\xe9'}]}]:
+        encoded = sparql_cache.encode(value)
+        assert encoded.startswith(sparql_cache.MAGIC)
+        assert sparql_cache.decode(encoded) == value
+        assert sparql_cache.decode(sparql_cache.encode(value, _compress=False)) == value
+
+
+def test_plain_json_is_still_read():
+    assert sparql_cache.decode(json.dumps(RESPONSE)) == RESPONSE
+    assert sparql_cache.decode_as_columns(json.dumps(RESPONSE)) == sparql_cache.columns_of(RESPONSE)
+    assert sparql_cache.decode(None) is None and sparql_cache.decode_as_columns(None) is None
+
+
+def test_negative_round_trip(redis):
+    cache = sparql_cache.SparqlCache(redis)
+    cache.set_failure('q1', 'timeout', 'timed out', 'http://endpoint')
+    failure = cache.get('q1')
+    assert isinstance(failure, sparql_cache.Failure)
+    assert (failure.reason, failure.detail, failure.endpoint, failure.response) == \
+        ('timeout', 'timed out', 'http://endpoint', None)
+    assert redis.values['q1'].startswith(sparql_cache.NEGATIVE_MAGIC)
+    assert redis.ttls['q1'] == sparql_cache.FAILURE_TTL
+    assert cache.get_columns('q1') == failure
+
+    empty = {u'head': {u'vars': [u'x']}, u'results': {u'bindings': []}}
+    cache.set('q2', empty)
+    assert redis.ttls['q2'] == sparql_cache.EMPTY_TTL
+    assert cache.get('q2').reason == 'empty' and cache.get('q2').response == empty
+    assert cache.get_columns('q2').response == {u'x': []}
+
+
+def test_batches(redis):
+    cache = sparql_cache.SparqlCache(redis)
+    items = [('q%d' % i, RESPONSE if i % 2 else {u'boolean': bool(i % 3)}) for i in range(sparql_cache.BATCH_SIZE + 3)]
+    cache.set_many(items)
+    keys = [key for key, _ in items] + ['missing']
+    assert cache.get_many(keys) == [value for _, value in items] + [None]
+    assert cache.get_many_columns(['q1', 'missing']) == [sparql_cache.columns_of(RESPONSE), None]
+    assert all(redis.ttls[key] is None for key, _ in items)
+
@@ -0,0 +1,125 @@
+"""
+    Micro-batching of model scoring, for when several questions are answered at once (eg. server.py).
+
+    Every question ranks a handful of paths (5-40) at a time, which is a poor use of a forward pass.
+        The scheduler collects the scoring requests of concurrent callers in a queue, and a worker thread runs them
+        in micro-batches: one forward pass (ModelInterpreter.score) for as many rows as fit in MAX_BATCH_SIZE,
+        waiting at most MAX_WAIT seconds (after the oldest request came in) for more to arrive.
+        The similarities are then handed back to every caller.
+
+    It has the same rank() as ModelInterpreter (and its max_path_len, max_ques_len), so it can be used in its place:
+        scheduler = RankScheduler(model_interpreter.ModelInterpreter(_gpu='0'))
+        Krantikari(..., _model_interpreter=scheduler)
+"""
+import time
+import threading
+import collections
+import numpy as np
+
+# Our scripts
+import model_interpreter
+
+# Some MACROS
+MAX_BATCH_SIZE = 256            # rows (paths) per forward pass. A bigger request still goes, alone.
+MAX_WAIT = 0.005                # seconds
+
+
+class _Request:
+    def __init__(self, _padded_ques, _padded_paths):
+        self.ques = _padded_ques
+        self.paths = _padded_paths
+        self.arrived = time.time()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RankScheduler:
+
+    def __init__(self, _model, _max_batch_size=MAX_BATCH_SIZE, _max_wait=MAX_WAIT):
+        """
+        :param _model: model_interpreter.ModelInterpreter (or anything with pad_inputs and score)
+        :param _max_batch_size: int: rows per forward pass
+        :param _max_wait: float: seconds to wait for a batch to fill up
+        """
+        self.model = _model
+        self.max_path_len = _model.max_path_len
+        self.max_ques_len = _model.max_ques_len
+        self.max_batch_size = _max_batch_size
+        self.max_wait = _max_wait
+
+        self.queue = collections.deque()
+        self.queued_rows = 0
+        self.condition = threading.Condition()
+        self.stats = {'requests': 0, 'batches': 0, 'rows': 0, 'waited': 0.0}
+
+        self.worker = threading.Thread(target=self._work)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def score(self, _padded_ques, _padded_paths):
+        """
+            Same as ModelInterpreter.score, but batched along with whatever else is being scored.
+        """
+        if len(_padded_paths) == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        request = _Request(_padded_ques, _padded_paths)
+        with self.condition:
+            self.queue.append(request)
+            self.queued_rows += len(_padded_paths)
+            self.condition.notify()
+
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def rank(self, _id_q, _id_ps, _return_only_indices=False, _k=0):
+        """
+            Same as ModelInterpreter.rank
+        """
+        padded_ques, padded_paths = self.model.pad_inputs(_id_q, _id_ps)
+        return model_interpreter.top_k(self.score(padded_ques, padded_paths), _k, _return_only_indices)
+
+    def _next_batch(self):
+        """
+            Wait for requests, and for the batch to fill (or for the oldest request to have waited long enough).
+        """
+        with self.condition:
+            while not self.queue:
+                self.condition.wait()
+
+            deadline = self.queue[0].arrived + self.max_wait
+            while self.queued_rows < self.max_batch_size and time.time() < deadline:
+                self.condition.wait(deadline - time.time())
+
+            batch, rows = [], 0
+            while self.queue and (not batch or rows + len(self.queue[0].paths) <= self.max_batch_size):
+                request = self.queue.popleft()
+                batch.append(request)
+                rows += len(request.paths)
+            self.queued_rows -= rows
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._next_batch()
+            start = time.time()
+            try:
+                similarities = self.model.score(np.concatenate([x.ques for x in batch]),
+                                                np.concatenate([x.paths for x in batch]))
+                offset = 0
+                for request in batch:
+                    request.result = similarities[offset:offset + len(request.paths)]
+                    offset += len(request.paths)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['rows'] += sum(len(x.paths) for x in batch)
+            self.stats['waited'] += sum(start - x.arrived for x in batch)
+            for request in batch:
+                request.done.set()
@@ -0,0 +1,93 @@
+"""
+    A circuit breaker for a (SPARQL) endpoint.
+
+    After FAILURE_THRESHOLD consecutive failures of the endpoint (it can't be reached, server errors), the circuit
+        opens: calls are refused right away, instead of each one waiting for the timeout. After RESET_TIMEOUT seconds,
+        one call is let through (half open): if it succeeds, the circuit closes again, else it stays open for another
+        RESET_TIMEOUT. Calls which fail because of what they asked (eg. a query which times out) say nothing about the
+        endpoint: record_ignored.
+
+    Usage:
+        breaker = CircuitBreaker()
+        if breaker.allow():
+            try:
+                result = call()
+                breaker.record_success()
+            except EndpointDown:
+                breaker.record_failure()
+                raise
+            except:
+                breaker.record_ignored()
+                raise
+"""
+import time
+import threading
+
+# Some MACROS
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0            # seconds
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+
+class CircuitBreaker:
+
+    def __init__(self, _failure_threshold=FAILURE_THRESHOLD, _reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = _failure_threshold
+        self.reset_timeout = _reset_timeout
+
+        self.state = CLOSED
+        self.failures = 0               # consecutive
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+        # Counters, for reports.
+        self.stats = {'success': 0, 'failure': 0, 'ignored': 0, 'refused': 0, 'opened': 0}
+
+    def allow(self):
+        """
+            Whether a call may go through now. In half open state, only the first caller gets a yes.
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                return True
+            self.stats['refused'] += 1
+            return False
+
+    def ready(self):
+        """
+            Whether allow() would say yes, without changing anything (eg. to shortlist endpoints).
+        """
+        with self.lock:
+            return self.state == CLOSED or (self.state == OPEN and time.time() - self.opened_at >= self.reset_timeout)
+
+    def record_success(self):
+        with self.lock:
+            self.stats['success'] += 1
+            self.failures = 0
+            self.state = CLOSED
+
+    def record_failure(self):
+        with self.lock:
+            self.stats['failure'] += 1
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.stats['opened'] += 1
+                self.state = OPEN
+                self.opened_at = time.time()
+
+    def record_ignored(self):
+        """
+            A call which failed, but not because of the endpoint. Changes nothing, except that in half open state,
+                the next caller gets to probe the endpoint instead.
+        """
+        with self.lock:
+            self.stats['ignored'] += 1
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+
+    def __repr__(self):
+        return "CircuitBreaker(%s, %d consecutive failures, %s)" % (self.state, self.failures, self.stats)
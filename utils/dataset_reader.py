@@ -0,0 +1,223 @@
+"""
+    Lazy readers of the datasets (LC-QuAD, QALD, and larger ones shaped like them): one question at a time.
+
+    The datasets are a JSON array of questions (LC-QuAD), or an object with one under a key (QALD: 'questions').
+        json.load keeps all of it in memory (and the pipelines, everything they make of it). Here, the file is read in
+        chunks of CHUNK_SIZE, and the questions parsed one after the other: with ijson (>= 3.1) if it's installed, else
+        with json's raw_decode. Only the question being parsed is kept, the rest of the file isn't.
+
+    JSON lines files (.jsonl: a question per line) are read line by line, and the lines of other shards aren't even
+        parsed. to_jsonl converts a dataset, once, for the runs over very large ones.
+
+    Sharding: the questions from _start to _stop (by index in the dataset), and of those, with _shard=(i, n), only
+        the ones whose index is i modulo n (so that n processes split a dataset).
+
+    Usage:
+        for node in dataset_reader.questions('resources/data_set.json', _start=1000, _stop=2000):
+        for index, node in dataset_reader.read('resources/qald-7-train-multilingual.json', _key='questions'):
+        dataset_reader.to_jsonl('resources/data_set.json')                     # writes resources/data_set.jsonl
+"""
+import io
+import json
+from itertools import islice
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Some MACROS
+CHUNK_SIZE = 64 * 1024          # characters read at a time
+JSONL_EXTENSION = '.jsonl'
+WHITESPACE = ' \t\n\r'
+USE_IJSON = True                # if installed
+
+_decoder = json.JSONDecoder()
+
+
+class _Buffer:
+    """
+        The part of a file not parsed yet (or at least, what has been read of it).
+    """
+
+    def __init__(self, _file, _chunk_size=CHUNK_SIZE):
+        self.file = _file
+        self.chunk_size = _chunk_size
+        self.text = u''
+        self.position = 0
+        self.eof = False
+
+    def fill(self):
+        """
+            Read more of the file (at least as much as there is left to parse, so that long values take few reads).
+        :return: False at the end of the file
+        """
+        if self.eof:
+            return False
+        chunk = self.file.read(max(self.chunk_size, len(self.text) - self.position))
+        if not chunk:
+            self.eof = True
+            return False
+        self.text = self.text[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """
+        :return: the next character which isn't whitespace (not consumed), or '' at the end of the file
+        """
+        while True:
+            while self.position < len(self.text) and self.text[self.position] in WHITESPACE:
+                self.position += 1
+            if self.position < len(self.text):
+                return self.text[self.position]
+            if not self.fill():
+                return ''
+
+    def expect(self, _characters):
+        """
+            Consume the next character (which isn't whitespace), one of _characters.
+        """
+        character = self.peek()
+        if not character or character not in _characters:
+            raise ValueError("Expected one of %r at character %d of the chunk, found %r" %
+                             (_characters, self.position, character))
+        self.position += 1
+        return character
+
+    def decode(self):
+        """
+        :return: the next JSON value (consumed)
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.position)
+                # A number at the end of what has been read may go on in the next chunk
+                if end < len(self.text) or self.eof:
+                    self.position = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def _array(_buffer):
+    """
+        Yield the values of the array which starts at the buffer.
+    """
+    _buffer.expect('[')
+    if _buffer.peek() == ']':
+        _buffer.position += 1
+        return
+    while True:
+        yield _buffer.decode()
+        if _buffer.expect(',]') == ']':
+            return
+
+
+def _find_key(_buffer, _key):
+    """
+        Consume the object which starts at the buffer, up to the value of _key.
+    """
+    _buffer.expect('{')
+    while _buffer.peek() == '"':
+        key = _buffer.decode()
+        _buffer.expect(':')
+        if key == _key:
+            return
+        _buffer.decode()
+        if _buffer.expect(',}') == '}':
+            break
+    raise KeyError(_key)
+
+
+def _parse(_path, _key=None, _chunk_size=CHUNK_SIZE):
+    """
+        Yield the questions of a JSON dataset: the array at the top, or under _key.
+    """
+    if USE_IJSON and ijson is not None:
+        with open(_path, 'rb') as f:
+            for node in ijson.items(f, (_key + '.item') if _key else 'item', use_float=True):
+                yield node
+        return
+
+    with io.open(_path, 'r', encoding='utf-8') as f:
+        buffer = _Buffer(f, _chunk_size)
+        if _key is not None:
+            _find_key(buffer, _key)
+        for node in _array(buffer):
+            yield node
+
+
+def _parse_lines(_path, _shard=None):
+    """
+        Yield (index, question) of a JSON lines dataset (the lines of other shards aren't parsed).
+    """
+    with io.open(_path, 'r', encoding='utf-8') as f:
+        index = 0
+        for line in f:
+            if not line.strip():
+                continue
+            if _shard is None or index % _shard[1] == _shard[0]:
+                yield index, json.loads(line)
+            else:
+                yield index, None
+            index += 1
+
+
+def read(_path, _key=None, _start=0, _stop=None, _shard=None):
+    """
+        Yield the questions of a dataset, lazily.
+
+    :param _path: str: a JSON file (an array of questions, or an object with one under _key), or a JSON lines file
+    :param _key: str: where the questions are in a JSON object (eg. 'questions' for QALD), or None for an array
+    :param _start: int: index of the first question
+    :param _stop: int: index after the last question (None: till the end)
+    :param _shard: (int i, int n): only the questions whose index is i modulo n (or None, for all of them)
+    :return: generator of (int index, dict question)
+    """
+    if _shard is not None and not 0 <= _shard[0] < _shard[1]:
+        raise ValueError("Shard %d of %d: expected 0 <= shard < shards" % tuple(_shard))
+
+    if _path.endswith(JSONL_EXTENSION):
+        nodes = _parse_lines(_path, _shard)
+    else:
+        nodes = enumerate(_parse(_path, _key))
+
+    for index, node in islice(nodes, _start, _stop):
+        if _shard is None or index % _shard[1] == _shard[0]:
+            yield index, node
+
+
+def questions(_path, _key=None, _start=0, _stop=None, _shard=None):
+    """
+        Same as read, without the indices.
+    :return: generator of dict
+    """
+    for _, node in read(_path, _key, _start, _stop, _shard):
+        yield node
+
+
+def count(_path, _key=None):
+    """
+    :return: int: number of questions in the dataset (in one pass over it, keeping none)
+    """
+    if _path.endswith(JSONL_EXTENSION):
+        with io.open(_path, 'r', encoding='utf-8') as f:
+            return sum(1 for line in f if line.strip())
+    return sum(1 for _ in _parse(_path, _key))
+
+
+def to_jsonl(_path, _jsonl_path=None, _key=None):
+    """
+        Write the questions of a JSON dataset in a JSON lines file (by default, next to it).
+    :return: str: path of the JSON lines file
+    """
+    if _jsonl_path is None:
+        _jsonl_path = _path.rsplit('.', 1)[0] + JSONL_EXTENSION
+    with io.open(_jsonl_path, 'w', encoding='utf-8') as f:
+        for node in questions(_path, _key):
+            f.write(u'%s\n' % json.dumps(node))
+    return _jsonl_path
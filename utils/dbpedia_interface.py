@@ -14,18 +14,28 @@
 	A: I just discovered PEP8, go easy on me senpai.
 """
 from SPARQLWrapper import SPARQLWrapper, JSON
+from SPARQLWrapper.SPARQLExceptions import EndPointInternalError, EndPointNotFound
 from operator import itemgetter
 from pprint import pprint
 import numpy as np
 import traceback
 import warnings
+import urllib2
+import threading
+import socket
+import httplib
 import pickle
 import redis
-import json
+import time
 
 # Our scripts
 import natural_language_utilities as nlutils
+import interning
+import sparql_cache
+import endpoint_pool
+import singleflight
 import labels_mulitple_form
+import neighbourhood_index
 
 # GLOBAL MACROS
 # DBPEDIA_ENDPOINTS = ['http://dbpedia.org/sparql/', 'http://live.dbpedia.org/sparql/']
@@ -33,12 +43,32 @@ import labels_mulitple_form
 DBPEDIA_ENDPOINTS = ['http://sda-srv01.iai.uni-bonn.de:8890/sparql/']
 REDIS_HOSTNAME = 'sda-srv01.iai.uni-bonn.de'
 MAX_WAIT_TIME = 1.0
+VALUES_BATCH_SIZE = 100         # Max number of resources put in the VALUES clause of one query
+HOP2_CACHE_KEY = 'hop2:%s'                  # Cached 2-hop neighbourhoods (json list of predicates)
+HOP2_COUNTS_CACHE_KEY = 'hop2-counts:%s'    # Same, along with the number of intermediate entities (json dict)
 
 # SPARQL Templates
 GET_RIGHT_PROPERTIES_OF_RESOURCE = '''SELECT DISTINCT ?property WHERE { %(target_resource)s ?property ?useless_resource }'''
 
 GET_LEFT_PROPERTIES_OF_RESOURCE = '''SELECT DISTINCT ?property WHERE { ?useless_resource ?property %(target_resource)s }'''
 
+GET_RIGHT_PROPERTIES_OF_RESOURCES = '''SELECT DISTINCT ?property WHERE { VALUES ?resource { %(target_resources)s } ?resource ?property ?useless_resource }'''
+
+GET_LEFT_PROPERTIES_OF_RESOURCES = '''SELECT DISTINCT ?property WHERE { VALUES ?resource { %(target_resources)s } ?useless_resource ?property ?resource }'''
+
+# 2-hop neighbourhoods: the predicates of every entity reached from the target resource via the property.
+#   Compose with HOP2_PATTERNS, eg. GET_HOP2_PROPERTIES % {'hop2': HOP2_PATTERNS[(True, False)] % {...}}
+GET_HOP2_PROPERTIES = '''SELECT DISTINCT ?property WHERE { %(hop2)s FILTER(STRSTARTS(STR(?intermediate), "http://dbpedia.org/resource")) }'''
+
+GET_HOP2_PROPERTIES_WITH_COUNTS = '''SELECT ?property (COUNT(DISTINCT ?intermediate) AS ?count) WHERE { %(hop2)s FILTER(STRSTARTS(STR(?intermediate), "http://dbpedia.org/resource")) } GROUP BY ?property'''
+
+HOP2_PATTERNS = {   # (hop-1 outgoing, hop-2 outgoing)
+    (True, True): '''%(target_resource)s %(property)s ?intermediate . ?intermediate ?property ?useless_resource .''',
+    (True, False): '''%(target_resource)s %(property)s ?intermediate . ?useless_resource ?property ?intermediate .''',
+    (False, True): '''?intermediate %(property)s %(target_resource)s . ?intermediate ?property ?useless_resource .''',
+    (False, False): '''?intermediate %(property)s %(target_resource)s . ?useless_resource ?property ?intermediate .'''
+}
+
 GET_PROPERTIES_ON_RESOURCE = '''SELECT DISTINCT ?property WHERE { ?useless_resource  ?property %(target_resource)s }'''
 
 GET_RIGHT_PROPERTIES_OF_RESOURCE_WITH_OBJECTS = '''SELECT DISTINCT ?property ?resource WHERE { %(target_resource)s ?property ?resource	}'''
@@ -64,22 +94,68 @@ GET_OBJECT = '''SELECT DISTINCT ?entity WHERE {	%(target_resource)s %(property)s
 GET_SAME_AS = '''SELECT DISTINCT ?entity WHERE {?entity owl:sameAs %(target_resource)s}'''
 
 
+class QueryFailed(Exception):
+    """
+        Raised when a query times out, errors out, failed recently (negative cache), or no endpoint is available.
+            self.failure is a sparql_cache.Failure saying why.
+    """
+
+    def __init__(self, _failure):
+        Exception.__init__(self, "%s: %s (%s)" % (_failure.reason, _failure.detail, _failure.endpoint))
+        self.failure = _failure
+
+
+def failure_reason(_exception):
+    """
+        'timeout' or 'error'
+    """
+    if isinstance(_exception, socket.timeout):
+        return 'timeout'
+    if isinstance(_exception, urllib2.URLError) and isinstance(getattr(_exception, 'reason', None), socket.timeout):
+        return 'timeout'
+    return 'timeout' if 'timed out' in str(_exception) else 'error'
+
+
+def is_endpoint_failure(_exception):
+    """
+        Whether the endpoint is to blame: it can't be reached (connection errors) or answers with a server error (5xx).
+            Query timeouts (see _shoot) and bad queries are the query's own: they're left to the negative cache,
+            and don't count against the endpoint's health (else a few heavy queries would open its circuit breaker).
+    """
+    if failure_reason(_exception) == 'timeout':
+        return False
+    if isinstance(_exception, (EndPointInternalError, EndPointNotFound)):
+        return True
+    if isinstance(_exception, urllib2.HTTPError):
+        return _exception.code >= 500
+    return isinstance(_exception, (urllib2.URLError, socket.error, httplib.HTTPException))
+
+
 class DBPedia:
-    def __init__(self, _method='round-robin', _verbose=False, _db_name=0, caching=True):
+    def __init__(self, _method='health', _verbose=False, _db_name=0, caching=True, _use_neighbourhood_index=True,
+                 _endpoints=None):
 
         # Explanation: selection_method is used to select from the DBPEDIA_ENDPOINTS, hoping that we're not blocked too soon
-        if _method in ['round-robin', 'random', 'select-one']:
+        #   'health' routes by latency and error rate (see endpoint_pool.py)
+        if _method in endpoint_pool.METHODS:
             self.selection_method = _method
         else:
             warnings.warn("Selection method not understood, proceeding with 'select-one'")
             self.selection_method = 'select-one'
 
         self.verbose = _verbose
-        self.sparql_endpoint = DBPEDIA_ENDPOINTS[0]
+        self.pool = endpoint_pool.EndpointPool(_endpoints or DBPEDIA_ENDPOINTS, _method=self.selection_method,
+                                               _is_endpoint_failure=is_endpoint_failure)
+        self.sparql_endpoint = self.pool.endpoints[0].url
+
+        # Identical queries in flight at the same time (other threads) are shot once. See self.inflight.stats
+        self.inflight = singleflight.SingleFlight()
         if caching:
             self.r = redis.StrictRedis(host=REDIS_HOSTNAME, port=6379, db=_db_name)
+            self.cache = sparql_cache.SparqlCache(self.r)
         else:
             self.r = False
+            self.cache = None
         try:
             self.labels = pickle.load(open('resources/labels.pickle'))
         except:
@@ -88,6 +164,16 @@ class DBPedia:
             labels_mulitple_form.merge_multiple_forms()  # This should populate the dictionary with multiple form info and already pickle it
             self.labels = pickle.load(open('resources/labels.pickle'))
         self.fresh_labels = 0
+        self.labels_lock = threading.Lock()
+
+        # Pre-materialized neighbourhoods of popular entities (see neighbourhood_index.py). Endpoint is the fallback.
+        self.neighbourhood = None
+        if _use_neighbourhood_index:
+            try:
+                self.neighbourhood = neighbourhood_index.NeighbourhoodIndex.load()
+            except IOError:
+                if self.verbose:
+                    print("Neighbourhood index not found. All neighbourhoods will be fetched from the endpoint.")
 
     # initilizing the redis server.
 
@@ -95,37 +181,115 @@ class DBPedia:
         """
 			This function is to be called whenever we're making a call to DBPedia. Based on the selection mechanism selected at __init__,
 			this function tells which endpoint to use at every point.
+			NOTE: query_endpoint doesn't need it (the pool picks, and keeps track of in-flight requests).
 		"""
-        if self.selection_method == 'round-robin':
-            index = DBPEDIA_ENDPOINTS.index(self.sparql_endpoint)
-            return DBPEDIA_ENDPOINTS[index + 1] if index >= len(DBPEDIA_ENDPOINTS) else DBPEDIA_ENDPOINTS[0]
-        if self.selection_method == 'select-one':
-            return self.sparql_endpoint
+        endpoint = self.pool.select()
+        return endpoint.url if endpoint is not None else self.sparql_endpoint
 
-    def shoot_custom_query(self, _custom_query):
+    def shoot_custom_query(self, _custom_query, _columns=False):
         """
 			Shoot any custom query and get the SPARQL results as a dictionary.
+			Raises QueryFailed if the query fails, or failed recently (the failure is cached for sparql_cache.FAILURE_TTL).
+
+		:param _columns: bool: return the results as {variable: [value, value, ...]} instead (see sparql_cache.decode_columns).
+			Cheaper to decode from the cache, and it's what most of the methods below want anyway.
 		"""
-        if self.r:
-            caching_answer = self.r.get(_custom_query)
+        if self.cache:
+            caching_answer = self.cache.get_columns(_custom_query) if _columns else self.cache.get(_custom_query)
             if caching_answer:
                 # print "@caching layer"
-                return json.loads(caching_answer)
+                return self._answer_of(caching_answer)
             else:
-                sparql = SPARQLWrapper(self.select_sparql_endpoint())
-                sparql.setQuery(_custom_query)
-                sparql.setReturnFormat(JSON)
-                sparql.setTimeout(0.1)
-                caching_answer = sparql.query().convert()
-                self.r.set(_custom_query, json.dumps(caching_answer))
-                return caching_answer
+                caching_answer = self.inflight.do(_custom_query, self._query_and_cache, _custom_query)
+                return sparql_cache.columns_of(caching_answer) if _columns else caching_answer
         else:
-            sparql = SPARQLWrapper(self.select_sparql_endpoint())
-            sparql.setQuery(_custom_query)
-            sparql.setReturnFormat(JSON)
-            sparql.setTimeout(0.1)
-            caching_answer = sparql.query().convert()
-            return caching_answer
+            response = self.inflight.do(_custom_query, self.query_endpoint, _custom_query)
+            return sparql_cache.columns_of(response) if _columns else response
+
+    def shoot_custom_queries(self, _custom_queries, _columns=False, _skip_failures=False):
+        """
+			Same as shoot_custom_query, for a bunch of queries.
+			The cache is hit once for all of them (MGET), and whatever had to be fetched is stored in one go (pipeline).
+
+		:param _custom_queries: list of str
+		:param _columns: bool: see shoot_custom_query
+		:param _skip_failures: bool: put None in place of the queries which failed, instead of raising QueryFailed
+		:return: list of dict (the SPARQL results), in the same order
+		"""
+        answers = self.cache.get_many_columns(_custom_queries) if _columns and self.cache \
+            else self.cache.get_many(_custom_queries) if self.cache else [None] * len(_custom_queries)
+        fresh, failed = {}, None
+        for i, query in enumerate(_custom_queries):
+            try:
+                if answers[i]:
+                    # Negative entries are served as they are: rewriting them would keep them from ever expiring
+                    answers[i] = self._answer_of(answers[i])
+                    continue
+                if query not in fresh:
+                    try:
+                        fresh[query] = self.inflight.do(query, self.query_endpoint, query)
+                    except QueryFailed as e:
+                        self._remember_failure(query, e.failure)
+                        raise
+                answers[i] = sparql_cache.columns_of(fresh[query]) if _columns else fresh[query]
+            except QueryFailed as e:
+                answers[i] = None
+                failed = failed or e
+
+        if fresh and self.cache:
+            self.cache.set_many(fresh)
+        if failed and not _skip_failures:
+            raise failed
+        return answers
+
+    def _answer_of(self, _cached):
+        """
+            What the cache had -> what to return. Negative entries: the (empty) results, or QueryFailed.
+        """
+        if isinstance(_cached, sparql_cache.Failure):
+            if _cached.response is not None:
+                return _cached.response
+            raise QueryFailed(_cached)
+        return _cached
+
+    def _query_and_cache(self, _custom_query):
+        try:
+            response = self.query_endpoint(_custom_query)
+        except QueryFailed as e:
+            self._remember_failure(_custom_query, e.failure)
+            raise
+        self.cache.set(_custom_query, response)
+        return response
+
+    def _remember_failure(self, _custom_query, _failure):
+        """
+            Negative caching. Not when no endpoint was available: that says nothing about the query itself.
+        """
+        if self.cache and _failure.reason in ['timeout', 'error']:
+            self.cache.set_failure(_custom_query, _failure.reason, _failure.detail, _failure.endpoint)
+
+    def query_endpoint(self, _custom_query):
+        """
+			Shoot the query to an endpoint of the pool (no caching). The pool retries on another endpoint,
+			hedges slow requests and skips endpoints whose circuit breaker is open (see endpoint_pool.py).
+			Raises QueryFailed on timeouts and errors (and when no endpoint is available).
+		"""
+        try:
+            return self.pool.execute(lambda endpoint: self._shoot(endpoint, _custom_query))
+        except endpoint_pool.EndpointError as e:
+            if e.error is None:
+                raise QueryFailed(sparql_cache.Failure('circuit-open', 'no endpoint available', e.endpoint, time.time(),
+                                                       None))
+            if self.verbose:
+                warnings.warn("Query failed on %s (%s): %s" % (e.endpoint, e.error, _custom_query))
+            raise QueryFailed(sparql_cache.Failure(failure_reason(e.error), str(e.error), e.endpoint, time.time(), None))
+
+    def _shoot(self, _endpoint, _custom_query):
+        sparql = SPARQLWrapper(_endpoint)
+        sparql.setQuery(_custom_query)
+        sparql.setReturnFormat(JSON)
+        sparql.setTimeout(0.1)
+        return sparql.query().convert()
 
     def get_properties_on_resource(self, _resource_uri):
         """
@@ -155,6 +319,12 @@ class DBPedia:
                 "The passed resource %s is not a proper URI but is in shorthand. This is strongly discouraged." % _resource_uri)
             _resource_uri = nlutils.convert_shorthand_to_uri(_resource_uri)
 
+        # Look it up in the neighbourhood index first.
+        if not _with_connected_resource and self.neighbourhood is not None:
+            property_list = self.neighbourhood.get_properties(_resource_uri, _right=right)
+            if property_list is not None:
+                return property_list
+
         # Prepare the SPARQL Request		sparql = SPARQLWrapper(self.select_sparql_endpoint())
         # with SPARQLWrapper(self.sparql_endpoint) as sparql:
         _resource_uri = '<' + _resource_uri + '>'
@@ -168,16 +338,14 @@ class DBPedia:
                 temp_query = GET_RIGHT_PROPERTIES_OF_RESOURCE % {'target_resource': _resource_uri}
             else:
                 temp_query = GET_LEFT_PROPERTIES_OF_RESOURCE % {'target_resource': _resource_uri}
-        response = self.shoot_custom_query(temp_query)
+        response = self.shoot_custom_query(temp_query, _columns=True)
 
         try:
             if _with_connected_resource:
-                property_list = [[x[u'property'][u'value'].encode('ascii', 'ignore'),
-                                  x[u'resource'][u'value'].encode('ascii', 'ignore')] for x in
-                                 response[u'results'][u'bindings']]
+                property_list = [[x.encode('ascii', 'ignore'), y.encode('ascii', 'ignore')] for x, y in
+                                 zip(response[u'property'], response[u'resource'])]
             else:
-                property_list = [x[u'property'][u'value'].encode('ascii', 'ignore') for x in
-                                 response[u'results'][u'bindings']]
+                property_list = [x.encode('ascii', 'ignore') for x in response[u'property']]
         except:
             # TODO: Find and handle exceptions appropriately
             traceback.print_exc()
@@ -185,6 +353,102 @@ class DBPedia:
 
         return property_list
 
+    def get_property_ids(self, _resource_uri, right=True):
+        """
+            Same as get_properties_of_resource (without connected resources), but returns the unique interned IDs
+                of the properties (sorted np array of int32) instead of a list of strings.
+        """
+        if not nlutils.has_url(_resource_uri):
+            warnings.warn(
+                "The passed resource %s is not a proper URI but is in shorthand. This is strongly discouraged." % _resource_uri)
+            _resource_uri = nlutils.convert_shorthand_to_uri(_resource_uri)
+
+        # Look it up in the neighbourhood index first.
+        if self.neighbourhood is not None:
+            property_ids = self.neighbourhood.get_property_ids(_resource_uri, _right=right)
+            if property_ids is not None:
+                return property_ids
+
+        template = GET_RIGHT_PROPERTIES_OF_RESOURCE if right else GET_LEFT_PROPERTIES_OF_RESOURCE
+        response = self.shoot_custom_query(template % {'target_resource': '<' + _resource_uri + '>'}, _columns=True)
+
+        # The table takes care of turning them into str, once per URI (and not once per response).
+        return interning.unique(interning.get_ids(response[u'property']))
+
+    def get_property_ids_of_resources(self, _resource_uris, right=True, _skip_failures=False):
+        """
+            The distinct properties going out of (right=True) or coming in to any of the given resources.
+                The aggregation happens on the endpoint: one query per VALUES_BATCH_SIZE resources, instead of one each.
+
+        :param _resource_uris: list of str (full URIs)
+        :param _skip_failures: bool: leave out the batches whose query failed, instead of raising QueryFailed
+        :return: sorted np array of unique interned IDs (int32)
+        """
+        template = GET_RIGHT_PROPERTIES_OF_RESOURCES if right else GET_LEFT_PROPERTIES_OF_RESOURCES
+        property_ids = [interning.empty()]
+
+        queries = [template % {'target_resources': ' '.join('<' + x + '>' for x in _resource_uris[i:i + VALUES_BATCH_SIZE])}
+                   for i in range(0, len(_resource_uris), VALUES_BATCH_SIZE)]
+        for response in self.shoot_custom_queries(queries, _columns=True, _skip_failures=_skip_failures):
+            if response is not None:
+                property_ids.append(interning.get_ids(response[u'property']))
+
+        return interning.unique(np.concatenate(property_ids))
+
+    def get_hop2_properties(self, _resource_uri, _property, _right=True, _right_hop2=True, _counts=False):
+        """
+            All the distinct predicates (going out of if _right_hop2, else coming in to) the entities reached
+                from _resource_uri via _property (outgoing if _right, else incoming). One query, aggregated on the endpoint.
+
+            Results are cached under their own keys (see neighbourhood_index.hop2_key), and counts serve both kinds of calls.
+
+        :param _resource_uri: str (full URI)
+        :param _property: str (full URI)
+        :param _counts: bool: also return the number of intermediate entities on which each predicate is found
+        :return: list of str (uri), or dict of {uri: count} if _counts
+        """
+        key = neighbourhood_index.hop2_key(_resource_uri, _property, _right, _right_hop2)
+
+        if self.cache:
+            cached = self.cache.get_many([HOP2_COUNTS_CACHE_KEY % key, HOP2_CACHE_KEY % key])
+            # Empty neighbourhoods are common (eg. literal valued predicates): they're hits too
+            if cached[0] is not None:
+                return dict((str(x), y) for x, y in cached[0].items()) if _counts else [str(x) for x in cached[0]]
+            if cached[1] is not None and not _counts:
+                return [str(x) for x in cached[1]]
+
+        template = GET_HOP2_PROPERTIES_WITH_COUNTS if _counts else GET_HOP2_PROPERTIES
+        hop2 = HOP2_PATTERNS[(_right, _right_hop2)] % {'target_resource': '<' + _resource_uri + '>',
+                                                       'property': '<' + _property + '>'}
+        response = self.shoot_custom_query(template % {'hop2': hop2}, _columns=True)
+
+        if _counts:
+            properties = dict((x.encode('ascii', 'ignore'), int(y))
+                              for x, y in zip(response[u'property'], response[u'count']))
+        else:
+            properties = [x.encode('ascii', 'ignore') for x in response[u'property']]
+
+        if self.cache:
+            self.cache.set((HOP2_COUNTS_CACHE_KEY if _counts else HOP2_CACHE_KEY) % key, properties)
+
+        return properties
+
+    def get_hop2_property_ids(self, _resource_uri, _property, _right=True):
+        """
+            Interned IDs (sorted np array of int32) of the predicates on both sides of the entities reached
+                from _resource_uri via _property. See get_hop2_properties. Two round trips, whatever the fan-out.
+
+        :return: np array, np array: right (outgoing), left (incoming)
+        """
+        # Look it up in the neighbourhood index first.
+        if self.neighbourhood is not None:
+            property_ids = self.neighbourhood.get_hop2_property_ids(_resource_uri, _property, _right)
+            if property_ids is not None:
+                return property_ids
+
+        return interning.unique(interning.get_ids(self.get_hop2_properties(_resource_uri, _property, _right, True))), \
+            interning.unique(interning.get_ids(self.get_hop2_properties(_resource_uri, _property, _right, False)))
+
     def get_entities_of_class(self, _class_uri):
         """
 			This function can fetch the properties connected to the class passed as a function parameter _class_uri.
@@ -296,17 +560,9 @@ class DBPedia:
 
                 results = [x[u'label'][u'value'].encode('ascii', 'ignore') for x in response[u'results'][u'bindings']]
                 if len(results) > 0:
-                    self.labels[_resource_uri[1:-1]] = results
+                    self.add_labels({_resource_uri[1:-1]: results})
                 else:
                     p = results[0]  # Should raise exception
-                self.fresh_labels += 1
-
-                if self.fresh_labels >= 100:
-                    f = open('resources/labels.pickle', 'w+')
-                    pickle.dump(self.labels, f)
-                    f.close()
-                    self.fresh_labels = 0
-                    print "Labels dumped to file."
 
                 return np.random.choice(self.labels[_resource_uri[1:-1]])
             except IndexError as e:
@@ -315,6 +571,10 @@ class DBPedia:
                 # raw_input()
                 return nlutils.get_label_via_parsing(_resource_uri)
 
+            except QueryFailed:
+                # Known to fail (for a while). Not worth a traceback every time.
+                return nlutils.get_label_via_parsing(_resource_uri)
+
             except:
                 # print "in Exception"
                 traceback.print_exc()
@@ -324,6 +584,61 @@ class DBPedia:
         except:
             return nlutils.get_label_via_parsing(_resource_uri)
 
+    def add_labels(self, _labels):
+        """
+            Add fetched labels to the label file (dumped every 100 new labels).
+                Under a lock: the dict mustn't change while it's being pickled (eg. by another thread of server.py).
+
+        :param _labels: dict of {uri: [label, label, ...]}
+        """
+        if not _labels:
+            return
+        with self.labels_lock:
+            self.labels.update(_labels)
+            self.fresh_labels += len(_labels)
+
+            if self.fresh_labels >= 100:
+                f = open('resources/labels.pickle', 'w+')
+                pickle.dump(self.labels, f)
+                f.close()
+                self.fresh_labels = 0
+                print "Labels dumped to file."
+
+    def get_labels(self, _resource_uris):
+        """
+            Same as get_label, for a bunch of resources.
+                The ones not in the label file are fetched together (see shoot_custom_queries).
+
+        :param _resource_uris: list of str
+        :return: list of str (labels), in the same order
+        """
+        uris = []
+        for uri in _resource_uris:
+            if not nlutils.has_url(uri):
+                uri = nlutils.convert_shorthand_to_uri(uri)
+            uris.append(uri.replace('<', '').replace('>', ''))
+
+        missing = list(set([x for x in uris if x not in self.labels]))
+        try:
+            responses = self.shoot_custom_queries([GET_LABEL_OF_RESOURCE % {'target_resource': '<' + x + '>'}
+                                                   for x in missing], _columns=True, _skip_failures=True)
+        except:
+            traceback.print_exc()
+            responses = [None] * len(missing)
+
+        fresh = {}
+        for uri, response in zip(missing, responses):
+            try:
+                results = [x.encode('ascii', 'ignore') for x in response[u'label']]
+            except:
+                continue
+            if len(results) > 0:
+                fresh[uri] = results
+        self.add_labels(fresh)
+
+        return [np.random.choice(self.labels[x]) if x in self.labels else nlutils.get_label_via_parsing(x)
+                for x in uris]
+
     def get_most_specific_class(self, _resource_uri):
         """
 			Query to find the most specific DBPedia Ontology class given a URI.
@@ -419,7 +734,7 @@ class DBPedia:
         response = self.shoot_custom_query(CHECK_URL % {'target_resource': url})
         return response["boolean"]
 
-    def get_properties(self, _uri, _right=True, _left=True, label=True):
+    def get_properties(self, _uri, _right=True, _left=True, label=True, _ids=False):
         """
             This method brings all the predicates at a distance of 1-hop from the given URI.
 
@@ -429,14 +744,18 @@ class DBPedia:
         :param _right:  Whether or not to fetch outgoing predicates
         :param _left:   Whether or not to fetch incoming predicates
         :param label:   Whether to return the label of the URI or just the URI
+        :param _ids:    Return interned IDs (np array of int32) of the URIs instead (label is ignored)
 
         :return: Diff lists depending on input booleans (1/2)
         """
-        if _right:
+        if _ids:
+            right_properties = self.get_property_ids(_uri) if _right else None
+            left_properties = self.get_property_ids(_uri, right=False) if _left else None
+        if _right and not _ids:
             right_properties = list(set(self.get_properties_of_resource(_resource_uri=_uri)))
             if label:
                 right_properties = [nlutils.get_label_via_parsing(rel) for rel in right_properties]
-        if _left:
+        if _left and not _ids:
             left_properties = list(set(self.get_properties_of_resource(_resource_uri=_uri, right=False)))
             if label:
                 left_properties = [nlutils.get_label_via_parsing(rel) for rel in left_properties]
@@ -447,7 +766,10 @@ class DBPedia:
         else:
             return left_properties
 
-    def get_entity(self, _resource_uri, _relation, outgoing=True):
+    def get_entity(self, _resource_uri, _relation, outgoing=True, _skip_failures=False):
+        """
+        :param _skip_failures: bool: return None if the query fails, instead of raising QueryFailed
+        """
         _resource_uri = "<" + _resource_uri + ">"
         _relation = "<" + _relation[0] + ">"
         if outgoing:
@@ -456,9 +778,14 @@ class DBPedia:
         else:
             '''Query is to find subject '''
             temp_query = GET_SUBJECT % {'target_resource': _resource_uri, 'property': _relation}
-        response = self.shoot_custom_query(temp_query)
         try:
-            entity_list = [x[u'entity'][u'value'].encode('ascii', 'ignore') for x in response[u'results'][u'bindings']]
+            response = self.shoot_custom_query(temp_query, _columns=True)
+        except QueryFailed:
+            if _skip_failures:
+                return None
+            raise
+        try:
+            entity_list = [x.encode('ascii', 'ignore') for x in response[u'entity']]
             return entity_list
         except:
             # TODO: Find and handle exceptions appropriately
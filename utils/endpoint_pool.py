@@ -0,0 +1,287 @@
+"""
+    A pool of (replicated) SPARQL endpoints.
+
+    - Routing ('health'): a weighted pick, where the weight of an endpoint is
+        (1 - its error rate) / its latency / (1 + requests it is serving right now).
+        Latencies and error rates are moving averages (EWMA_ALPHA). 'round-robin', 'random' and 'select-one' also exist.
+    - Every endpoint has a circuit breaker (see circuit_breaker.py) and a cap on concurrent requests (MAX_CONCURRENCY).
+        If all the endpoints are at their cap, callers wait (up to MAX_WAIT_TIME) for a free slot.
+    - Only failures of the endpoint (as told by _is_endpoint_failure: eg. it can't be reached, server errors) count
+        against its health and breaker. The others (eg. a query which times out) are the request's own: they're
+        raised as they are, without a retry.
+    - Retries: a request which failed because of its endpoint is retried on another one (MAX_ATTEMPTS in total).
+    - Hedging: if a request takes longer than HEDGE_FACTOR times the usual latency of its endpoint, the same request
+        is also sent to another endpoint, and whichever answers first wins. The loser runs to completion in the
+        background (it holds its slot until then).
+
+    Usage:
+        pool = EndpointPool(['http://a:8890/sparql', 'http://b:8890/sparql'])
+        response = pool.execute(lambda url: shoot(url, query))     # raises EndpointError if every attempt failed
+        pool.report()
+"""
+import time
+import Queue
+import random
+import threading
+import collections
+
+# Our scripts
+import circuit_breaker
+
+# Some MACROS
+METHODS = ['health', 'round-robin', 'random', 'select-one']
+MAX_CONCURRENCY = 8             # per endpoint
+MAX_ATTEMPTS = 3                # per request, counting retries and hedges
+MAX_WAIT_TIME = 1.0             # seconds, for a free slot
+EWMA_ALPHA = 0.2
+DEFAULT_LATENCY = 0.05          # seconds, until an endpoint has answered once
+HEDGE_FACTOR = 3.0
+HEDGE_MIN_DELAY = 0.005         # seconds
+
+
+class EndpointError(Exception):
+    """
+        self.error is the exception raised by the last attempt (None if no endpoint could be used at all),
+            self.endpoint the url it was raised on.
+    """
+
+    def __init__(self, _error, _endpoint):
+        Exception.__init__(self, "%s (%s)" % (_error or "No endpoint available", _endpoint))
+        self.error = _error
+        self.endpoint = _endpoint
+
+
+class Endpoint:
+
+    def __init__(self, _url, _max_concurrency=MAX_CONCURRENCY):
+        self.url = _url
+        self.max_concurrency = _max_concurrency
+        self.breaker = circuit_breaker.CircuitBreaker()
+
+        self.in_flight = 0
+        self.latency = None             # EWMA, seconds (of successful requests)
+        self.error_rate = 0.0           # EWMA
+        self.stats = {'requests': 0, 'errors': 0, 'request_errors': 0, 'wins': 0, 'max_in_flight': 0}
+
+    def weight(self):
+        latency = self.latency if self.latency is not None else DEFAULT_LATENCY
+        return max(1.0 - self.error_rate, 0.01) / max(latency, 1e-4) / (1 + self.in_flight)
+
+    def hedge_delay(self):
+        latency = self.latency if self.latency is not None else DEFAULT_LATENCY
+        return max(HEDGE_FACTOR * latency, HEDGE_MIN_DELAY)
+
+    def record(self, _elapsed, _ok, _endpoint_failure=True):
+        """
+        :param _endpoint_failure: bool: for failed requests, whether the endpoint is to blame (else, ignored)
+        """
+        self.stats['requests'] += 1
+        if not _ok and not _endpoint_failure:
+            self.stats['request_errors'] += 1
+            self.breaker.record_ignored()
+            return
+        self.error_rate += EWMA_ALPHA * ((0.0 if _ok else 1.0) - self.error_rate)
+        if _ok:
+            self.latency = _elapsed if self.latency is None else self.latency + EWMA_ALPHA * (_elapsed - self.latency)
+            self.breaker.record_success()
+        else:
+            self.stats['errors'] += 1
+            self.breaker.record_failure()
+
+    def __repr__(self):
+        return "%s: %s, latency %s ms, error rate %.2f, in flight %d" % \
+               (self.url, self.stats, '%.1f' % (self.latency * 1e3) if self.latency is not None else '-',
+                self.error_rate, self.in_flight)
+
+
+class EndpointPool:
+
+    def __init__(self, _urls, _method='health', _max_concurrency=MAX_CONCURRENCY, _max_attempts=MAX_ATTEMPTS,
+                 _hedge=True, _max_wait_time=MAX_WAIT_TIME, _is_endpoint_failure=None):
+        """
+        :param _urls: list of str
+        :param _method: str: one of METHODS
+        :param _hedge: bool: send slow requests to a second endpoint
+        :param _is_endpoint_failure: function: exception -> bool: whether the endpoint is to blame for it
+                                    (None: every exception is)
+        """
+        assert _method in METHODS, "Routing method %s not understood" % _method
+        self.endpoints = [Endpoint(x, _max_concurrency) for x in _urls]
+        self.method = _method
+        self.max_attempts = _max_attempts
+        self.hedge = _hedge
+        self.max_wait_time = _max_wait_time
+        self.is_endpoint_failure = _is_endpoint_failure or (lambda _error: True)
+
+        self.condition = threading.Condition()
+        self.waiting = collections.deque()     # callers waiting for a slot, in order
+        self.next = 0                   # round-robin
+        self.stats = {'requests': 0, 'retries': 0, 'hedges': 0, 'failures': 0}
+
+    def _choose(self, _candidates):
+        if self.method == 'round-robin':
+            endpoint = min(_candidates, key=lambda x: (self.endpoints.index(x) - self.next) % len(self.endpoints))
+            self.next = (self.endpoints.index(endpoint) + 1) % len(self.endpoints)
+            return endpoint
+        if self.method == 'random':
+            return random.choice(_candidates)
+        if self.method == 'select-one':
+            return _candidates[0]
+
+        weights = [x.weight() for x in _candidates]
+        pick = random.random() * sum(weights)
+        for endpoint, weight in zip(_candidates, weights):
+            pick -= weight
+            if pick <= 0:
+                return endpoint
+        return _candidates[-1]
+
+    def select(self):
+        """
+            The endpoint a request would go to now (without sending one, or taking a slot). None if none is usable.
+        """
+        with self.condition:
+            candidates = [x for x in self.endpoints if x.breaker.ready() and x.in_flight < x.max_concurrency]
+            return self._choose(candidates) if candidates else None
+
+    def acquire(self, _exclude=(), _wait=True):
+        """
+            Pick an endpoint and take one of its slots. Waits for a slot if the usable endpoints are all busy.
+                Waiting callers are served first come, first served (and newcomers don't jump the queue).
+
+        :param _exclude: endpoints not to pick (eg. the ones already tried)
+        :param _wait: bool: if False, return None rather than wait
+        :return: Endpoint, or None
+        """
+        deadline = time.time() + self.max_wait_time
+        ticket = None
+        with self.condition:
+            try:
+                while True:
+                    usable = [x for x in self.endpoints if x not in _exclude and x.breaker.ready()]
+                    if (self.waiting[0] is ticket) if ticket is not None else not self.waiting:
+                        candidates = [x for x in usable if x.in_flight < x.max_concurrency]
+                        while candidates:
+                            endpoint = self._choose(candidates)
+                            if endpoint.breaker.allow():
+                                endpoint.in_flight += 1
+                                endpoint.stats['max_in_flight'] = max(endpoint.stats['max_in_flight'],
+                                                                      endpoint.in_flight)
+                                return endpoint
+                            candidates.remove(endpoint)
+
+                    remaining = deadline - time.time()
+                    if not usable or not _wait or remaining <= 0:
+                        return None
+                    if ticket is None:
+                        ticket = object()
+                        self.waiting.append(ticket)
+                    self.condition.wait(remaining)
+            finally:
+                if ticket is not None:
+                    self.waiting.remove(ticket)
+                    self.condition.notify_all()
+
+    def release(self, _endpoint, _elapsed, _ok, _endpoint_failure=True):
+        with self.condition:
+            _endpoint.in_flight -= 1
+            _endpoint.record(_elapsed, _ok, _endpoint_failure)
+            self.condition.notify_all()
+
+    def _count(self, _stat, _endpoint=None):
+        with self.condition:
+            if _endpoint is not None:
+                _endpoint.stats[_stat] += 1
+            else:
+                self.stats[_stat] += 1
+
+    def _attempt(self, _endpoint, _function, _results=None):
+        """
+        :return: (endpoint, ok, what _function returned or raised, whether the endpoint is to blame)
+        """
+        start = time.time()
+        try:
+            outcome = (_endpoint, True, _function(_endpoint.url), False)
+        except Exception as e:
+            outcome = (_endpoint, False, e, self.is_endpoint_failure(e))
+        self.release(_endpoint, time.time() - start, outcome[1], outcome[3])
+        if _results is None:
+            return outcome
+        _results.put(outcome)
+
+    def execute(self, _function):
+        """
+            _function(url) on a good endpoint, with retries and hedging.
+
+        :param _function: takes the url of an endpoint. What it raises counts as a failure of the endpoint if
+                            is_endpoint_failure says so.
+        :return: what _function returns
+        """
+        self._count('requests')
+        endpoint = self.acquire()
+        if endpoint is None:
+            self._count('failures')
+            raise EndpointError(None, self.endpoints[0].url if len(self.endpoints) == 1 else None)
+
+        # With nowhere to hedge or retry, there's no need for a thread.
+        if len(self.endpoints) == 1 or self.max_attempts == 1:
+            _, ok, value, _ = self._attempt(endpoint, _function)
+            if ok:
+                self._count('wins', endpoint)
+                return value
+            self._count('failures')
+            raise EndpointError(value, endpoint.url)
+
+        results = Queue.Queue()
+        tried = [endpoint]
+        pending = 1
+        hedge = self.hedge
+        error = None
+
+        def launch(_endpoint):
+            thread = threading.Thread(target=self._attempt, args=(_endpoint, _function, results))
+            thread.daemon = True
+            thread.start()
+
+        launch(endpoint)
+        while pending:
+            can_hedge = hedge and len(tried) < self.max_attempts
+            try:
+                endpoint, ok, value, endpoint_failure = results.get(timeout=tried[-1].hedge_delay() if can_hedge
+                                                                    else None)
+            except Queue.Empty:
+                # Taking too long. Ask someone else too.
+                other = self.acquire(_exclude=tried, _wait=False)
+                if other is None:
+                    hedge = False
+                    continue
+                self._count('hedges')
+                tried.append(other)
+                pending += 1
+                launch(other)
+                continue
+
+            pending -= 1
+            if ok:
+                self._count('wins', endpoint)
+                return value
+
+            error = (value, endpoint.url)
+            if not endpoint_failure:
+                # The request's own failure (eg. a timeout): another endpoint would do no better
+                hedge = False
+            elif pending == 0 and len(tried) < self.max_attempts:
+                other = self.acquire(_exclude=tried)
+                if other is not None:
+                    self._count('retries')
+                    tried.append(other)
+                    pending += 1
+                    launch(other)
+
+        self._count('failures')
+        raise EndpointError(*error)
+
+    def report(self):
+        print("Endpoint pool (%s): %s" % (self.method, self.stats))
+        for endpoint in self.endpoints:
+            print("\t%r" % endpoint)
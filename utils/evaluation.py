@@ -0,0 +1,171 @@
+"""
+    Evaluation of the ranking model: the rank of the true path of every question among its negative paths (all of
+        them, or a seeded sample), and from that, hits@1/5/10, MRR, mean and median rank. Overall, and per template.
+
+    It streams over the questions, CHUNK at a time, so memory doesn't grow with the number of negatives.
+        When the model can be split into its question and path encoders (see Encoders), every question of a chunk
+        is encoded once, and so is every distinct path, and the scores are dot products. Otherwise, (question, path)
+        rows are scored with the whole model, still a chunk at a time.
+
+    Usage:
+        results = evaluate(model, questions, pos_paths, neg_paths, _templates=templates)
+        report(results)
+    where model is a Keras model (of network.build_model), a ModelInterpreter, or an export of model_export.py.
+"""
+import numpy as np
+from keras.models import Model
+from keras.preprocessing.sequence import pad_sequences
+
+# Our scripts
+import network
+import model_export
+
+# Some MACROS
+CHUNK = 50                      # questions evaluated at once
+HITS_AT = [1, 5, 10]
+SEED = 42
+BATCH_SIZE = 1000               # for keras' predict
+TRAIN_SPLIT = .80               # Same split as network.main: the rest is held out
+
+
+def held_out(_x):
+    return _x[int(len(_x) * TRAIN_SPLIT):]
+
+
+def fit(_x, _width):
+    """
+        Re-pad (post padded) rows to _width. None: to the longest row (at least 1).
+    """
+    lengths = network.sequence_lengths(_x)
+    if _width is None:
+        return network.trim(_x, lengths)
+    if _x.shape[1] == _width:
+        return _x
+    return pad_sequences([row[:length] for row, length in zip(_x, lengths)], maxlen=_width, padding='post',
+                         dtype='int32')
+
+
+class Encoders:
+    """
+        The question encoder and the path encoder of a model, whose score is their dot product.
+            Raises ValueError for models which can't be split.
+    """
+
+    def __init__(self, _model, _batch_size=BATCH_SIZE):
+        if isinstance(_model, model_export.NumpyScorer):
+            self.questions = self.paths = _model.encode
+            self.ques_len, self.path_len = (None, None) if _model.dynamic else (_model.max_ques_len,
+                                                                                _model.max_path_len)
+            return
+
+        # A ModelInterpreter, or a keras model
+        keras_model = getattr(_model, 'model', _model)
+        if not isinstance(keras_model, Model):
+            raise ValueError("Can't split %s into encoders" % _model.__class__.__name__)
+
+        score = model_export._score_tensor(keras_model)
+        layer, node_index, _ = score._keras_history
+        if layer.__class__.__name__ != 'Dot':
+            raise ValueError("Expected the score to be a dot product, not a %s" % layer.__class__.__name__)
+        ques_encoded, path_encoded = layer.get_input_at(node_index)
+
+        question_encoder = Model(inputs=keras_model.inputs[0], outputs=ques_encoded)
+        path_encoder = Model(inputs=keras_model.inputs[1], outputs=path_encoded)
+        self.questions = lambda x: question_encoder.predict(x, batch_size=_batch_size)
+        self.paths = lambda x: path_encoder.predict(x, batch_size=_batch_size)
+        self.ques_len = keras_model.inputs[0].shape[1].value
+        self.path_len = keras_model.inputs[1].shape[1].value
+
+
+def _scores_by_encoding(_encoders, _questions, _paths):
+    """
+    :param _questions: np array (c, l)
+    :param _paths: np array (c, k, l)
+    :return: np array (c, k) of scores
+    """
+    ques_encoded = _encoders.questions(fit(_questions, _encoders.ques_len))
+    unique, inverse = np.unique(_paths.reshape(-1, _paths.shape[-1]), axis=0, return_inverse=True)
+    paths_encoded = _encoders.paths(fit(unique, _encoders.path_len))[inverse].reshape(_paths.shape[:2] + (-1,))
+    return np.einsum('ch,ckh->ck', ques_encoded, paths_encoded)
+
+
+def _scores_by_rows(_model, _questions, _paths, _batch_size=BATCH_SIZE):
+    """
+        Same as _scores_by_encoding, with the whole model: a Ranker (ModelInterpreter, exports), or a keras model.
+    """
+    questions = np.repeat(_questions, _paths.shape[1], axis=0)
+    paths = _paths.reshape(-1, _paths.shape[-1])
+    if hasattr(_model, 'score'):
+        scores = _model.score(fit(questions, _model.max_ques_len), fit(paths, _model.max_path_len))
+    else:
+        widths = [x.shape[1].value for x in _model.inputs]
+        questions, paths = fit(questions, widths[0]), fit(paths, widths[1])
+        scores = _model.predict([questions, paths, np.zeros_like(paths)], batch_size=_batch_size)[:, 0]
+    return np.asarray(scores).reshape(_paths.shape[:2])
+
+
+def summarize(_ranks):
+    """
+    :param _ranks: np array of the rank (1 is the best) of the true path of every question
+    :return: dict of metrics
+    """
+    if len(_ranks) == 0:
+        return {'questions': 0}
+    summary = dict(('hits@%d' % k, float((_ranks <= k).mean())) for k in HITS_AT)
+    summary.update({'questions': len(_ranks), 'mrr': float((1.0 / _ranks).mean()), 'mean_rank': float(_ranks.mean()),
+                    'median_rank': float(np.median(_ranks))})
+    return summary
+
+
+def evaluate(_model, _questions, _pos_paths, _neg_paths, _negatives=None, _templates=None, _seed=SEED,
+             _chunk=CHUNK, _batch_size=BATCH_SIZE):
+    """
+    :param _model: Keras model, ModelInterpreter, or model_export.FrozenScorer/NumpyScorer
+    :param _questions: np array (n, l) of (post padded) IDs
+    :param _pos_paths: np array (n, l)
+    :param _neg_paths: np array (n, negative samples, l). Rows of only padding are not counted.
+    :param _negatives: int: compare against this many negatives (the same, seeded, sample for every question),
+                        or None for all of them
+    :param _templates: (optional) np array (n) of the template of every question
+    :return: dict: 'all': summary (see summarize), 'templates': {template: summary}, 'ranks': np array (n)
+    """
+    if _negatives is not None:
+        columns = np.random.RandomState(_seed).choice(_neg_paths.shape[1], _negatives,
+                                                      replace=_negatives > _neg_paths.shape[1])
+    else:
+        columns = slice(None)
+
+    try:
+        encoders = Encoders(_model, _batch_size)
+        score = lambda questions, paths: _scores_by_encoding(encoders, questions, paths)
+    except ValueError:
+        score = lambda questions, paths: _scores_by_rows(_model, questions, paths, _batch_size)
+
+    ranks = np.zeros(len(_questions), dtype=np.int64)
+    for start in range(0, len(_questions), _chunk):
+        end = start + _chunk
+        paths = np.concatenate([_pos_paths[start:end, np.newaxis, :], _neg_paths[start:end][:, columns]], axis=1)
+        scores = score(_questions[start:end], paths)
+
+        # Ties go to the true path (as with argmax, before)
+        valid = (paths[:, 1:] != 0).any(axis=-1)
+        ranks[start:end] = 1 + ((scores[:, 1:] > scores[:, :1]) & valid).sum(axis=1)
+
+    results = {'all': summarize(ranks), 'ranks': ranks, 'templates': {}}
+    if _templates is not None:
+        for template in sorted(set(_templates)):
+            results['templates'][template] = summarize(ranks[np.asarray(_templates) == template])
+    return results
+
+
+def report(_results):
+    """
+        Print the results of evaluate, as a table.
+    """
+    columns = ['hits@%d' % k for k in HITS_AT] + ['mrr', 'mean_rank', 'median_rank']
+    print("%-10s %9s " % ('template', 'questions') + " ".join("%11s" % x for x in columns))
+    rows = [('all', _results['all'])] + sorted(_results['templates'].items())
+    for name, summary in rows:
+        if summary['questions'] == 0:
+            continue
+        print("%-10s %9d " % (name, summary['questions']) + " ".join("%11.4f" % summary[x] for x in columns))
@@ -0,0 +1,90 @@
+"""
+    A process wide table which interns URIs (entities, predicates, classes) to compact ints.
+
+    The QA pipeline does set operations, filtering and bookkeeping on the int IDs (numpy int32 arrays),
+        and only turns them back into strings when it has to (labels, SPARQL, output).
+
+    Usage:
+        ids = interning.get_ids(['http://dbpedia.org/ontology/birthPlace', ...])    # np.array of int32
+        uris = interning.get_uris(ids)                                              # list of str
+
+    NOTE: IDs are only meaningful within a process. Never store them on disk.
+"""
+import threading
+import numpy as np
+
+ID_DTYPE = np.int32
+NOT_FOUND = -1
+
+
+class InterningTable:
+
+    def __init__(self):
+        self.ids = {}
+        self.uris = []
+        self.lock = threading.Lock()        # New IDs only. Lookups need none.
+
+    def __len__(self):
+        return len(self.uris)
+
+    def __contains__(self, _uri):
+        return _uri in self.ids
+
+    def get_id(self, _uri):
+        """
+            ID of the URI. Assigns a new one if this URI hasn't been seen so far.
+        """
+        try:
+            return self.ids[_uri]
+        except KeyError:
+            # Store plain str (and not unicode) so that whatever comes out is ready to be used.
+            if not isinstance(_uri, str):
+                _uri = _uri.encode('ascii', 'ignore')
+            with self.lock:
+                uri_id = self.ids.setdefault(_uri, len(self.uris))
+                if uri_id == len(self.uris):
+                    self.uris.append(_uri)
+            return uri_id
+
+    def get_ids(self, _uris):
+        """
+            np array (int32) of the IDs of a list of URIs.
+        """
+        return np.fromiter((self.get_id(x) for x in _uris), dtype=ID_DTYPE, count=len(_uris))
+
+    def find_id(self, _uri):
+        """
+            Like get_id, but returns NOT_FOUND instead of interning unseen URIs.
+        """
+        return self.ids.get(_uri, NOT_FOUND)
+
+    def get_uri(self, _id):
+        return self.uris[_id]
+
+    def get_uris(self, _ids):
+        return [self.uris[i] for i in _ids]
+
+
+# The one table everyone shares.
+TABLE = InterningTable()
+
+get_id = TABLE.get_id
+get_ids = TABLE.get_ids
+find_id = TABLE.find_id
+get_uri = TABLE.get_uri
+get_uris = TABLE.get_uris
+
+
+def size():
+    return len(TABLE)
+
+
+def unique(_ids):
+    """
+        Sorted, unique IDs. The int equivalent of list(set(...)).
+    """
+    return np.unique(np.asarray(_ids, dtype=ID_DTYPE))
+
+
+def empty():
+    return np.zeros(0, dtype=ID_DTYPE)
@@ -0,0 +1,72 @@
+"""
+    A small LRU memo for pure functions (python 2 doesn't have functools.lru_cache).
+
+    Usage:
+        @lru_cache(maxsize=1024)
+        def f(a, b=False):
+            ...
+
+        f.cache_info()      # (hits, misses, maxsize, currsize)
+        f.cache_clear()
+        f.__wrapped__       # the function without the memo
+
+    The key is made from the positional and keyword arguments, so they must be hashable.
+    NOTE: The cached object itself is returned. Don't cache functions returning something you mutate later.
+
+    The recency is approximated with two generations of plain dicts (an OrderedDict is pure python in 2.7,
+        and re-ordering it on every hit costs more than most of the functions we memoize):
+        new entries go to the young generation; once it is full, it becomes the old one and the previous old one is dropped.
+        A hit in the old generation moves the entry back to the young one.
+"""
+import functools
+from collections import namedtuple
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+def lru_cache(maxsize=1024):
+
+    generation_size = max(1, maxsize // 2)
+
+    def decorator(_function):
+
+        generations = [{}, {}]      # young, old
+        stats = [0, 0]              # hits, misses
+
+        @functools.wraps(_function)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+            young = generations[0]
+            try:
+                result = young[key]
+                stats[0] += 1
+                return result
+            except KeyError:
+                pass
+
+            try:
+                result = generations[1].pop(key)
+                stats[0] += 1
+            except KeyError:
+                result = _function(*args, **kwargs)
+                stats[1] += 1
+
+            if len(young) >= generation_size:
+                generations[1] = young
+                young = generations[0] = {}
+            young[key] = result
+            return result
+
+        def cache_info():
+            return CacheInfo(stats[0], stats[1], maxsize, len(generations[0]) + len(generations[1]))
+
+        def cache_clear():
+            generations[0], generations[1] = {}, {}
+            stats[0] = stats[1] = 0
+
+        wrapper.__wrapped__ = _function
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
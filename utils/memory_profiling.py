@@ -0,0 +1,220 @@
+"""
+    Opt-in memory profiling of named phases (building the dataset, loading it, the training generators).
+
+    Off by default: phase/profiled cost nothing then. Set MEMORY_PROFILE in the environment to turn it on:
+        MEMORY_PROFILE=1        RSS, and tracemalloc (python 3) for what python allocates, and where
+        MEMORY_PROFILE=rss      RSS only (tracemalloc slows allocation heavy code down a lot)
+
+    Per phase: the RSS at its start and end, the peak RSS (sampled every SAMPLE_INTERVAL seconds, by a thread, and
+        the peak of the process if it was reached during the phase), and with tracemalloc, the peak of the memory
+        traced (all of it, not only what the phase allocated) during the phase, what the phase still holds at its end
+        (net), and the TOP_N lines of code which allocated most of that net. Phases can be nested. The report (per
+        phase name: the calls, and the worst of them) is printed at exit, or on report().
+
+    Numpy allocates its arrays through python's allocator, so tracemalloc sees them. Processes forked afterwards
+        (eg. the keras workers) aren't profiled.
+
+    Usage:
+        with memory_profiling.phase('parser.run: phase I'):
+            ...
+
+        @memory_profiling.profiled('network.load_data')
+        def load_data(...):
+"""
+import os
+import sys
+import time
+import atexit
+import threading
+import functools
+from contextlib import contextmanager
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Some MACROS
+MODE = os.environ.get('MEMORY_PROFILE', '').strip().lower()
+ENABLED = MODE not in ['', '0', 'false', 'no', 'off']
+TRACE = ENABLED and MODE != 'rss' and tracemalloc is not None
+SAMPLE_INTERVAL = 0.05          # seconds, between two RSS samples
+TOP_N = 5                       # allocation sites per phase
+TRACE_FRAMES = 1
+MIN_SITE = 64 * 1024            # bytes: smaller allocation sites aren't reported
+MB = 2.0 ** 20
+
+_records = {}                   # phase name: list of dicts (one per call)
+_open = []                      # the phases being run (a stack)
+_lock = threading.Lock()
+_sampler = None
+_pid = os.getpid()
+
+
+def rss():
+    """
+        Resident memory of the process in bytes (linux), or 0 where /proc isn't there.
+    """
+    try:
+        return int(open('/proc/self/statm').read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        return 0
+
+
+def high_water_mark():
+    """
+        Peak resident memory of the process so far in bytes (linux), or 0.
+    """
+    try:
+        for line in open('/proc/self/status'):
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+    return 0
+
+
+def _sample():
+    """
+        Keep the peak RSS of the open phases up to date, while there are some.
+    """
+    global _sampler
+    while True:
+        current = rss()
+        with _lock:
+            if not _open:
+                _sampler = None
+                return
+            for record in _open:
+                record['rss_peak'] = max(record['rss_peak'], current)
+        time.sleep(SAMPLE_INTERVAL)
+
+
+def _traced_peak():
+    """
+        Peak of the traced memory since the last call, which resets it (where tracemalloc can).
+    """
+    peak = tracemalloc.get_traced_memory()[1]
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    return peak
+
+
+def _top(_before, _after, _n=TOP_N):
+    """
+    :return: list of (file:line, bytes): the sites which allocated most of what's held now, but wasn't before
+    """
+    ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    stats = _after.filter_traces(ignored).compare_to(_before.filter_traces(ignored), 'lineno')
+    return [("%s:%d" % (x.traceback[0].filename, x.traceback[0].lineno), x.size_diff)
+            for x in stats[:_n] if x.size_diff >= MIN_SITE]
+
+
+@contextmanager
+def phase(_name):
+    """
+        Profile the memory of the block, as the phase _name (nothing happens unless ENABLED).
+    """
+    if not ENABLED:
+        yield
+        return
+
+    global _sampler
+    record = {'start': time.time(), 'rss_start': rss(), 'high_water_mark': high_water_mark()}
+    record['rss_peak'] = record['rss_start']
+    if TRACE:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        record['snapshot'] = tracemalloc.take_snapshot()
+        record['traced_start'] = tracemalloc.get_traced_memory()[0]
+        record['traced_peak'] = record['traced_start']
+
+    with _lock:
+        if TRACE and _open:
+            # The enclosing phase keeps its peak so far: this one resets it
+            _open[-1]['traced_peak'] = max(_open[-1]['traced_peak'], _traced_peak())
+        elif TRACE:
+            _traced_peak()
+        _open.append(record)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample, name='memory_profiling')
+            _sampler.daemon = True
+            _sampler.start()
+
+    try:
+        yield
+    finally:
+        with _lock:
+            _open.remove(record)
+            record['seconds'] = time.time() - record['start']
+            record['rss_end'] = rss()
+            record['rss_peak'] = max(record['rss_peak'], record['rss_end'])
+            # A new peak of the process was reached during the phase, maybe between two samples
+            high = high_water_mark()
+            if high > record.pop('high_water_mark'):
+                record['rss_peak'] = max(record['rss_peak'], high)
+            if TRACE:
+                record['traced_peak'] = max(record['traced_peak'], _traced_peak())
+                record['traced_net'] = tracemalloc.get_traced_memory()[0] - record['traced_start']
+                if _open:
+                    _open[-1]['traced_peak'] = max(_open[-1]['traced_peak'], record['traced_peak'])
+            _records.setdefault(_name, []).append(record)
+        if TRACE:
+            record['top'] = _top(record.pop('snapshot'), tracemalloc.take_snapshot())
+
+
+def profiled(_name):
+    """
+        Decorator: every call of the function is the phase _name.
+    """
+    def decorator(_function):
+        @functools.wraps(_function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return _function(*args, **kwargs)
+            with phase(_name):
+                return _function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def results():
+    """
+    :return: dict: phase name: list of dicts (one per call): seconds, rss_start, rss_end, rss_peak, and with
+                tracemalloc, traced_peak, traced_net (bytes) and top (list of (file:line, bytes))
+    """
+    with _lock:
+        return dict((name, list(records)) for name, records in _records.items())
+
+
+def report(_file=sys.stderr):
+    """
+        Print, per phase name (in the order they first ended): calls, total time, and for its call with the highest
+            peak RSS: RSS at the start, end and peak, and with tracemalloc, its traced peak and net, and top sites.
+    """
+    recorded = results()
+    if not recorded:
+        return
+    optional = lambda record, key: "%10.1f" % (record[key] / MB) if key in record else "%10s" % '-'
+
+    _file.write("Memory profile (MB)\n%-44s %5s %9s %10s %10s %10s %10s %10s\n" % (
+        'phase', 'calls', 'seconds', 'rss start', 'rss end', 'rss peak', 'traced pk', 'traced net'))
+    ordered = sorted(recorded.items(), key=lambda x: x[1][0]['start'] + x[1][0]['seconds'])
+    for name, records in ordered:
+        worst = max(records, key=lambda x: x['rss_peak'])
+        _file.write("%-44s %5d %9.2f %10.1f %10.1f %10.1f %s %s\n" % (
+            name[:44], len(records), sum(x['seconds'] for x in records), worst['rss_start'] / MB,
+            worst['rss_end'] / MB, worst['rss_peak'] / MB, optional(worst, 'traced_peak'),
+            optional(worst, 'traced_net')))
+        for site, size in worst.get('top', []):
+            _file.write("    %10.1f  %s\n" % (size / MB, site))
+
+
+def _report_at_exit():
+    # Not from forked processes: they'd print the profile of their parent again
+    if os.getpid() == _pid:
+        report()
+
+
+if ENABLED:
+    atexit.register(_report_at_exit)
@@ -0,0 +1,293 @@
+"""
+    Inference only exports of the ranking model, for CPU boxes.
+
+    - A frozen graph (FROZEN_GRAPH): only the scoring half of the model ([question, path] -> score), with the weights
+        folded in as constants, run in a CPU-only session through a callable (no Keras predict in between).
+    - A pure NumPy version (NUMPY_WEIGHTS): embedding, BiLSTM and dot product, in a few matrix products.
+        The question is encoded once per call, not once per path. Best for the small batches of a single question.
+
+    Both are Rankers (see model_interpreter.py), i.e. drop in replacements of the ModelInterpreter:
+        export(_model_dir)                                          # or: python -m utils.model_export <model_dir>
+        Krantikari(..., _model_interpreter=NumpyScorer.load(_model_dir))       # or FrozenScorer(_model_dir)
+
+    The NumPy version knows the models of network.build_model: an Embedding (alone, or _StaticEmbedding's
+        embed + project + tune), a Bidirectional LSTM, and a dot product. See benchmarks/model_export.py for parity.
+"""
+import os
+import sys
+import json
+import numpy as np
+import keras.backend as K
+from keras.engine.topology import Container
+
+# Our scripts
+import model_interpreter
+
+# Some MACROS
+FROZEN_GRAPH = 'frozen.pb'
+FROZEN_META = 'frozen.json'
+NUMPY_WEIGHTS = 'numpy_weights.npz'
+ACTIVATIONS = {
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 1.0 / (1.0 + np.exp(-x)),
+    'hard_sigmoid': lambda x: np.clip(0.2 * x + 0.5, 0.0, 1.0),
+    'relu': lambda x: np.maximum(x, 0.0),
+    'linear': lambda x: x
+}
+MERGE_MODES = {
+    'concat': lambda a, b: np.concatenate([a, b], axis=-1),
+    'sum': lambda a, b: a + b,
+    'mul': lambda a, b: a * b,
+    'ave': lambda a, b: (a + b) / 2.0
+}
+
+
+def _dot(_x, _kernel):
+    """
+        _x . _kernel, where the kernel may also be quantized (see quantization.py)
+    """
+    return np.dot(_x, _kernel) if isinstance(_kernel, np.ndarray) else _kernel.rdot(_x)
+
+
+def _array(_kernel):
+    """
+        The kernel as a float32 np array (dequantized, if it's quantized)
+    """
+    return _kernel if isinstance(_kernel, np.ndarray) else _kernel.dequantize()
+
+
+def _dense(_x, _kernel):
+    """
+        _x (n, t, dims) . _kernel (dims, out), as one 2D product (np.dot on a 3D array is an order of magnitude slower)
+    """
+    return _dot(_x.reshape(-1, _x.shape[-1]), _kernel).reshape(_x.shape[:-1] + (_kernel.shape[-1],))
+
+
+def _layers(_model):
+    """
+        All the layers of the model, including those of nested models (eg. a Sequential encoder).
+    """
+    for layer in _model.layers:
+        if isinstance(layer, Container):
+            for x in _layers(layer):
+                yield x
+        else:
+            yield layer
+
+
+def _score_tensor(_model):
+    """
+        The score of the positive path, i.e. the first input of the final concatenation (see network.build_model)
+    """
+    last = _model.layers[-1]
+    if last.__class__.__name__ != 'Concatenate':
+        raise ValueError("Expected the model to end with [pos score, neg score, loss], not a %s" %
+                         last.__class__.__name__)
+    return last.input[0]
+
+
+def _load(_model_dir):
+    """
+        The Keras model, in inference mode (so that dropout is not in the graph at all), on the CPU.
+    """
+    K.clear_session()
+    K.set_learning_phase(0)
+    return model_interpreter.ModelInterpreter(_gpu=None, _model_dir=_model_dir)
+
+
+def freeze(_interpreter, _export_dir):
+    """
+        Write the scoring half of the model as a frozen graph (FROZEN_GRAPH), and its inputs/output (FROZEN_META).
+
+    :param _interpreter: model_interpreter.ModelInterpreter
+    :param _export_dir: str: directory to write to
+    """
+    model, session = _interpreter.model, _interpreter.session
+    score = _score_tensor(model)
+
+    with _interpreter.graph.as_default():
+        graph_def = K.tf.graph_util.convert_variables_to_constants(session, session.graph_def, [score.op.name])
+
+    # If the model was built in training mode, dropout depends on the learning phase: we'll feed it False.
+    learning_phase = K.learning_phase()
+    learning_phase = learning_phase.name if isinstance(learning_phase, K.tf.Tensor) and \
+        learning_phase.op.name in set(x.name for x in graph_def.node) else None
+
+    with open(os.path.join(_export_dir, FROZEN_GRAPH), 'wb') as f:
+        f.write(graph_def.SerializeToString())
+    with open(os.path.join(_export_dir, FROZEN_META), 'w') as f:
+        json.dump({'inputs': [model.inputs[0].name, model.inputs[1].name], 'output': score.name,
+                   'learning_phase': learning_phase, 'max_ques_len': _interpreter.max_ques_len,
+                   'max_path_len': _interpreter.max_path_len, 'dynamic': _interpreter.dynamic}, f)
+
+
+def export(_model_dir=model_interpreter.DEFAULT_MODEL_DIR, _export_dir=None):
+    """
+        Both exports (frozen graph and NumPy weights) of the model in _model_dir, in _export_dir (by default, the same).
+    """
+    _export_dir = _export_dir or _model_dir
+    interpreter = _load(_model_dir)
+    freeze(interpreter, _export_dir)
+    NumpyScorer.from_keras(interpreter).save(_export_dir)
+    return _export_dir
+
+
+class FrozenScorer(model_interpreter.Ranker):
+    """
+        Scores paths with the frozen graph written by freeze(), in a CPU-only session.
+    """
+
+    def __init__(self, _export_dir=model_interpreter.DEFAULT_MODEL_DIR, _threads=0):
+        """
+        :param _threads: int: threads TF may use per call (0: as many as there are cores)
+        """
+        model_interpreter.Ranker.__init__(self)
+        with open(os.path.join(_export_dir, FROZEN_META)) as f:
+            meta = json.load(f)
+        self.max_ques_len, self.max_path_len, self.dynamic = meta['max_ques_len'], meta['max_path_len'], meta['dynamic']
+
+        graph_def = K.tf.GraphDef()
+        with open(os.path.join(_export_dir, FROZEN_GRAPH), 'rb') as f:
+            graph_def.ParseFromString(f.read())
+
+        self.graph = K.tf.Graph()
+        with self.graph.as_default():
+            K.tf.import_graph_def(graph_def, name='')
+        config = K.tf.ConfigProto(device_count={'GPU': 0}, intra_op_parallelism_threads=_threads,
+                                  inter_op_parallelism_threads=_threads)
+        self.session = K.tf.Session(graph=self.graph, config=config)
+
+        # One callable, made once: a call is then a single session run, with no feed dict to build or check.
+        feeds = [self.graph.get_tensor_by_name(x) for x in meta['inputs']]
+        if meta['learning_phase']:
+            feeds.append(self.graph.get_tensor_by_name(meta['learning_phase']))
+        self.learning_phase = [False] if meta['learning_phase'] else []
+        self.run = self.session.make_callable(self.graph.get_tensor_by_name(meta['output']), feed_list=feeds)
+
+    def _predict(self, _padded_ques, _padded_paths):
+        return self.run(_padded_ques, _padded_paths, *self.learning_phase).reshape(-1)
+
+
+class NumpyScorer(model_interpreter.Ranker):
+    """
+        Scores paths with NumPy only: embedding, Bidirectional LSTM (Keras' gate order: i, f, c, o) and dot product.
+    """
+
+    def __init__(self, _weights, _config):
+        """
+        :param _weights: dict of np arrays: 'embed', and optionally 'project' and 'tune' (see network._StaticEmbedding),
+                        'forward_kernel', 'forward_recurrent', 'forward_bias', and the same for 'backward'.
+                        Tables and kernels may also be quantization.Quantized.
+        :param _config: dict: units, activation, recurrent_activation, merge_mode, mask_zero,
+                        max_ques_len, max_path_len, dynamic
+        """
+        model_interpreter.Ranker.__init__(self)
+        self.weights = dict((k, v.astype(np.float32) if isinstance(v, np.ndarray) else v) for k, v in _weights.items())
+        self.config = _config
+        self.max_ques_len, self.max_path_len = _config['max_ques_len'], _config['max_path_len']
+        self.dynamic = _config['dynamic']
+        self.activation = ACTIVATIONS[_config['activation']]
+        self.recurrent_activation = ACTIVATIONS[_config['recurrent_activation']]
+        self.merge = MERGE_MODES[_config['merge_mode']]
+
+    @classmethod
+    def from_keras(cls, _interpreter):
+        """
+        :param _interpreter: model_interpreter.ModelInterpreter
+        """
+        embeddings = dict((x.name, x) for x in _layers(_interpreter.model) if x.__class__.__name__ == 'Embedding')
+        projections = [x for x in _layers(_interpreter.model) if x.__class__.__name__ == 'TimeDistributed']
+        encoders = [x for x in _layers(_interpreter.model) if x.__class__.__name__ == 'Bidirectional']
+        if len(encoders) != 1 or not (len(embeddings) == 1 or ('embed' in embeddings and 'tune' in embeddings)):
+            raise ValueError("Can't export this model to NumPy: expected an embedding and a Bidirectional LSTM encoder "
+                             "(see network.build_model)")
+
+        encoder = encoders[0]
+        lstm = encoder.forward_layer
+        if lstm.__class__.__name__ != 'LSTM' or not lstm.use_bias:
+            raise ValueError("Can't export this model to NumPy: the encoder is not a Bidirectional LSTM (with bias)")
+
+        weights = {}
+        if len(embeddings) == 1:
+            embed = embeddings.values()[0]
+        else:
+            embed = embeddings['embed']
+            weights['tune'] = embeddings['tune'].get_weights()[0]
+            weights['project'] = projections[0].get_weights()[0]
+        weights['embed'] = embed.get_weights()[0]
+        for direction, values in zip(['forward', 'backward'], [encoder.get_weights()[:3], encoder.get_weights()[3:]]):
+            weights[direction + '_kernel'], weights[direction + '_recurrent'], weights[direction + '_bias'] = values
+
+        config = {'units': lstm.units, 'activation': lstm.activation.__name__,
+                  'recurrent_activation': lstm.recurrent_activation.__name__, 'merge_mode': encoder.merge_mode,
+                  'mask_zero': bool(embed.mask_zero), 'max_ques_len': _interpreter.max_ques_len,
+                  'max_path_len': _interpreter.max_path_len, 'dynamic': _interpreter.dynamic}
+        return cls(weights, config)
+
+    def save(self, _export_dir):
+        weights = dict(self.weights)
+        weights['config'] = np.array(json.dumps(self.config))
+        np.savez(os.path.join(_export_dir, NUMPY_WEIGHTS), **weights)
+
+    @classmethod
+    def load(cls, _export_dir=model_interpreter.DEFAULT_MODEL_DIR):
+        data = np.load(os.path.join(_export_dir, NUMPY_WEIGHTS))
+        return cls(dict((k, data[k]) for k in data.files if k != 'config'), json.loads(str(data['config'])))
+
+    def embed(self, _ids):
+        """
+        :param _ids: np array (n, t) of IDs
+        :return: np array (n, t, dims)
+        """
+        vectors = self.weights['embed'][_ids]
+        if 'tune' in self.weights:
+            tune = self.weights['tune']
+            vectors = _dense(vectors, self.weights['project']) + tune[_ids % (len(tune) - 1) + 1]
+        return vectors
+
+    def _lstm(self, _inputs, _mask, _direction):
+        """
+            Last output of an LSTM over _inputs (n, t, dims). Masked steps leave the state as it is.
+        """
+        units = self.config['units']
+        recurrent = _array(self.weights[_direction + '_recurrent'])     # Used at every step: dequantized once
+        projected = _dense(_inputs, self.weights[_direction + '_kernel']) + self.weights[_direction + '_bias']
+
+        h = np.zeros((len(_inputs), units), dtype=np.float32)
+        c = np.zeros((len(_inputs), units), dtype=np.float32)
+        steps = range(_inputs.shape[1])
+        for t in (steps if _direction == 'forward' else reversed(steps)):
+            z = projected[:, t] + np.dot(h, recurrent)
+            i = self.recurrent_activation(z[:, :units])
+            f = self.recurrent_activation(z[:, units:2 * units])
+            c_next = f * c + i * self.activation(z[:, 2 * units:3 * units])
+            o = self.recurrent_activation(z[:, 3 * units:])
+            h_next = o * self.activation(c_next)
+            if _mask is None:
+                h, c = h_next, c_next
+            else:
+                h = np.where(_mask[:, t, None], h_next, h)
+                c = np.where(_mask[:, t, None], c_next, c)
+        return h
+
+    def encode(self, _ids):
+        """
+        :param _ids: np array (n, t) of IDs
+        :return: np array (n, encoding dims)
+        """
+        inputs = self.embed(_ids)
+        mask = _ids != 0 if self.config['mask_zero'] else None
+        return self.merge(self._lstm(inputs, mask, 'forward'), self._lstm(inputs, mask, 'backward'))
+
+    def _predict(self, _padded_ques, _padded_paths):
+        # Within a rank call, every row has the same question: encode each distinct one once.
+        if (_padded_ques == _padded_ques[:1]).all():
+            ques = np.repeat(self.encode(_padded_ques[:1]), len(_padded_ques), axis=0)
+        else:
+            unique, inverse = np.unique(_padded_ques, axis=0, return_inverse=True)
+            ques = self.encode(unique)[inverse]
+        return (ques * self.encode(_padded_paths)).sum(axis=1)
+
+
+if __name__ == "__main__":
+    print("Exported to %s" % export(*sys.argv[1:3]))
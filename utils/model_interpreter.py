@@ -4,6 +4,8 @@
     Script to use to model to do basic stuff like choosing b/w given set of paths etc.
 """
 import os
+import time
+import threading
 import numpy as np
 import keras.backend as K
 from keras.models import load_model
@@ -11,26 +13,133 @@ from keras.preprocessing.sequence import pad_sequences
 
 from network import custom_loss as loss_fn
 from network import rank_precision_metric
+from network import MAX_LENGTH, bucketed_batches, sequence_lengths, trim
 
 DEFAULT_MODEL_DIR = 'data/training/pairwise/model_47'
 
 
-class ModelInterpreter:
+class Ranker:
+    """
+        Padding, scoring (in length buckets, for dynamic models) and ranking of paths, for anything which can score
+            a padded batch: see _predict. Subclasses set max_ques_len, max_path_len and dynamic.
+            (ModelInterpreter below, and the exported models in utils/model_export.py)
+    """
 
-    def __init__(self, _gpu, _model_dir=DEFAULT_MODEL_DIR):
+    def __init__(self):
+        # Tokens scored (without padding), tokens fed to the model (with), seconds spent in the model
+        self.stats = {'rows': 0, 'tokens': 0, 'fed': 0, 'seconds': 0.0}
+        self.stats_lock = threading.Lock()
+
+    def pad_inputs(self, _id_q, _id_ps):
+        """
+            The question (repeated once per path) and the paths, padded the way the model wants them.
+
+        :param _id_q: vector of IDs
+        :param _id_ps: list of vectors of IDs, or an already padded np array of (n, self.max_path_len)
+        :return: np array (n, self.max_ques_len), np array (n, self.max_path_len)
+        """
+        # Pad paths (unless they come padded)
+        if isinstance(_id_ps, np.ndarray) and _id_ps.ndim == 2 and _id_ps.shape[1] == self.max_path_len:
+            padded_paths = _id_ps
+        else:
+            padded_paths = pad_sequences(_id_ps, maxlen=self.max_path_len, padding="post", dtype="int32")
+
+        # Repeat the question.
+        repeated_ques = np.repeat(a=_id_q[np.newaxis, :],
+                                  repeats=len(_id_ps),
+                                  axis=0)
+
+        # Pad question
+        padded_ques = pad_sequences(repeated_ques, maxlen=self.max_ques_len, padding="post", dtype="int32")
+        return padded_ques, padded_paths
+
+    def score(self, _padded_ques, _padded_paths):
+        """
+            One forward pass (or one per length bucket, for dynamic models).
+                The rows needn't be about the same question (see utils/batch_scheduler.py).
+
+        :return: 1D np array of similarities, one per row
+        """
+        start = time.time()
+        ques_lengths, path_lengths = sequence_lengths(_padded_ques), sequence_lengths(_padded_paths)
+
+        if not self.dynamic:
+            similarities = self._predict(_padded_ques, _padded_paths)
+            fed = _padded_ques.size + _padded_paths.size
+        else:
+            similarities, fed = np.zeros(len(_padded_paths), dtype=np.float32), 0
+            for rows in bucketed_batches([ques_lengths, path_lengths], len(_padded_paths), randomize=False):
+                ques, paths = trim(_padded_ques[rows], ques_lengths[rows]), trim(_padded_paths[rows], path_lengths[rows])
+                similarities[rows] = self._predict(ques, paths)
+                fed += ques.size + paths.size
+
+        with self.stats_lock:
+            self.stats['rows'] += len(_padded_paths)
+            self.stats['tokens'] += int(ques_lengths.sum() + path_lengths.sum())
+            self.stats['fed'] += fed
+            self.stats['seconds'] += time.time() - start
+        return similarities
+
+    def tokens_per_second(self):
+        """
+        :return: tokens scored per second spent in the model (not counting padding), share of the fed tokens that were padding
+        """
+        with self.stats_lock:
+            return self.stats['tokens'] / max(self.stats['seconds'], 1e-9), \
+                   1.0 - self.stats['tokens'] / float(max(self.stats['fed'], 1))
+
+    def rank(self, _id_q, _id_ps, _return_only_indices=False, _k=0):
+        """
+            Function to evaluate a bunch of paths and return a ranked list
+
+        :param _id_q: vector of dimension (n, 300)
+        :param _id_ps: list of vectors, each of dimensions (m, 300)
+                        or an already padded np array of (n, self.max_path_len) (see utils/path_arena.py)
+        :param _k: int: if more than 0, returns cropped results
+        :param _return_only_indices: Boolean, deciding whether to return paths or
+
+        :return: indices, or path vectors
+        """
+        padded_ques, padded_paths = self.pad_inputs(_id_q, _id_ps)
+        return top_k(self.score(padded_ques, padded_paths), _k, _return_only_indices)
+
+    def _predict(self, _padded_ques, _padded_paths):
+        """
+        :return: 1D np array of similarities, one per row
+        """
+        raise NotImplementedError
+
+
+class ModelInterpreter(Ranker):
+
+    def __init__(self, _gpu, _model_dir=DEFAULT_MODEL_DIR, _model=None):
         """
             Use this object for anything that has to do with the trained model.
             @TODO: Describe most major functions here.
 
+        :param _gpu: str: GPU to load the model on, or None for CPU only (device_count={'GPU': 0})
+        :param _model: (optional) an already built keras model (eg. for benchmarks). Nothing is loaded from disk then.
         """
 
+        Ranker.__init__(self)
         metric = rank_precision_metric(10)
         # Find and load the model from disk.
-        with K.tf.device('/gpu:' + _gpu):
-            K.set_session(K.tf.Session(config=K.tf.ConfigProto(allow_soft_placement=True)))
-            self.model = load_model(os.path.join(_model_dir, 'model.h5'), custom_objects={'custom_loss': loss_fn,
-                                                                                          'rank_precision_metric':
-                                                                                              metric})
+        if _model is not None:
+            self.model = _model
+        else:
+            config = K.tf.ConfigProto(allow_soft_placement=True)
+            if _gpu is None:
+                config.device_count['GPU'] = 0
+            with K.tf.device('/gpu:' + _gpu if _gpu is not None else '/cpu:0'):
+                K.set_session(K.tf.Session(config=config))
+                self.model = load_model(os.path.join(_model_dir, 'model.h5'), custom_objects={'custom_loss': loss_fn,
+                                                                                              'rank_precision_metric':
+                                                                                                  metric})
+
+        # So that the model can be used from other threads (eg. serving several requests at once, see server.py)
+        self.model._make_predict_function()
+        self.session = K.get_session()
+        self.graph = K.tf.get_default_graph()
         self._parse_model_inputs()
 
     def _parse_model_inputs(self):
@@ -53,52 +162,38 @@ class ModelInterpreter:
             # For the rest, get batch_input_shape
             input_shapes.append(layer['config']['batch_input_shape'][1:])
 
-        self.max_path_len = input_shapes[1][0]
-        self.max_ques_len = input_shapes[0][0]
-
-    def rank(self, _id_q, _id_ps, _return_only_indices=False, _k=0):
-        """
-            Function to evaluate a bunch of paths and return a ranked list
-
-        :param _id_q: vector of dimension (n, 300)
-        :param _id_ps: list of vectors, each of dimensions (m, 300)
-        :param _k: int: if more than 0, returns cropped results
-        :param _return_only_indices: Boolean, deciding whether to return paths or
-
-        :return: indices, or path vectors
-        """
-        # Pad paths
-        padded_paths = pad_sequences(_id_ps, maxlen=self.max_path_len, padding="post", dtype="int32")
-
-        # Repeat the question.
-        repeated_ques = np.repeat(a=_id_q[np.newaxis, :],
-                                  repeats=len(_id_ps),
-                                  axis=0)
-
-        # Pad question
-        padded_ques = pad_sequences(repeated_ques, maxlen=self.max_ques_len, padding="post", dtype="int32")
+        # Models trained with dynamic padding (see network.build_model) take any length, and mask the padding.
+        #   We still pad to MAX_LENGTH (callers expect a fixed width), but feed them buckets of similar lengths.
+        self.dynamic = input_shapes[1][0] is None
+        self.max_path_len = input_shapes[1][0] or MAX_LENGTH
+        self.max_ques_len = input_shapes[0][0] or MAX_LENGTH
 
+    def _predict(self, _padded_ques, _padded_paths):
         # Create a dummy set of paths for the sake of model arg: input3
-        dummy_paths = np.zeros((len(_id_ps), self.max_path_len))
+        dummy_paths = np.zeros_like(_padded_paths)
 
         # Pass to model.
-        similarities = self.model.predict([padded_ques, padded_paths, dummy_paths])
+        with self.session.as_default(), self.graph.as_default():
+            similarities = self.model.predict([_padded_ques, _padded_paths, dummy_paths])
 
         # Reshape from an array of n arrays of 1 element [[i],[j],[k]] -> [i,j,k]
-        similarities = np.transpose(similarities)[0]
+        return np.transpose(similarities)[0]
 
-        # Reshape it to a 1D array
-        # similarities = similarities.reshape(similarities.shape[1])
 
-        # Rank
-        rank = np.argsort(similarities)[::-1]
+def top_k(_similarities, _k=0, _return_only_indices=False):
+    """
+        Rank (best first), and crop to _k if 0 < _k <= number of similarities.
 
-        if 0 < _k <= rank.shape[0]:
-            # If one needs top-k results or not
-            return rank[:_k] if _return_only_indices else rank[:_k], similarities[rank[:_k]]
-        else:
-            return rank if _return_only_indices else rank, similarities[rank]
+    :return: indices, similarities
+    """
+    # Rank
+    rank = np.argsort(_similarities)[::-1]
 
+    if 0 < _k <= rank.shape[0]:
+        # If one needs top-k results or not
+        return rank[:_k] if _return_only_indices else rank[:_k], _similarities[rank[:_k]]
+    else:
+        return rank if _return_only_indices else rank, _similarities[rank]
 
 
 if __name__ == "__main__":
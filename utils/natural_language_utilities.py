@@ -4,20 +4,46 @@ import re
 import os.path
 from urlparse import urlparse
 
+# Our scripts
+from lru_cache import lru_cache
+
 # SOME MACROS
 STOPWORDLIST = 'resources/atire_puurula.txt'
 KNOWN_SHORTHANDS = ['dbo', 'dbp', 'rdf', 'rdfs', 'dbr', 'foaf', 'geo']
 DBP_SHORTHANDS = {'dbo': 'http://dbpedia.org/ontology/', 'dbp': 'http://dbpedia.org/property',
                   'dbr': 'http://dbpedia.org/resource'}
 # @TODO Import the above list from http://dbpedia.org/sparql?nsdecl
+DBPEDIA_PREFIX = 'http://dbpedia.org/'
+URL_MEMO_SIZE = 2 ** 16
+TOKENIZE_MEMO_SIZE = 2 ** 16
 
 # Few regex to convert camelCase to _ i.e DonaldTrump to donald trump
 first_cap_re = re.compile('(.)([A-Z][a-z]+)')
 all_cap_re = re.compile('([a-z0-9])([A-Z])')
-stopwords = open(STOPWORDLIST).read().split('\n')
+stopwords = frozenset(open(STOPWORDLIST).read().split('\n'))
+
+# Used by the tokenizer
+separators_re = re.compile(r'[,_]')
+parenthesis_re = re.compile(r'[()]')
+brackets_re = re.compile(r'\([^\)]*\)')
+
+# What validators.url accepts after the host (path, query, fragment). Used to skip it for DBpedia URIs.
+dbpedia_path_re = re.compile(u"[-a-z\u00a1-\uffff0-9._~%!$&'()*+,;=:@/]*(?:\\?\\S*)?(?:#\\S*)?$",
+                             re.UNICODE | re.IGNORECASE)
 
 
+@lru_cache(maxsize=URL_MEMO_SIZE)
 def has_url(_string):
+    """
+        Same verdict as validators.url, but the common cases are decided by looking at the prefix:
+            - DBpedia URIs only need their path checked
+            - shorthands (dbo:birthPlace) and strings without a scheme are never URLs
+        Everything else goes through validators.
+    """
+    if _string.startswith(DBPEDIA_PREFIX):
+        return dbpedia_path_re.match(_string, len(DBPEDIA_PREFIX)) is not None
+    if _string.split(':', 1)[0] in KNOWN_SHORTHANDS or '://' not in _string:
+        return False
     if validators.url(_string):
         return True
     return False
@@ -37,33 +63,50 @@ def tokenize(_input, _ignore_brackets=False, _remove_stopwords=False):
         Used in: parser.py; krantikari.py
         :param _input: str,
         :param _ignore_brackets: bool
-        :return: list of tokens
+        :return: list of tokens (a new list every time, feel free to mutate it)
     """
-    cleaner_input = _input.replace("?", "").replace(",", " ").replace("_"," ").strip()
-    if _ignore_brackets:
-        # If there's some text b/w brackets, remove it. @TODO: NESTED parenthesis not covered.
-        pattern = r'\([^\)]*\)'
-        matcher = re.search(pattern, cleaner_input, 0)
+    return list(_tokenize(_input, _ignore_brackets, _remove_stopwords))
+
 
-        if matcher:
-            substring = matcher.group()
+def tokenize_many(_inputs, _ignore_brackets=False, _remove_stopwords=False):
+    """
+        Tokenize a bunch of surface forms (eg. the labels of all the predicates around an entity) in one go.
+            Every distinct string is tokenized only once.
+
+        :param _inputs: list of str
+        :return: list of list of tokens (one per input, in the same order), ready to be vocabularized.
+    """
+    tokenized = {}
+    for _input in _inputs:
+        if _input not in tokenized:
+            tokenized[_input] = _tokenize(_input, _ignore_brackets, _remove_stopwords)
+    return [list(tokenized[x]) for x in _inputs]
 
-            cleaner_input = cleaner_input[:cleaner_input.index(substring)] + cleaner_input[
-                                                                             cleaner_input.index(substring) + len(
-                                                                                 substring):]
+
+@lru_cache(maxsize=TOKENIZE_MEMO_SIZE)
+def _tokenize(_input, _ignore_brackets, _remove_stopwords):
+    """
+        The memoized bit of tokenize. Returns tuples, so that callers can't mess up the memo.
+    """
+    cleaner_input = separators_re.sub(" ", _input.replace("?", ""))
+    if _ignore_brackets:
+        # If there's some text b/w brackets, remove it. @TODO: NESTED parenthesis not covered.
+        cleaner_input = brackets_re.sub("", cleaner_input, count=1)
     else:
-        cleaner_input = cleaner_input.replace("(", " ").replace(")", " ")
+        cleaner_input = parenthesis_re.sub(" ", cleaner_input)
 
-    return cleaner_input.strip().split() if not _remove_stopwords else remove_stopwords(cleaner_input.strip().split())
+    tokens = cleaner_input.split()
+    return tuple(tokens) if not _remove_stopwords else tuple(remove_stopwords(tokens))
 
 
+@lru_cache(maxsize=URL_MEMO_SIZE)
 def is_clean_url(_string):
     """
         !!!! ATTENTION !!!!!
         Radical changes about.
 
     """
-    if validators.url(_string):
+    if has_url(_string):
 
         if _string[-3:-1] == '__' and _string[-1] in string.digits:
             return False
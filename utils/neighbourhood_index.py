@@ -0,0 +1,253 @@
+"""
+    Pre-materialized 1-hop and 2-hop predicate neighbourhoods of the topic entities of LC-QuAD and QALD.
+
+    Popular entities (countries, cities, big organisations) have thousands of incoming edges and fetching,
+        decoding and deduplicating them at every question is wasteful. This script computes them once (offline),
+        and stores them as compact (sorted, unique) predicate-ID arrays which are memory mapped at runtime.
+
+    On disk (INDEX_DIR):
+        - predicates.pickle:    list of predicate URIs. The position of an URI is its ID.
+        - ids.npy:              one int32 array with the predicate IDs of every neighbourhood, concatenated.
+        - offsets.pickle:       dict of {key: (start, end)} pointing into ids.npy
+
+    Keys:
+        1-hop:  <entity> <+/->                      eg. 'http://dbpedia.org/resource/India\t+'
+        2-hop:  <entity> <+/-><hop1 predicate> <+/->  (the predicates around entities reached via the hop1 predicate)
+
+    Usage (offline):
+        python utils/neighbourhood_index.py
+
+    The DBPedia interface looks up this index before going to the endpoint. The endpoint is now just the fallback.
+"""
+import os
+import re
+import pickle
+import warnings
+import numpy as np
+
+# Our scripts
+import interning
+import dataset_reader
+
+# Some MACROS
+DEBUG = True
+INDEX_DIR = './resources/neighbourhood_index'
+LCQUAD_DIR = './resources/data_set.json'
+QALD_DIR = './resources/qald-7-train-multilingual.json'
+RESOURCE_PREFIX = 'http://dbpedia.org/resource/'
+
+# Topic entities can be written in full, or in shorthand (QALD does that a lot)
+FULL_ENTITY_RE = re.compile(r'<(http://dbpedia\.org/resource/[^>]+)>')
+SHORT_ENTITY_RE = re.compile(r'(?:^|[\s{(])(?:res|dbr):([^\s.;,{}()<>]+)')
+
+
+def _sign(_right):
+    return '+' if _right else '-'
+
+
+def hop1_key(_entity, _right):
+    return '%s\t%s' % (_entity, _sign(_right))
+
+
+def hop2_key(_entity, _predicate, _right, _right_hop2):
+    return '%s\t%s%s\t%s' % (_entity, _sign(_right), _predicate, _sign(_right_hop2))
+
+
+class NeighbourhoodIndex:
+
+    def __init__(self, _predicates, _ids, _offsets):
+        """
+            Use NeighbourhoodIndex.load() instead of calling this directly.
+
+        :param _predicates: list of str (the vocabulary)
+        :param _ids: np array of int32 (possibly memory mapped)
+        :param _offsets: dict of {str: (int, int)}
+        """
+        self.predicates = _predicates
+        self.ids = _ids
+        self.offsets = _offsets
+
+        # Local (on disk) predicate ID -> process wide interned ID.
+        self.interned = interning.get_ids(self.predicates)
+
+    def __contains__(self, _key):
+        return _key in self.offsets
+
+    @classmethod
+    def load(cls, _index_dir=INDEX_DIR):
+        """
+            Raises IOError if the index has not been built.
+        """
+        predicates = pickle.load(open(os.path.join(_index_dir, 'predicates.pickle'), 'rb'))
+        offsets = pickle.load(open(os.path.join(_index_dir, 'offsets.pickle'), 'rb'))
+        ids = np.load(os.path.join(_index_dir, 'ids.npy'), mmap_mode='r')
+        return cls(predicates, ids, offsets)
+
+    def _lookup(self, _key):
+        try:
+            start, end = self.offsets[_key]
+        except KeyError:
+            return None
+        return [self.predicates[i] for i in self.ids[start:end]]
+
+    def _lookup_ids(self, _key):
+        try:
+            start, end = self.offsets[_key]
+        except KeyError:
+            return None
+        return np.sort(self.interned[self.ids[start:end]])
+
+    def get_properties(self, _entity, _right=True):
+        """
+            Unique predicates going out of (_right = True), or coming in to (_right = False) the entity.
+            Returns None if the entity is not in the index.
+        """
+        return self._lookup(hop1_key(_entity, _right))
+
+    def get_property_ids(self, _entity, _right=True):
+        """
+            Same as get_properties, but returns interned IDs (sorted np array of int32).
+        """
+        return self._lookup_ids(hop1_key(_entity, _right))
+
+    def get_hop2_properties(self, _entity, _predicate, _right=True):
+        """
+            Unique predicates around the entities reached from _entity via _predicate.
+            Returns None if this neighbourhood is not in the index.
+
+        :return: list, list: right (outgoing), left (incoming) predicates
+        """
+        right = self._lookup(hop2_key(_entity, _predicate, _right, True))
+        left = self._lookup(hop2_key(_entity, _predicate, _right, False))
+        if right is None or left is None:
+            return None
+        return right, left
+
+    def get_hop2_property_ids(self, _entity, _predicate, _right=True):
+        """
+            Same as get_hop2_properties, but returns interned IDs (sorted np arrays of int32).
+        """
+        right = self._lookup_ids(hop2_key(_entity, _predicate, _right, True))
+        left = self._lookup_ids(hop2_key(_entity, _predicate, _right, False))
+        if right is None or left is None:
+            return None
+        return right, left
+
+
+class NeighbourhoodIndexBuilder:
+
+    def __init__(self):
+        self.vocab = {}
+        self.predicates = []
+        self.chunks = []
+        self.offsets = {}
+        self.length = 0
+
+    def add(self, _key, _predicates):
+        ids = []
+        for predicate in set(_predicates):
+            try:
+                ids.append(self.vocab[predicate])
+            except KeyError:
+                self.vocab[predicate] = len(self.predicates)
+                self.predicates.append(predicate)
+                ids.append(self.vocab[predicate])
+
+        ids = np.asarray(sorted(ids), dtype=np.int32)
+        self.offsets[_key] = (self.length, self.length + ids.shape[0])
+        self.chunks.append(ids)
+        self.length += ids.shape[0]
+
+    def save(self, _index_dir=INDEX_DIR):
+        try:
+            os.makedirs(_index_dir)
+        except OSError:
+            pass
+
+        ids = np.concatenate(self.chunks) if self.chunks else np.zeros(0, dtype=np.int32)
+        np.save(os.path.join(_index_dir, 'ids.npy'), ids)
+        pickle.dump(self.predicates, open(os.path.join(_index_dir, 'predicates.pickle'), 'wb'))
+        pickle.dump(self.offsets, open(os.path.join(_index_dir, 'offsets.pickle'), 'wb'))
+
+        if DEBUG:
+            print("neighbourhood_index: Stored %d neighbourhoods (%d predicate IDs, %d unique predicates) in %s" %
+                  (len(self.offsets), ids.shape[0], len(self.predicates), _index_dir))
+
+
+def collect_entities(_lcquad_dir=LCQUAD_DIR, _qald_dir=QALD_DIR):
+    """
+        Pull out every DBpedia resource mentioned in the SPARQL queries of LC-QuAD and QALD.
+
+    :return: sorted list of str (uri)
+    """
+    entities = set()
+
+    for node in dataset_reader.questions(_lcquad_dir):
+        entities.update(FULL_ENTITY_RE.findall(node[u'sparql_query']))
+
+    for node in dataset_reader.questions(_qald_dir, _key='questions'):
+        sparql = node['query'].get('sparql', '')
+        entities.update(FULL_ENTITY_RE.findall(sparql))
+        entities.update([RESOURCE_PREFIX + x for x in SHORT_ENTITY_RE.findall(sparql)])
+
+    return sorted(x.encode('ascii', 'ignore') if not isinstance(x, str) else x for x in entities)
+
+
+def compute_hop2_properties(_dbp, _entity, _predicate, _right=True):
+    """
+        All the predicates around entities which are reached from _entity via _predicate.
+            (Same as Krantikari.get_hop2_subgraph, without any sampling).
+
+    :return: list, list: right (outgoing), left (incoming) predicates
+    """
+    # One query per direction, aggregated on the endpoint.
+    return _dbp.get_hop2_properties(_entity, _predicate, _right, True), \
+        _dbp.get_hop2_properties(_entity, _predicate, _right, False)
+
+
+def build(_entities, _dbp, _hop2=True, _index_dir=INDEX_DIR):
+    """
+        The offline job. Fetch the neighbourhoods of the given entities from the endpoint and store them.
+
+    :param _entities: list of str (uri)
+    :param _dbp: utils.dbpedia_interface.DBPedia (make sure it does not use an index itself)
+    :param _hop2: bool: whether to materialize the 2-hop neighbourhoods too
+    :return: None
+    """
+    from progressbar import ProgressBar
+
+    builder = NeighbourhoodIndexBuilder()
+
+    iterator = ProgressBar()(_entities) if DEBUG else _entities
+    for entity in iterator:
+        try:
+            right, left = _dbp.get_properties(_uri=entity, label=False)
+        except Exception:
+            warnings.warn("neighbourhood_index: Could not fetch the neighbourhood of %s. Skipping." % entity)
+            continue
+
+        builder.add(hop1_key(entity, True), right)
+        builder.add(hop1_key(entity, False), left)
+
+        if not _hop2:
+            continue
+
+        for predicates, direction in [(set(right), True), (set(left), False)]:
+            for predicate in predicates:
+                try:
+                    hop2_right, hop2_left = compute_hop2_properties(_dbp, entity, predicate, direction)
+                except Exception:
+                    warnings.warn("neighbourhood_index: Could not fetch the neighbourhood of %s %s %s. Skipping." %
+                                  (entity, _sign(direction), predicate))
+                    continue
+                builder.add(hop2_key(entity, predicate, direction, True), hop2_right)
+                builder.add(hop2_key(entity, predicate, direction, False), hop2_left)
+
+    builder.save(_index_dir)
+
+
+if __name__ == "__main__":
+    import dbpedia_interface as db_interface
+
+    dbp = db_interface.DBPedia(_verbose=True, caching=True, _use_neighbourhood_index=False)
+    build(collect_entities(), dbp)
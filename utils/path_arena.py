@@ -0,0 +1,147 @@
+"""
+    A compact store for the candidate paths of one question.
+
+    A path (eg. ENT + hop1 - hop2) is not kept as a list of tokens. Instead, it is a sequence of segments, where
+        a segment is a run of tokens vocabularized once and stored once in the arena:
+            - the 1-hop path (entity tokens, sign, hop-1 predicate tokens) is a segment;
+            - the 2-hop paths built on it re-use it as their prefix, and only add a (sign, hop-2 predicate tokens) suffix.
+
+    Everything lives in a few flat int arrays; the model gets a padded ID matrix emitted in one go.
+
+    Usage:
+        arena = PathArena()
+        prefix = arena.add_segment(entity_tokens + ['+'] + predicate_tokens)
+        hop1 = arena.add_path([prefix])
+        hop2 = arena.add_path([prefix, arena.add_segment(['-'] + predicate_tokens)])
+        arena.pad(_maxlen=25, _paths=[hop1, hop2])        # np array (2, 25) of int32, post padded.
+        arena.get_tokens(hop2)                            # the list of tokens, if one needs it.
+"""
+import numpy as np
+from array import array
+
+# Our scripts
+import embeddings_interface
+
+# Some MACROS
+EMBEDDING = 'glove'
+PAD = 0
+
+
+def _as_numpy(_array):
+    """
+        A (no copy) np view over an array('i')
+    """
+    return np.frombuffer(_array, dtype=np.int32) if len(_array) else np.zeros(0, dtype=np.int32)
+
+
+class PathArena:
+
+    def __init__(self, _embedding=EMBEDDING):
+        self.embedding = _embedding
+
+        # Segments: tokens (for reading paths back) and their IDs, flat.
+        self.segment_vocab = {}                 # tuple of tokens -> segment ID
+        self.segment_tokens = []
+        self.segment_start = array('i')
+        self.segment_length = array('i')
+        self.ids = array('i')
+
+        # Paths: the segments of every path, flat.
+        self.path_start = array('i')
+        self.path_segments = array('i')
+
+    def __len__(self):
+        return len(self.path_start)
+
+    def add_segment(self, _tokens):
+        """
+            Vocabularize and store a run of tokens, unless the very same run was added before.
+
+        :param _tokens: list of str
+        :return: int: segment ID
+        """
+        key = tuple(_tokens)
+        try:
+            return self.segment_vocab[key]
+        except KeyError:
+            pass
+
+        segment = len(self.segment_tokens)
+        ids = embeddings_interface.vocabularize(_tokens, _embedding=self.embedding)
+
+        self.segment_vocab[key] = segment
+        self.segment_tokens.append(key)
+        self.segment_start.append(len(self.ids))
+        self.segment_length.append(len(ids))
+        self.ids.extend(int(x) for x in ids)
+        return segment
+
+    def add_path(self, _segments):
+        """
+        :param _segments: list of segment IDs (as returned by add_segment), in order
+        :return: int: path ID
+        """
+        self.path_start.append(len(self.path_segments))
+        self.path_segments.extend(_segments)
+        return len(self.path_start) - 1
+
+    def _segments_of(self, _path):
+        start = self.path_start[_path]
+        end = self.path_start[_path + 1] if _path + 1 < len(self.path_start) else len(self.path_segments)
+        return self.path_segments[start:end]
+
+    def get_tokens(self, _path):
+        """
+            The path as a list of tokens (the way paths were represented before this arena).
+        """
+        tokens = []
+        for segment in self._segments_of(_path):
+            tokens.extend(self.segment_tokens[segment])
+        return tokens
+
+    def get_ids(self, _path):
+        """
+            The path as a (1D) np array of token IDs.
+        """
+        ids = _as_numpy(self.ids)
+        return np.concatenate([ids[self.segment_start[x]:self.segment_start[x] + self.segment_length[x]]
+                               for x in self._segments_of(_path)] or [np.zeros(0, dtype=np.int32)])
+
+    def lengths(self, _paths=None):
+        """
+            Number of tokens in every path.
+        """
+        _paths = range(len(self)) if _paths is None else _paths
+        segment_length = _as_numpy(self.segment_length)
+        return np.asarray([segment_length[_as_numpy(self._segments_of(x))].sum() for x in _paths], dtype=np.int32)
+
+    def pad(self, _maxlen, _paths=None):
+        """
+            Emit a padded ID matrix for the model. Same output as keras' pad_sequences(padding='post'),
+                i.e. shorter paths are padded at the end, longer ones lose their first tokens.
+
+        :param _maxlen: int: number of columns
+        :param _paths: list of path IDs (rows, in order). All paths, if None.
+        :return: np array of int32 (len(_paths), _maxlen)
+        """
+        _paths = range(len(self)) if _paths is None else _paths
+        matrix = np.full((len(_paths), _maxlen), PAD, dtype=np.int32)
+        if len(_paths) == 0:
+            return matrix
+
+        ids = _as_numpy(self.ids)
+        for row, path in enumerate(_paths):
+
+            # Fill the row from the end of the path backwards, so that truncation is free.
+            segments = self._segments_of(path)
+            length = sum(self.segment_length[x] for x in segments)
+            column = min(length, _maxlen)
+            for segment in reversed(segments):
+                if column <= 0:
+                    break
+                span = min(self.segment_length[segment], column)
+                end = self.segment_start[segment] + self.segment_length[segment]
+                matrix[row, column - span:column] = ids[end - span:end]
+                column -= span
+
+        return matrix
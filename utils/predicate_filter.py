@@ -0,0 +1,138 @@
+"""
+    One place to decide which predicates are worth looking at.
+
+    The rules (blacklist, whitelist, namespaces, stop words) are compiled once, at startup,
+        into frozensets and a tuple of prefixes. On top of that, the verdict for every interned predicate ID
+        (see utils/interning.py) is remembered in a bitmap, so that filtering an np array of IDs is one lookup.
+
+    Rules:
+        - blacklist:    URIs which are always thrown away (eg. resources/predicate.blacklist)
+        - whitelist:    if given, only these URIs are kept (before the other rules are applied)
+        - namespaces:   if given, only URIs starting with one of these are kept
+        - stop words:   local names (the part after the last / or #) which are thrown away, whatever the namespace
+
+    Usage:
+        relation_filter = PredicateFilter.load('resources/predicate.blacklist')
+        relation_filter.filter(['http://dbpedia.org/ontology/birthPlace', ...])     # list of str
+        relation_filter.filter_ids(np.array([12, 3, 41]))                           # np array of int32
+"""
+import threading
+import numpy as np
+
+# Our scripts
+import interning
+
+# Some MACROS
+BLACKLIST_DIR = './resources/predicate.blacklist'
+DBO_NAMESPACES = ['http://dbpedia.org/ontology', 'dbo:']
+
+# Verdicts in the bitmap
+UNKNOWN = -1
+REJECT = 0
+KEEP = 1
+
+
+def local_name(_uri):
+    """
+        eg. 'http://www.w3.org/2000/01/rdf-schema#label' -> 'label'
+    """
+    return _uri[max(_uri.rfind('/'), _uri.rfind('#')) + 1:]
+
+
+class PredicateFilter:
+
+    def __init__(self, _blacklist=(), _whitelist=None, _namespaces=None, _stop_words=()):
+        """
+        :param _blacklist: iterable of str (uri)
+        :param _whitelist: iterable of str (uri), or None to allow everything
+        :param _namespaces: iterable of str (uri prefix), or None to allow everything
+        :param _stop_words: iterable of str (local names)
+        """
+        self.blacklist = frozenset(_blacklist)
+        self.whitelist = frozenset(_whitelist) if _whitelist is not None else None
+        self.namespaces = tuple(_namespaces) if _namespaces is not None else None
+        self.stop_words = frozenset(_stop_words)
+
+        # Verdicts per interned ID. Grows with the interning table (shared by the threads of server.py: it's only
+        # replaced, filled in and grown under the lock).
+        self.verdicts = np.zeros(0, dtype=np.int8)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, _blacklist_dir=BLACKLIST_DIR, **kwargs):
+        """
+            Filter with the blacklist read from disk (one uri per line).
+        """
+        return cls(_blacklist=open(_blacklist_dir).read().split(), **kwargs)
+
+    def restrict(self, _namespaces):
+        """
+            A new filter with the same rules, which additionally only allows the given namespaces.
+        """
+        return PredicateFilter(_blacklist=self.blacklist, _whitelist=self.whitelist,
+                               _namespaces=_namespaces, _stop_words=self.stop_words)
+
+    def keep(self, _uri):
+        """
+            The verdict for one predicate. Everything else in this class is a batched version of this.
+        """
+        if _uri in self.blacklist:
+            return False
+        if self.whitelist is not None and _uri not in self.whitelist:
+            return False
+        if self.namespaces is not None and not _uri.startswith(self.namespaces):
+            return False
+        if self.stop_words and local_name(_uri) in self.stop_words:
+            return False
+        return True
+
+    def filter(self, _predicates):
+        """
+            Keeps the order (and duplicates) of the input.
+
+        :param _predicates: list of str (uri)
+        :return: list of str (uri)
+        """
+        return [x for x in _predicates if self.keep(x)]
+
+    def mask_ids(self, _ids):
+        """
+            Boolean mask over an np array of interned IDs: True for the ones to keep.
+        """
+        _ids = np.asarray(_ids, dtype=interning.ID_DTYPE)
+        if _ids.shape[0] == 0:
+            return np.zeros(0, dtype=bool)
+
+        # Once every ID has a verdict, lookups need no lock (the bitmap is read once: it may get replaced meanwhile)
+        table = self.verdicts
+        if int(_ids.max()) >= table.shape[0] or (table[_ids] == UNKNOWN).any():
+            table = self._decide(_ids)
+
+        return table[_ids] == KEEP
+
+    def _decide(self, _ids):
+        """
+            Grow the bitmap for IDs interned since the last call, and decide the ones never seen before (once, ever).
+        :return: the bitmap
+        """
+        with self.lock:
+            table = self.verdicts
+            size = max(interning.size(), int(_ids.max()) + 1)
+            if size > table.shape[0]:
+                grown = np.full(size, UNKNOWN, dtype=np.int8)
+                grown[:table.shape[0]] = table
+                table = grown
+
+            for uri_id in np.unique(_ids[table[_ids] == UNKNOWN]):
+                table[uri_id] = KEEP if self.keep(interning.get_uri(uri_id)) else REJECT
+
+            self.verdicts = table
+            return table
+
+    def filter_ids(self, _ids):
+        """
+        :param _ids: np array of interned IDs
+        :return: np array of interned IDs (in the same order)
+        """
+        _ids = np.asarray(_ids, dtype=interning.ID_DTYPE)
+        return _ids[self.mask_ids(_ids)]
@@ -0,0 +1,208 @@
+"""
+    Approximate nearest neighbour index over the surface forms of (all) DBpedia predicates.
+
+    Given a question, it returns the predicates whose labels are closest to it in the embedding space,
+        without touching the SPARQL endpoint. Krantikari uses it to decide which neighbourhoods are worth expanding.
+
+    Backends:
+        - HNSW (via hnswlib), if it is installed;
+        - a brute force (but vectorized) NumPy fallback otherwise.
+
+    Usage:
+        index = PredicateIndex.build_from_labels(dbp.labels)
+        index.save()
+        ...
+        index = PredicateIndex.load()
+        index.query('Who is the president of Nicaragua?', _k=50)
+"""
+import os
+import pickle
+import warnings
+import numpy as np
+
+# Our scripts
+import embeddings_interface
+import natural_language_utilities as nlutils
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+# Some MACROS
+DEBUG = True
+EMBEDDING = 'glove'
+INDEX_DIR = './resources/predicate_index'
+PREDICATE_NAMESPACES = ['http://dbpedia.org/ontology/', 'http://dbpedia.org/property/']
+HNSW_M = 16                     # Number of bi-directional links per node
+HNSW_EF_CONSTRUCTION = 200      # Size of the candidate list while building
+HNSW_EF_SEARCH = 64             # Size of the candidate list while querying (>= k)
+
+
+def is_predicate(_uri):
+    """
+        DBpedia classes and properties share a namespace, the only difference being the case of the first char.
+            dbo:Person is a class, dbo:birthPlace is a predicate.
+    """
+    for namespace in PREDICATE_NAMESPACES:
+        if _uri.startswith(namespace):
+            local_name = _uri[len(namespace):]
+            return len(local_name) > 0 and not local_name[0].isupper()
+    return False
+
+
+def embed_phrase(_phrase, _embedding=EMBEDDING):
+    """
+        Mean of the word vectors of a phrase, L2 normalized. Returns None if no token is in the vocabulary.
+    """
+    tokens = nlutils.tokenize(_phrase, _remove_stopwords=True) or nlutils.tokenize(_phrase)
+    if len(tokens) == 0:
+        return None
+
+    vector = np.mean(embeddings_interface.vectorize(tokens, _embedding=_embedding), axis=0).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    if norm == 0.0:
+        return None
+
+    return vector / norm
+
+
+class PredicateIndex:
+
+    def __init__(self, _vectors, _row_predicates, _use_hnsw=True):
+        """
+            Use the build_* or load functions instead of calling this directly.
+
+        :param _vectors: np array (n, d) of L2 normalized label vectors
+        :param _row_predicates: list of n strings, the predicate (uri) to which each row belongs.
+                                    One predicate can have several rows (one per surface form)
+        :param _use_hnsw: bool: use hnswlib if it is available
+        """
+        self.vectors = np.ascontiguousarray(_vectors, dtype=np.float32)
+        self.row_predicates = list(_row_predicates)
+        self.predicates = sorted(set(self.row_predicates))
+
+        self.hnsw = None
+        if _use_hnsw and hnswlib is not None and self.vectors.shape[0] > 0:
+            self.hnsw = hnswlib.Index(space='ip', dim=self.vectors.shape[1])
+            self.hnsw.init_index(max_elements=self.vectors.shape[0], ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+            self.hnsw.add_items(self.vectors, np.arange(self.vectors.shape[0]))
+            self.hnsw.set_ef(HNSW_EF_SEARCH)
+        elif _use_hnsw and DEBUG:
+            warnings.warn("predicate_index: hnswlib not found. Falling back to the NumPy index.")
+
+    def __len__(self):
+        return len(self.predicates)
+
+    @classmethod
+    def build(cls, _predicate_labels, _use_hnsw=True, _embedding=EMBEDDING):
+        """
+            Embed every surface form of every predicate.
+
+        :param _predicate_labels: dict of {uri: [label, label ...]} (or {uri: label})
+        :return: PredicateIndex
+        """
+        vectors, row_predicates = [], []
+        for uri, labels in _predicate_labels.items():
+
+            if isinstance(labels, basestring):
+                labels = [labels]
+
+            # The URI itself is always a usable surface form.
+            for label in set(list(labels) + [nlutils.get_label_via_parsing(uri)]):
+                vector = embed_phrase(label, _embedding=_embedding)
+                if vector is None:
+                    continue
+                vectors.append(vector)
+                row_predicates.append(uri)
+
+        if DEBUG:
+            print("predicate_index: Embedded %d surface forms of %d predicates." %
+                  (len(row_predicates), len(set(row_predicates))))
+
+        vectors = np.asarray(vectors, dtype=np.float32).reshape((len(row_predicates), -1))
+        return cls(vectors, row_predicates, _use_hnsw=_use_hnsw)
+
+    @classmethod
+    def build_from_labels(cls, _labels, _use_hnsw=True, _embedding=EMBEDDING):
+        """
+            Build the index over every predicate found in the label cache of the DBpedia interface (dbp.labels).
+        """
+        predicate_labels = dict((uri, labels) for uri, labels in _labels.items() if is_predicate(uri))
+        return cls.build(predicate_labels, _use_hnsw=_use_hnsw, _embedding=_embedding)
+
+    def save(self, _index_dir=INDEX_DIR):
+        try:
+            os.makedirs(_index_dir)
+        except OSError:
+            pass
+
+        np.save(os.path.join(_index_dir, 'vectors.npy'), self.vectors)
+        pickle.dump(self.row_predicates, open(os.path.join(_index_dir, 'predicates.pickle'), 'wb'))
+
+    @classmethod
+    def load(cls, _index_dir=INDEX_DIR, _use_hnsw=True):
+        """
+            Raises IOError if the index is not on disk.
+        """
+        vectors = np.load(os.path.join(_index_dir, 'vectors.npy'))
+        row_predicates = pickle.load(open(os.path.join(_index_dir, 'predicates.pickle'), 'rb'))
+        return cls(vectors, row_predicates, _use_hnsw=_use_hnsw)
+
+    def _nearest_rows(self, _vector, _k):
+        """
+            Returns the indices of the _k rows with the highest inner product with _vector (best first).
+        """
+        _k = min(_k, self.vectors.shape[0])
+        if _k <= 0:
+            return np.asarray([], dtype=np.int64)
+
+        if self.hnsw is not None:
+            self.hnsw.set_ef(max(HNSW_EF_SEARCH, _k))
+            labels, _ = self.hnsw.knn_query(_vector, k=_k)
+            return labels[0]
+
+        scores = np.dot(self.vectors, _vector)
+        if _k < scores.shape[0]:
+            candidates = np.argpartition(-scores, _k - 1)[:_k]
+        else:
+            candidates = np.arange(scores.shape[0])
+        return candidates[np.argsort(-scores[candidates])]
+
+    def query(self, _question, _k=50, _return_scores=False):
+        """
+            Returns the (at most) _k predicates most plausible for this question, best first.
+
+        :param _question: str
+        :param _k: int: number of unique predicates to return
+        :param _return_scores: bool: return a list of (uri, score) tuples instead
+        :return: list of str (uri)
+        """
+        vector = embed_phrase(_question)
+        if vector is None or len(self.predicates) == 0:
+            return []
+
+        # A predicate has several surface forms, so fetch some extra rows to end up with _k unique predicates.
+        n_rows = _k * max(1, int(np.ceil(float(len(self.row_predicates)) / len(self.predicates))))
+        rows = self._nearest_rows(vector, n_rows)
+
+        results, seen = [], set()
+        for row in rows:
+            uri = self.row_predicates[row]
+            if uri in seen:
+                continue
+            seen.add(uri)
+            results.append((uri, float(np.dot(self.vectors[row], vector))) if _return_scores else uri)
+            if len(results) >= _k:
+                break
+
+        return results
+
+
+if __name__ == "__main__":
+    import dbpedia_interface as db_interface
+
+    dbp = db_interface.DBPedia(_verbose=True, caching=False)
+    index = PredicateIndex.build_from_labels(dbp.labels)
+    index.save()
+    print(index.query('Who is the president of Nicaragua ?', _k=10))
@@ -0,0 +1,144 @@
+"""
+    Quantized inference, for the NumPy scorer of model_export.py.
+
+    The embedding tables (the GloVe slice 'embed', and 'tune') take nearly all of the memory of the model. Here, they
+        are stored as float16, or as int8 with a float32 scale per row (row / scale in [-127, 127]). The dense and LSTM
+        kernels can be too (int8 with a scale per output column). Only what a call needs is dequantized (to float32):
+        the rows of the tables it looks up, and the kernels once per forward pass (the recurrent ones, which are used
+        at every step, are dequantized before the loop: see model_export.NumpyScorer._lstm).
+
+    Usage:
+        scorer = quantize(model_export.NumpyScorer.load(_model_dir), _embeddings='int8', _weights='float16')
+        python -m utils.quantization [model_dir]        # memory saved, and hits@1 on the held out split, per setting
+"""
+import os
+import sys
+import numpy as np
+
+# Our scripts
+import network
+import evaluation
+import model_export
+import model_interpreter
+
+# Some MACROS
+MODES = ['float16', 'int8']
+TABLES = ['embed', 'tune']
+KERNELS = ['project', 'forward_kernel', 'forward_recurrent', 'backward_kernel', 'backward_recurrent']
+INT8_MAX = 127.0
+SETTINGS = [('float16', None), ('int8', None), ('int8', 'float16'), ('int8', 'int8')]     # (tables, kernels)
+DATA_FILE = 'results_jan_12_full.pickle'
+NEG_PATHS_PER_QUESTION = 10
+
+
+class Quantized:
+    """
+        A quantized 2D array, which can be indexed like one (rows come back as float32) and multiplied with (rdot).
+    """
+
+    def __init__(self, _values, _mode, _axis):
+        """
+        :param _values: 2D np array
+        :param _mode: str: 'float16' or 'int8'
+        :param _axis: int: which axis the int8 scales reduce over: 1 for a scale per row (tables),
+                        0 for a scale per column (kernels)
+        """
+        self.mode, self.axis, self.shape = _mode, _axis, _values.shape
+        if _mode == 'float16':
+            self.values, self.scales = _values.astype(np.float16), None
+        elif _mode == 'int8':
+            scales = np.abs(_values).max(axis=_axis, keepdims=True) / INT8_MAX
+            scales[scales == 0] = 1.0
+            self.values = np.round(_values / scales).astype(np.int8)
+            self.scales = scales.astype(np.float32)
+        else:
+            raise ValueError("Unknown quantization: %s (expected one of %s)" % (_mode, MODES))
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __getitem__(self, _ids):
+        rows = self.values[_ids].astype(np.float32)
+        if self.scales is not None:
+            rows *= self.scales[_ids] if self.axis == 1 else self.scales[0]
+        return rows
+
+    def dequantize(self):
+        """
+        :return: the whole array, as float32
+        """
+        values = self.values.astype(np.float32)
+        if self.scales is not None:
+            values *= self.scales
+        return values
+
+    def rdot(self, _x):
+        """
+        :return: _x . (the dequantized array)
+        """
+        values = self.values.astype(np.float32)
+        if self.scales is None:
+            return np.dot(_x, values)
+        if self.axis == 0:
+            return np.dot(_x, values) * self.scales
+        return np.dot(_x * self.scales[:, 0], values)
+
+
+def quantize(_scorer, _embeddings='int8', _weights=None):
+    """
+    :param _scorer: model_export.NumpyScorer (float32)
+    :param _embeddings: str: mode for the embedding tables, or None to keep them as they are
+    :param _weights: str: mode for the dense and LSTM kernels, or None to keep them as they are
+    :return: model_export.NumpyScorer
+    """
+    weights = dict(_scorer.weights)
+    for name, mode, axis in [(x, _embeddings, 1) for x in TABLES] + [(x, _weights, 0) for x in KERNELS]:
+        if mode is not None and name in weights:
+            weights[name] = Quantized(weights[name], mode, axis)
+    return model_export.NumpyScorer(weights, _scorer.config)
+
+
+def memory(_scorer):
+    """
+    :return: bytes taken by the weights of a model_export.NumpyScorer
+    """
+    return sum(x.nbytes for x in _scorer.weights.values())
+
+
+def evaluate(_scorer, _questions, _pos_paths, _neg_paths, _settings=SETTINGS):
+    """
+        Memory saved, and the change in hits@1 (and MRR), of every quantization setting. See evaluation.py.
+
+    :param _scorer: model_export.NumpyScorer (float32)
+    :param _settings: list of (mode of the tables, mode of the kernels)
+    :return: list of dicts (one per setting, the float32 one first)
+    """
+    results = []
+    for embeddings, weights in [(None, None)] + _settings:
+        scorer = quantize(_scorer, embeddings, weights)
+        evaluated = evaluation.evaluate(scorer, _questions, _pos_paths, _neg_paths, _negatives=NEG_PATHS_PER_QUESTION)
+        results.append({'embeddings': embeddings, 'weights': weights, 'memory': memory(scorer),
+                        'hits@1': evaluated['all']['hits@1'], 'mrr': evaluated['all']['mrr'],
+                        'ranks': evaluated['ranks']})
+
+        base = results[0]
+        print("%-9s %-9s %7.1f MB (-%4.1f%%)  hits@1 %.4f (%+.4f), MRR %.4f (%+.4f), same rank for %.1f%% of the "
+              "questions" % (embeddings or 'float32', weights or 'float32', results[-1]['memory'] / 2.0 ** 20,
+                             100.0 * (1 - results[-1]['memory'] / float(base['memory'])), results[-1]['hits@1'],
+                             results[-1]['hits@1'] - base['hits@1'], results[-1]['mrr'],
+                             results[-1]['mrr'] - base['mrr'], 100.0 * (results[-1]['ranks'] == base['ranks']).mean()))
+    return results
+
+
+if __name__ == "__main__":
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else model_interpreter.DEFAULT_MODEL_DIR
+    if not os.path.exists(os.path.join(model_dir, model_export.NUMPY_WEIGHTS)):
+        model_export.export(model_dir)
+
+    vectors, questions, pos_paths, neg_paths = network.load_data(DATA_FILE, network.MAX_LENGTH)
+    evaluate(model_export.NumpyScorer.load(model_dir), evaluation.held_out(questions), evaluation.held_out(pos_paths),
+             evaluation.held_out(neg_paths))
@@ -0,0 +1,70 @@
+"""
+    Coalescing of identical in-flight calls (a "single flight" group).
+
+    If a call for some key is already running when another one for the same key comes in, the second one doesn't run:
+        it waits for the first and gets its result (or its exception). Only concurrent calls are coalesced;
+        nothing is remembered once a call is done (that's the cache's job).
+
+    Usage:
+        group = SingleFlight()
+        response = group.do(query, shoot, query)            # shoot(query) runs once for all the threads asking for it
+        group.stats                                         # {'calls': 10, 'executed': 4, 'coalesced': 6}
+"""
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None       # the exception raised, if any
+        self.waiters = 0
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.stats = {'calls': 0, 'executed': 0, 'coalesced': 0}
+
+    def do(self, _key, _function, *args, **kwargs):
+        """
+            _function(*args, **kwargs), unless a call for _key is already in flight: then, its result.
+
+        :param _key: hashable
+        :return: what _function returns. What it raises is raised to every caller waiting on it.
+        """
+        with self.lock:
+            self.stats['calls'] += 1
+            call = self.calls.get(_key)
+            if call is not None:
+                self.stats['coalesced'] += 1
+                call.waiters += 1
+                leader = False
+            else:
+                call = self.calls[_key] = _Call()
+                self.stats['executed'] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = _function(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[_key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.calls)
+
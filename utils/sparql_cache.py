@@ -0,0 +1,322 @@
+"""
+    The redis layer between the DBpedia interface and the endpoint.
+
+    - SPARQL results (SELECT) are stored in a compact, columnar binary form (BINARY_MAGIC, see encode_bindings):
+        a string table with every distinct string (uri, literal, language tag, datatype) once,
+        and per variable, a column of indices into it plus a column of (typed) term kinds.
+        The whole thing is zlib compressed. It decodes straight into columns (lists of values per variable),
+        which is all that most DBPedia methods want, or back into the usual SPARQL json dict.
+    - Anything else (ASK results, our own lists/dicts) is stored as zlib compressed json (MAGIC).
+    - Values written by older versions (plain json text) are still read.
+    - Negative entries (NEGATIVE_MAGIC): queries which failed (timeout, endpoint error) or came back empty.
+        They expire (FAILURE_TTL, EMPTY_TTL), and record why (see Failure), so that the same bad query isn't retried
+        on every question, but is retried eventually. Empty SELECT results are stored this way automatically.
+    - Batches of queries go through one MGET (get_many) and one pipeline (set_many), instead of a round trip each.
+
+    Usage:
+        cache = SparqlCache(redis.StrictRedis(...))
+        responses = cache.get_many([query_1, query_2])      # [dict or None, dict or None]
+        columns = cache.get_columns(query_1)                # {u'property': [u'http://...', ...]} or None
+        cache.set_many([(query_2, response_2)])
+        cache.set_failure(query_3, 'timeout', 'timed out')
+        cache.get(query_3)                                  # Failure(reason='timeout', ...)
+"""
+import time
+import zlib
+import json
+import struct
+from array import array
+from collections import namedtuple
+
+# Some MACROS
+MAGIC = 'Z1'                    # Marks compressed json. Plain json never starts with it.
+BINARY_MAGIC = 'B1'             # Marks compressed binary SPARQL results.
+NEGATIVE_MAGIC = 'N1'           # Marks failed or empty queries (json Failure).
+FAILURE_TTL = 300               # seconds. Timeouts and errors are often transient.
+EMPTY_TTL = 7 * 24 * 3600       # seconds. Empty results (eg. resources without a label) rarely change.
+COMPRESSION_LEVEL = 6
+BATCH_SIZE = 500                # Max keys per MGET/pipeline
+
+# Binary format
+HEADER = struct.Struct('<III')                  # number of variables, rows, strings
+TERM_TYPES = [u'uri', u'literal', u'typed-literal', u'bnode']
+HAS_LANG = 0x40                 # Flags on the term type. The extra column then points to the tag/datatype.
+HAS_DATATYPE = 0x80
+UNBOUND = 0xFFFFFFFF            # Index of variables with no value in a row
+SEPARATOR = u'\x00'             # Between the strings of the table
+
+# What the cache returns for negative entries. response is the (empty) SPARQL result, if there was one.
+Failure = namedtuple('Failure', ['reason', 'detail', 'endpoint', 'time', 'response'])
+
+
+def _uint_array(_values=()):
+    """
+        array of (at least) 32 bit unsigned ints
+    """
+    typecode = 'I' if array('I').itemsize >= 4 else 'L'
+    return array(typecode, _values)
+
+
+def encode_bindings(_response):
+    """
+        SPARQL json results -> binary (uncompressed). Returns None if they can't be represented.
+
+        Layout:
+            HEADER
+            string lengths are not stored: the table is one utf-8 blob, strings separated by SEPARATOR
+                blob length (uint32), blob
+            variable names: n_vars uint32 (indices into the table)
+            per variable: n_rows uint32 (value index), n_rows uint8 (term type + flags), n_rows uint32 (extra index)
+    """
+    try:
+        variables = _response[u'head'][u'vars']
+        bindings = _response[u'results'][u'bindings']
+    except (KeyError, TypeError):
+        return None
+
+    table, strings = {}, []
+
+    def intern(_string):
+        try:
+            return table[_string]
+        except KeyError:
+            if SEPARATOR in _string:
+                raise ValueError
+            table[_string] = len(strings)
+            strings.append(_string)
+            return table[_string]
+
+    try:
+        names = _uint_array(intern(x) for x in variables)
+        columns = []
+        for variable in variables:
+            values, types, extras = _uint_array(), array('B'), _uint_array()
+            for binding in bindings:
+                term = binding.get(variable)
+                if term is None:
+                    values.append(UNBOUND)
+                    types.append(0)
+                    extras.append(UNBOUND)
+                    continue
+
+                term_type = TERM_TYPES.index(term[u'type'])
+                extra = UNBOUND
+                if u'xml:lang' in term:
+                    term_type |= HAS_LANG
+                    extra = intern(term[u'xml:lang'])
+                if u'datatype' in term:
+                    if extra != UNBOUND:
+                        raise ValueError
+                    term_type |= HAS_DATATYPE
+                    extra = intern(term[u'datatype'])
+
+                values.append(intern(term[u'value']))
+                types.append(term_type)
+                extras.append(extra)
+            columns.append((values, types, extras))
+    except ValueError:
+        return None
+
+    blob = SEPARATOR.join(strings).encode('utf-8')
+    parts = [HEADER.pack(len(variables), len(bindings), len(strings)), struct.pack('<I', len(blob)), blob,
+             names.tostring()]
+    for values, types, extras in columns:
+        parts += [values.tostring(), types.tostring(), extras.tostring()]
+    return ''.join(parts)
+
+
+def _decode_binary(_value):
+    """
+        binary (uncompressed) -> strings, variables, columns (list of (values, types, extras) arrays)
+    """
+    n_vars, n_rows, n_strings = HEADER.unpack_from(_value, 0)
+    offset = HEADER.size
+    blob_length = struct.unpack_from('<I', _value, offset)[0]
+    offset += 4
+    strings = _value[offset:offset + blob_length].decode('utf-8').split(SEPARATOR) if n_strings else []
+    offset += blob_length
+
+    def read(_typecode, _n):
+        column = _uint_array() if _typecode == 'I' else array(_typecode)
+        size = column.itemsize * _n
+        column.fromstring(_value[offset:offset + size])
+        return column, offset + size
+
+    names, offset = read('I', n_vars)
+    columns = []
+    for _ in range(n_vars):
+        values, offset = read('I', n_rows)
+        types, offset = read('B', n_rows)
+        extras, offset = read('I', n_rows)
+        columns.append((values, types, extras))
+
+    return strings, [strings[i] for i in names], columns
+
+
+def decode_columns(_value):
+    """
+        binary (uncompressed) -> {variable: [value, value, ...]} (None where unbound)
+    """
+    strings, variables, columns = _decode_binary(_value)
+    strings.append(None)        # So that UNBOUND can be looked up like the rest (it's never a valid index)
+    none = len(strings) - 1
+    return dict((variable, [strings[x if x != UNBOUND else none] for x in values])
+                for variable, (values, types, extras) in zip(variables, columns))
+
+
+def decode_bindings(_value):
+    """
+        binary (uncompressed) -> SPARQL json results (as json.loads would give them)
+    """
+    strings, variables, columns = _decode_binary(_value)
+    n_rows = len(columns[0][0]) if columns else 0
+    bindings = [{} for _ in range(n_rows)]
+
+    for variable, (values, types, extras) in zip(variables, columns):
+        for row in range(n_rows):
+            if values[row] == UNBOUND:
+                continue
+            term = {u'type': TERM_TYPES[types[row] & 0x3F], u'value': strings[values[row]]}
+            if types[row] & HAS_LANG:
+                term[u'xml:lang'] = strings[extras[row]]
+            elif types[row] & HAS_DATATYPE:
+                term[u'datatype'] = strings[extras[row]]
+            bindings[row][variable] = term
+
+    return {u'head': {u'vars': variables}, u'results': {u'bindings': bindings}}
+
+
+def columns_of(_response):
+    """
+        SPARQL json results -> {variable: [value, value, ...]}. Same output as decode_columns.
+    """
+    bindings = _response[u'results'][u'bindings']
+    try:
+        variables = _response[u'head'][u'vars']
+    except KeyError:
+        variables = set(variable for x in bindings for variable in x)
+    return dict((variable, [x[variable][u'value'] if variable in x else None for x in bindings])
+                for variable in variables)
+
+
+def is_empty(_value):
+    """
+        Whether this is a SELECT result without any bindings.
+    """
+    try:
+        return isinstance(_value, dict) and len(_value[u'results'][u'bindings']) == 0
+    except (KeyError, TypeError):
+        return False
+
+
+def encode_failure(_failure):
+    return NEGATIVE_MAGIC + json.dumps(_failure._asdict(), separators=(',', ':'))
+
+
+def encode(_value, _compress=True):
+    binary = encode_bindings(_value) if isinstance(_value, dict) else None
+    if binary is not None:
+        return BINARY_MAGIC + zlib.compress(binary, COMPRESSION_LEVEL)
+
+    value = json.dumps(_value, separators=(',', ':'))
+    return MAGIC + zlib.compress(value, COMPRESSION_LEVEL) if _compress else value
+
+
+def decode(_value):
+    """
+        Returns None for missing values.
+    """
+    if _value is None:
+        return None
+    if _value.startswith(BINARY_MAGIC):
+        return decode_bindings(zlib.decompress(_value[len(BINARY_MAGIC):]))
+    if _value.startswith(NEGATIVE_MAGIC):
+        return Failure(**json.loads(_value[len(NEGATIVE_MAGIC):]))
+    if _value.startswith(MAGIC):
+        return json.loads(zlib.decompress(_value[len(MAGIC):]))
+    return json.loads(_value)
+
+
+def decode_as_columns(_value):
+    """
+        Like decode, but returns SPARQL results as columns (see decode_columns). Returns None for missing values.
+    """
+    if _value is None:
+        return None
+    if _value.startswith(BINARY_MAGIC):
+        return decode_columns(zlib.decompress(_value[len(BINARY_MAGIC):]))
+    value = decode(_value)
+    if isinstance(value, Failure):
+        return value._replace(response=columns_of(value.response)) if value.response is not None else value
+    return columns_of(value)
+
+
+class SparqlCache:
+
+    def __init__(self, _redis, _compress=True):
+        """
+        :param _redis: redis.StrictRedis (or anything with get, set, mget, pipeline. eg. fakeredis.FakeStrictRedis)
+        :param _compress: bool: store new (json) values compressed
+        """
+        self.r = _redis
+        self.compress = _compress
+
+    def get(self, _key):
+        return decode(self.r.get(_key))
+
+    def get_columns(self, _key):
+        return decode_as_columns(self.r.get(_key))
+
+    def _encode(self, _value):
+        """
+            Value to store, and its TTL (None: doesn't expire)
+        """
+        if is_empty(_value):
+            return encode_failure(Failure('empty', '', None, time.time(), _value)), EMPTY_TTL
+        return encode(_value, self.compress), None
+
+    def set(self, _key, _value):
+        value, ttl = self._encode(_value)
+        self.r.set(_key, value, ex=ttl)
+
+    def set_failure(self, _key, _reason, _detail='', _endpoint=None, _ttl=None):
+        """
+            Remember that this query failed, for _ttl seconds (FAILURE_TTL by default).
+
+        :param _reason: str: eg. 'timeout', 'error'
+        :param _detail: str: eg. the exception message
+        """
+        failure = Failure(_reason, _detail, _endpoint, time.time(), None)
+        self.r.set(_key, encode_failure(failure), ex=_ttl or FAILURE_TTL)
+
+    def _mget(self, _keys):
+        values = []
+        for i in range(0, len(_keys), BATCH_SIZE):
+            values += self.r.mget(_keys[i:i + BATCH_SIZE])
+        return values
+
+    def get_many(self, _keys):
+        """
+        :param _keys: list of str
+        :return: list of (decoded) values, None where the key is missing. Same order as _keys.
+            Negative entries come as Failure.
+        """
+        return [decode(x) for x in self._mget(_keys)]
+
+    def get_many_columns(self, _keys):
+        """
+            Same as get_many, but SPARQL results come as columns.
+        """
+        return [decode_as_columns(x) for x in self._mget(_keys)]
+
+    def set_many(self, _items):
+        """
+        :param _items: list of (key, value) tuples (or a dict)
+        """
+        _items = _items.items() if isinstance(_items, dict) else list(_items)
+        for i in range(0, len(_items), BATCH_SIZE):
+            pipe = self.r.pipeline(transaction=False)
+            for key, value in _items[i:i + BATCH_SIZE]:
+                value, ttl = self._encode(value)
+                pipe.set(key, value, ex=ttl)
+            pipe.execute()